@@ -0,0 +1,246 @@
+"""
+Time-bucketed counters for the map aggregates.
+
+Events are not stored one by one. Time is cut into fixed-width buckets
+(bucket_sec) kept in a ring of retention_sec / bucket_sec slots; every slot
+maps key -> [positive, neutral, negative, total] counts for that interval.
+
+  add        O(1): bump the counts of the key in the current bucket
+  expiry     O(1): a slot is reused when time wraps around the ring; its old
+             bucket is dropped in one assignment, no per-event purge
+  window     O(keys x buckets in the window), independent of how many
+             events arrived; repeated queries of the same window length keep
+             a running sum of the closed buckets and only subtract / add the
+             buckets that slid out / closed since, so a polled window costs
+             O(keys) plus the current bucket
+
+The ring is time-major (one dict per bucket, only keys seen in that
+interval) rather than one dense ring per key: most (city, district, topic)
+keys are quiet most of the time, so memory follows the active keys.
+Windows are bucket-aligned: a window may include up to one bucket_sec of
+events older than its nominal start.
+
+TieredCounters keeps several rings at once (rollups), e.g. 10 s buckets for
+the last hour, 1 min for the last day, 1 h for the last 90 days. Every
+event is counted in each tier; a query is answered by the finest tier whose
+retention covers the window, so a 15m window reads 90 ten-second buckets
+and a 7d window 168 hourly ones, and memory is bounded by
+sum(retention / bucket) buckets per tier.
+
+It also keeps a bounded change log of (version, key) so a poller can ask
+which keys were added to since the version it last saw (changed_since);
+keys whose counts left a window by expiry come from the buckets that slid
+out (keys_between).
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+import math
+import threading
+import time
+
+SENTIMENT_INDEX = {"positive": 0, "neutral": 1, "negative": 2}
+TOTAL = 3
+
+
+class BucketedCounters:
+    def __init__(self, bucket_sec: float = 10.0, retention_sec: float = 6 * 3600.0) -> None:
+        self.bucket_sec = float(bucket_sec)
+        self.slots = max(1, int(math.ceil(float(retention_sec) / self.bucket_sec)))
+        self.retention_sec = self.slots * self.bucket_sec
+        self._epochs: List[int] = [-1] * self.slots  # slotta tutulan bucket numarası
+        self._buckets: List[Optional[Dict[Hashable, List[int]]]] = [None] * self.slots
+        self._lock = threading.Lock()
+        self._reclaimed = 0
+        self._dropped = 0
+        self._newest = -1      # görülen en yeni bucket (olay ya da sorgunun güncel bucket'ı)
+        self._late_writes = 0  # kapanmış bucket'a gelen olay -> pencere önbellekleri geçersiz
+        self._sums: Dict[int, list] = {}  # bucket sayısı -> [first, last, late_writes, toplamlar]
+
+    # ---------- public API ----------
+
+    def add(self, key: Hashable, ts: float, sentiment: Optional[str] = None, n: int = 1) -> None:
+        b = int(ts // self.bucket_sec)
+        slot = b % self.slots
+        with self._lock:
+            bucket = self._buckets[slot]
+            if self._epochs[slot] != b:
+                if b < self._epochs[slot]:
+                    self._dropped += n  # saklama süresinden eski olay
+                    return
+                if bucket is not None:
+                    self._reclaimed += 1
+                bucket = self._buckets[slot] = {}
+                self._epochs[slot] = b
+            if b > self._newest:
+                self._newest = b
+            elif b < self._newest:
+                self._late_writes += 1
+            counts = bucket.get(key)
+            if counts is None:
+                counts = bucket[key] = [0, 0, 0, 0]
+            idx = SENTIMENT_INDEX.get(sentiment)
+            if idx is not None:
+                counts[idx] += n
+            counts[TOTAL] += n
+
+    def window(self, window_sec: float, now: Optional[float] = None) -> Dict[Hashable, List[int]]:
+        """
+        key -> [positive, neutral, negative, total] over the last window_sec (capped at retention).
+        The count lists may be shared with the running sums: read them, do not modify them.
+        """
+        now = time.time() if now is None else now
+        last = int(now // self.bucket_sec)
+        first = int((now - min(float(window_sec), self.retention_sec)) // self.bucket_sec)
+        first = max(first, last - self.slots + 1)
+        with self._lock:
+            out = dict(self._closed_sum(first, last - 1, last - first))
+            current = self._bucket(last)
+            if current:
+                for key, counts in current.items():
+                    acc = out.get(key)
+                    out[key] = counts[:] if acc is None else [a + c for a, c in zip(acc, counts)]
+        return out
+
+    def _bucket(self, b: int) -> Optional[Dict[Hashable, List[int]]]:
+        slot = b % self.slots
+        return self._buckets[slot] if self._epochs[slot] == b else None
+
+    def _closed_sum(self, first: int, last: int, span: int) -> Dict[Hashable, List[int]]:
+        """Sum of buckets first..last (all closed), slid forward from the previous query of this span."""
+        # last artık kapanmış sayılıyor: ona gelecek bir olay da geç yazmadır (toplamlara girmiş olabilir)
+        self._newest = max(self._newest, last + 1)
+        cached = self._sums.get(span)
+        if cached is not None:
+            c_first, c_last, late, totals = cached
+            # geri giden saat, kapanmış bucket'a geç yazma ya da çıkarılacak bucket'ın slotu yeniden kullanılmış -> baştan
+            if late != self._late_writes or first < c_first or c_first + self.slots <= max(last + 1, self._newest):
+                cached = None
+        if cached is None:
+            totals: Dict[Hashable, List[int]] = {}
+            c_first, c_last = first, first - 1
+        for b in range(c_first, min(first, c_last + 1)):
+            bucket = self._bucket(b)
+            if bucket:
+                _merge(totals, bucket, -1)
+        for b in range(max(first, c_last + 1), last + 1):
+            bucket = self._bucket(b)
+            if bucket:
+                _merge(totals, bucket, +1)
+        if len(self._sums) >= 8 and span not in self._sums:
+            self._sums.pop(next(iter(self._sums)))
+        self._sums[span] = [first, last, self._late_writes, totals]
+        return totals
+
+    def keys_between(self, first: int, last: int) -> Optional[Set[Hashable]]:
+        """
+        Keys counted in buckets first..last, or None when one of them has
+        already been reclaimed (its keys are no longer known).
+        """
+        keys: Set[Hashable] = set()
+        if last < first:
+            return keys
+        if last - first >= self.slots:
+            return None
+        with self._lock:
+            for b in range(first, last + 1):
+                slot = b % self.slots
+                if self._epochs[slot] > b:
+                    return None  # slot sonraki bir bucket'a geçmiş
+                if self._epochs[slot] == b and self._buckets[slot]:
+                    keys.update(self._buckets[slot])
+        return keys
+
+    def take_reclaimed(self) -> int:
+        """Buckets reclaimed since the last call."""
+        with self._lock:
+            n, self._reclaimed = self._reclaimed, 0
+            return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            live = [b for b in self._buckets if b]
+            return {
+                "bucket_sec": self.bucket_sec,
+                "retention_sec": self.retention_sec,
+                "slots": self.slots,
+                "live_buckets": len(live),
+                "cells": sum(len(b) for b in live),  # (bucket, key) sayaç hücreleri
+                "dropped_late_events": self._dropped,
+            }
+
+
+def _merge(acc: Dict[Hashable, List[int]], bucket: Dict[Hashable, List[int]], sign: int) -> None:
+    for key, counts in bucket.items():
+        cur = acc.get(key)
+        if cur is None:
+            acc[key] = counts[:] if sign > 0 else [-c for c in counts]
+            continue
+        for i in range(4):
+            cur[i] += sign * counts[i]
+        if sign < 0 and cur[TOTAL] == 0:
+            del acc[key]
+
+
+class TieredCounters:
+    def __init__(self, tiers: Sequence[Tuple[float, float]] = ((10.0, 3600.0), (60.0, 86400.0), (3600.0, 90 * 86400.0)),
+                 changelog: int = 100000) -> None:
+        """
+        tiers: (bucket_sec, retention_sec) pairs, any order.
+        changelog: how many (version, key) changes to remember for changed_since().
+        """
+        if not tiers:
+            raise ValueError("at least one tier is required")
+        self.tiers = [BucketedCounters(b, r) for b, r in sorted(tiers, key=lambda t: (t[1], t[0]))]
+        self.version = 0  # her add'de artar; snapshot önbellekleri bununla geçersizlenir
+        self._version_lock = threading.Lock()
+        self._changes: deque = deque(maxlen=max(1, int(changelog)))  # (version, key), artan sürüm sırasıyla
+
+    @property
+    def retention_sec(self) -> float:
+        return max(t.retention_sec for t in self.tiers)
+
+    def add(self, key: Hashable, ts: float, sentiment: Optional[str] = None, n: int = 1) -> None:
+        for tier in self.tiers:
+            tier.add(key, ts, sentiment, n)
+        # sürüm sayaçlardan sonra artar: sürüm v'yi okuyan, v'ye kadarki her olayı sayaçlarda görür
+        with self._version_lock:
+            self.version += 1
+            self._changes.append((self.version, key))
+
+    def changed_since(self, version: int) -> Optional[Set[Hashable]]:
+        """
+        Keys added to after `version`, or None when the change log no longer
+        reaches back that far (or the version is from the future).
+        """
+        with self._version_lock:
+            if version > self.version or version < 0:
+                return None
+            if self._changes and self._changes[0][0] > version + 1:
+                return None  # aradaki değişiklikler log'dan düşmüş
+            keys: Set[Hashable] = set()
+            for v, key in reversed(self._changes):
+                if v <= version:
+                    break
+                keys.add(key)
+            return keys
+
+    def tier_for(self, window_sec: float) -> BucketedCounters:
+        """Finest tier whose retention covers the window (the longest one otherwise)."""
+        for tier in self.tiers:
+            if tier.retention_sec >= window_sec:
+                return tier
+        return self.tiers[-1]
+
+    def window(self, window_sec: float, now: Optional[float] = None) -> Dict[Hashable, List[int]]:
+        return self.tier_for(window_sec).window(window_sec, now)
+
+    def take_reclaimed(self) -> int:
+        return sum(t.take_reclaimed() for t in self.tiers)
+
+    def stats(self) -> dict:
+        with self._version_lock:
+            oldest = self._changes[0][0] - 1 if self._changes else self.version
+        return {"version": self.version, "changelog_oldest_version": oldest, "tiers": [t.stats() for t in self.tiers]}
@@ -0,0 +1,143 @@
+"""
+Adaptive watcher batch size.
+
+The controller keeps one batch size for the inbox watcher and adjusts it
+after every enriched batch from three signals:
+
+  measured latency   time of the NLP step of the batch (topics + sentiment)
+                     against target_ms; above target * 1.2 -> shrink x0.7
+  backlog            records waiting in the inbox; the size only grows while
+                     there is more work than one batch per worker
+  queue depth        items already pending in the inference schedulers;
+                     a deep queue means bigger watcher batches only wait
+                     longer, so the size does not grow
+
+Growth is +25% but never beyond what the per-record cost EWMA says fits
+into target_ms. Emergency files use the same size capped at emergency_max,
+so a single urgent tweet is not held behind a large batch.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveBatchSizer:
+    def __init__(
+        self,
+        initial: int = 10,
+        min_size: int = 1,
+        max_size: int = 128,
+        target_ms: float = 1500.0,
+        emergency_max: int = 8,
+        workers: int = 1,
+        backlog_fn: Optional[Callable[[], int]] = None,
+        enabled: bool = True,
+        alpha: float = 0.3,
+        name: str = "watcher",
+    ) -> None:
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.size = min(self.max_size, max(self.min_size, int(initial)))
+        self.target_ms = float(target_ms)
+        self.emergency_max = max(1, int(emergency_max))
+        self.workers = max(1, int(workers))
+        self.backlog_fn = backlog_fn
+        self.enabled = bool(enabled)
+        self.alpha = float(alpha)
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._per_item_ms: Optional[float] = None
+        self._last_latency_ms: Optional[float] = None
+        self._last_backlog: Optional[int] = None
+        self._last_reason = "initial"
+        self._grows = 0
+        self._shrinks = 0
+        self._batches = 0
+
+    # ---------- public API ----------
+
+    def next_size(self, lane: str = "bulk") -> int:
+        with self._lock:
+            size = self.size
+        return min(size, self.emergency_max) if lane == "emergency" else size
+
+    def observe(self, n_items: int, elapsed_sec: float, queue_depth: int = 0) -> None:
+        """
+        Feeds back one batch: the items actually inferred (near-dup copies do
+        not count), its NLP time and the schedulers' pending items.
+        """
+        if n_items <= 0:
+            return
+        latency_ms = elapsed_sec * 1000.0
+        backlog = self._backlog()
+        with self._lock:
+            self._batches += 1
+            self._last_latency_ms = latency_ms
+            self._last_backlog = backlog
+            per_item = latency_ms / n_items
+            if self._per_item_ms is None:
+                self._per_item_ms = per_item
+            else:
+                self._per_item_ms += self.alpha * (per_item - self._per_item_ms)
+            if not self.enabled:
+                return
+
+            old = self.size
+            fit = max(self.min_size, int(self.target_ms / max(self._per_item_ms, 1e-3)))
+            if latency_ms > self.target_ms * 1.2:
+                new = max(self.min_size, int(old * 0.7))
+                reason = f"latency {latency_ms:.0f} ms > target {self.target_ms:.0f} ms"
+            elif queue_depth > old * self.workers:
+                new, reason = old, f"inference queue deep ({queue_depth} items)"
+            elif backlog is not None and backlog <= old * self.workers:
+                new, reason = old, f"backlog {backlog} fits in current batches"
+            elif latency_ms < self.target_ms * 0.8 and n_items >= old:
+                new = min(self.max_size, fit, old + max(1, old // 4))
+                new = max(new, old)
+                reason = f"latency {latency_ms:.0f} ms < target, backlog {backlog}"
+            else:
+                new, reason = old, "within target"
+
+            self._last_reason = reason
+            if new == old:
+                return
+            self.size = new
+            if new > old:
+                self._grows += 1
+            else:
+                self._shrinks += 1
+        logger.info("[%s] batch size %d -> %d (%s)", self.name, old, new, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": self.size,
+                "min": self.min_size,
+                "max": self.max_size,
+                "emergency_max": self.emergency_max,
+                "target_ms": self.target_ms,
+                "per_item_ms": round(self._per_item_ms, 2) if self._per_item_ms is not None else None,
+                "last_latency_ms": round(self._last_latency_ms, 1) if self._last_latency_ms is not None else None,
+                "last_backlog": self._last_backlog,
+                "last_decision": self._last_reason,
+                "grows": self._grows,
+                "shrinks": self._shrinks,
+                "batches": self._batches,
+            }
+
+    # ---------- internals ----------
+
+    def _backlog(self) -> Optional[int]:
+        if self.backlog_fn is None:
+            return None
+        try:
+            return int(self.backlog_fn())
+        except Exception:
+            return None
@@ -0,0 +1,107 @@
+"""
+/map/aggregates under many polling clients: per-request snapshot vs cached
+snapshot + ETag / 304 vs ?since= deltas.
+
+Usage (repo root):
+    python -m backend.bench_aggregates [--clients 100 1000] [--events 200000] [--events-per-round 300]
+                                       [--window 15m] [--level city] [--rounds 3] [--modes uncached cached delta]
+
+The aggregate store is filled with --events synthetic events spread over the
+window. One round is one poll of every client (the frontend polls every
+30 s); --events-per-round new events arrive interleaved with the requests.
+
+  uncached   snapshot cache off, clients send no If-None-Match (old behaviour)
+  cached     snapshot cache on, clients send their last ETag
+  delta      as cached, and clients send ?since=<last version> (changed rows only)
+
+Requests go through the ASGI app in-process (httpx + ASGITransport), so the
+numbers include routing and serialization but no network. Reports request
+latency p50 / p95, the share of 304s, mean response size, and CPU seconds
+per round; CPU per round / 30 s is the polling load on one core.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+import backend.main as api
+
+_CITIES = [f"il-{i:02d}" for i in range(81)]
+_TOPICS = ["trafik", "sel", "deprem", "su", "elektrik kesintisi", "yangın", "çöp", "gürültü", "hava kirliliği",
+           "barınma", "yardım", "ulaşım"]
+_SENTIMENTS = ["positive", "neutral", "negative"]
+
+
+def _random_event(rng: random.Random, ts: float) -> None:
+    city = rng.choice(_CITIES)
+    district = rng.choice([None, f"{city}-ilçe-{rng.randint(1, 5)}"])
+    api._agg_add(city, district, rng.choice(_TOPICS), ts, rng.choice(_SENTIMENTS))
+
+
+async def run(clients: int, mode: str, args, rng: random.Random) -> None:
+    cached = mode != "uncached"
+    api.AGG_SNAPSHOT_CACHE = cached
+    api._SNAPSHOTS.clear()
+    url = f"/map/aggregates?level={args.level}&window={args.window}"
+    etags, versions = [None] * clients, [None] * clients
+    latencies, not_modified, nbytes, cpu = [], 0, 0, 0.0
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for rnd in range(args.rounds + 1):  # ilk tur ısınma: ETag'ler dolsun
+            arrivals = sorted(rng.sample(range(clients), min(clients, args.events_per_round)))
+            per_slot = max(1, args.events_per_round // max(1, len(arrivals)))
+            cpu0 = time.process_time()
+            for i in range(clients):
+                while arrivals and arrivals[0] == i:
+                    arrivals.pop(0)
+                    for _ in range(per_slot):
+                        _random_event(rng, time.time())
+                headers = {"If-None-Match": etags[i]} if cached and etags[i] else {}
+                params = {"since": versions[i]} if mode == "delta" and versions[i] else None
+                t0 = time.perf_counter()
+                r = await client.get(url, headers=headers, params=params)
+                if rnd:
+                    latencies.append((time.perf_counter() - t0) * 1000.0)
+                    not_modified += r.status_code == 304
+                    nbytes += len(r.content)
+                etags[i] = r.headers.get("etag")
+                if mode == "delta" and r.status_code == 200:
+                    versions[i] = r.json()["version"]
+            if rnd:
+                cpu += time.process_time() - cpu0
+    latencies.sort()
+    n = len(latencies)
+    print(f"{clients:>5} clients {mode:<9}: p50 {latencies[n // 2]:6.2f} ms  "
+          f"p95 {latencies[int(n * 0.95)]:6.2f} ms  304s {100.0 * not_modified / n:5.1f}%  {nbytes / n / 1024:6.1f} KiB  "
+          f"CPU {cpu / args.rounds:6.2f} s/round ({100.0 * cpu / args.rounds / 30.0:5.1f}% of a core at 30 s polling)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, nargs="+", default=[100, 1000])
+    ap.add_argument("--events", type=int, default=200000)
+    ap.add_argument("--events-per-round", type=int, default=300, help="new events during one 30 s poll round")
+    ap.add_argument("--window", default="15m")
+    ap.add_argument("--level", default="city")
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--modes", nargs="+", choices=["uncached", "cached", "delta"], default=["uncached", "cached", "delta"])
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    window_sec = api._parse_window_to_seconds(args.window)
+    now = time.time()
+    for _ in range(args.events):
+        _random_event(rng, now - rng.uniform(0, window_sec))
+    print(f"{args.events} events in the last {args.window}; snapshot items: "
+          f"{len(api._agg_snapshot(args.level, args.window)['items'])}")
+
+    for clients in args.clients:
+        for mode in args.modes:
+            asyncio.run(run(clients, mode, args, rng))
+
+
+if __name__ == "__main__":
+    main()
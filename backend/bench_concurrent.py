@@ -0,0 +1,96 @@
+"""
+Per-batch NLP latency: sentiment and topics one after the other vs side by side.
+
+Usage (repo root):
+    python -m backend.bench_concurrent [--batches 20] [--batch-size 32] [--threads N]
+                                       [--split 1:3] [--modes serial concurrent]
+                                       [--sentiment-model ...] [--topics-model ...]
+
+serial       both models get all --threads intra-op threads, run in turn
+concurrent   the models run at the same time on their own scheduler threads;
+             --split SENT:TOPICS divides the threads (default: 1/4 : 3/4)
+
+Every batch has fresh texts, so the result caches never answer; the
+near-duplicate shortcut is off. Reports p50 / p95 / mean batch latency and
+records/s for each mode.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+import backend.main as api
+from backend.bench_watcher import _WORDS
+from backend.models.nlp.sentiment.service import SentimentService
+
+
+def make_batch(rng: random.Random, size: int, tag: str):
+    texts = [" ".join(rng.choices(_WORDS, k=rng.randint(6, 40))) + f" #{tag}-{i}" for i in range(size)]
+    ids = [f"{tag}-{i}" for i in range(size)]
+    recs = [{"id": i, "text": t} for i, t in zip(ids, texts)]
+    return recs, texts, ids
+
+
+def run_mode(mode: str, batches: int, batch_size: int, threads: int, split, seed: int):
+    api.CONCURRENT_NLP = mode == "concurrent"
+    if api.CONCURRENT_NLP:
+        sent_threads, topic_threads = split or api.nlp_thread_split(threads)
+    else:
+        sent_threads = topic_threads = threads
+    # scheduler thread'leri bir sonraki batch'te yeni bütçeyi uygular
+    api.sentiment_sched.intra_op_threads = sent_threads
+    api.topic_sched.intra_op_threads = topic_threads
+
+    rng = random.Random(seed)
+    api._enrich_batch(*make_batch(rng, batch_size, f"{mode}-warm"))  # bütçe değişimi ölçüme girmesin
+    lat = []
+    for b in range(batches):
+        recs, texts, ids = make_batch(rng, batch_size, f"{mode}-{b}")
+        t0 = time.perf_counter()
+        enriched, _ = api._enrich_batch(recs, texts, ids)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        assert len(enriched) == batch_size
+
+    lat_sorted = sorted(lat)
+    p50 = lat_sorted[len(lat) // 2]
+    p95 = lat_sorted[min(len(lat) - 1, int(len(lat) * 0.95))]
+    mean = statistics.fmean(lat)
+    rps = batch_size * 1000.0 / mean
+    print(f"{mode:<11} threads sentiment={sent_threads} topics={topic_threads}: "
+          f"p50 {p50:.0f} ms  p95 {p95:.0f} ms  mean {mean:.0f} ms  -> {rps:.1f} records/s")
+    return mean
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batches", type=int, default=20)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="total intra-op threads")
+    ap.add_argument("--split", default=None, help="SENT:TOPICS threads in concurrent mode, e.g. 2:6")
+    ap.add_argument("--modes", nargs="+", default=["serial", "concurrent"])
+    ap.add_argument("--sentiment-model", default=None, help="e.g. a small checkpoint for quick runs")
+    ap.add_argument("--topics-model", default=None)
+    args = ap.parse_args()
+
+    split = tuple(int(x) for x in args.split.split(":")) if args.split else None
+    if args.sentiment_model:
+        api.svc = SentimentService(model_name=args.sentiment_model, lazy=False, **api.SENTIMENT_KWARGS)
+    if args.topics_model:
+        api.topic_svc.MODEL_NAME = args.topics_model
+    api.NEARDUP_ENABLED = False
+
+    # yükleme + ısınma ölçüme girmesin
+    api.svc.warmup()
+    api.topic_svc.warmup()
+
+    results = {}
+    for i, mode in enumerate(args.modes):
+        results[mode] = run_mode(mode, args.batches, args.batch_size, args.threads, split, seed=i + 1)
+    if "serial" in results and "concurrent" in results:
+        print(f"speedup x{results['serial'] / results['concurrent']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
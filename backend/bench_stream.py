@@ -0,0 +1,229 @@
+"""
+/map/stream (SSE push) with thousands of connected dashboards.
+
+Usage (repo root):
+    python -m backend.bench_stream [--clients 1000 5000] [--events 200000] [--batch 300]
+                                   [--period 2.0] [--rounds 5] [--window 15m] [--level city]
+
+The API runs under uvicorn in a background thread; the clients are raw
+asyncio connections in the main thread of the same process (one CPU here,
+so client parsing competes with the server). The aggregate store is filled
+with --events synthetic events; every --period seconds a "watcher" commit
+adds --batch events and calls STREAM.notify(), like _write_enriched does.
+
+Reports, per client count:
+  connect      time until every client has its first (full snapshot) frame
+  latency      commit -> frame received, p50 / p95 / max over clients x rounds
+  renders      frames rendered vs frames sent (one render is shared by all)
+  CPU          process CPU seconds per commit round (server + clients)
+  memory       RSS growth per connected client
+Clients only record the frames while the bench runs; at the end each one
+replays its snapshot + deltas, and the result must equal a fresh
+/map/aggregates snapshot.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+
+import backend.main as api
+from backend.bench_aggregates import _random_event
+from backend.procmem import smaps_rollup
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning",
+                                           backlog=8192, timeout_keep_alive=3600))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+_SEEN = {}  # aynı kare tüm istemcilerde tek kopya
+
+
+class Client:
+    """Only records frames while the bench runs (parsing would compete with the server); rows() replays them."""
+
+    def __init__(self) -> None:
+        self.log = []
+        self.arrivals = []
+        self.token = None
+        self.first = asyncio.Event()
+
+    @property
+    def frames(self) -> int:
+        return len(self.log)
+
+    def received(self, event: str, data: bytes, token: str) -> None:
+        self.token = token
+        self.log.append((event, _SEEN.setdefault(data, data)))
+        self.arrivals.append(time.perf_counter())
+        self.first.set()
+
+    @staticmethod
+    def rows(log: list, parsed: dict) -> dict:
+        key = lambda it: (it["city"], it["district"], it["topic"])
+        rows = {}
+        for event, data in log:
+            if id(data) not in parsed:
+                parsed[id(data)] = json.loads(data)
+            body = parsed[id(data)]
+            if event == "snapshot":
+                rows = {key(it): it for it in body["items"]}
+            else:
+                for it in body["removed"]:
+                    rows.pop(key(it), None)
+                for it in body["items"]:
+                    rows[key(it)] = it
+        return rows
+
+
+async def _read(client: Client, port: int, path: str) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 24)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")  # başlıklar
+    try:
+        while True:
+            size = int((await reader.readline()).strip(), 16)  # chunked: her kare bir chunk
+            if size == 0:
+                break
+            chunk = await reader.readexactly(size + 2)
+            event, data, token = None, None, None
+            for line in chunk[:-2].split(b"\n"):
+                if line.startswith(b"id: "):
+                    token = line[4:].decode()
+                elif line.startswith(b"event: "):
+                    event = line[7:].decode()
+                elif line.startswith(b"data: "):
+                    data = line[6:]
+            if event and data is not None:
+                client.received(event, data, token)
+    finally:
+        writer.close()
+
+
+def _current_token(window: str) -> str:
+    tier = api.AGG.tier_for(api._parse_window_to_seconds(window))
+    return f"{api.AGG.version}-{int(time.time() // tier.bucket_sec)}"
+
+
+def _check(clients, level: str, window: str) -> int:
+    """Clients out of sync with the snapshot at the token they all hold; -1 if time moved on meanwhile."""
+    token = _current_token(window)
+    logs = [(c.token, list(c.log)) for c in clients]  # istemciler olay döngüsünde almaya devam ediyor
+    want = api._agg_snapshot(level, window)
+    if _current_token(window) != token or any(t != token for t, _ in logs):
+        return -1
+    want = {(it["city"], it["district"], it["topic"]): it for it in want["items"]}
+    parsed, replayed = {}, {}
+    wrong = 0
+    for _, log in logs:
+        seq = tuple(id(data) for _, data in log)  # aynı kare dizisini alanlar tek kez oynatılır
+        if seq not in replayed:
+            replayed[seq] = Client.rows(log, parsed) == want
+        wrong += not replayed[seq]
+    return wrong
+
+
+async def run(n: int, port: int, args, rng: random.Random) -> None:
+    path = f"/map/stream?level={args.level}&window={args.window}"
+    rss0 = (smaps_rollup() or {}).get("rss")
+    clients = [Client() for _ in range(n)]
+    t0 = time.perf_counter()
+    tasks = []
+    for c in clients:
+        tasks.append(asyncio.create_task(_read(c, port, path)))
+        if len(tasks) % 200 == 0:
+            await asyncio.sleep(0)  # accept kuyruğu taşmasın
+    await asyncio.gather(*(c.first.wait() for c in clients))
+    connect = time.perf_counter() - t0
+    rss1 = (smaps_rollup() or {}).get("rss")
+    stats0 = api.STREAM.stats()
+
+    latencies, cpu = [], 0.0
+    for _ in range(args.rounds):
+        await asyncio.sleep(args.period)
+        counts = [c.frames for c in clients]
+        cpu0 = time.process_time()
+        now = time.time()
+        for _ in range(args.batch):
+            _random_event(rng, now)
+        committed = time.perf_counter()
+        api.STREAM.notify()
+        deadline = committed + args.period
+        while time.perf_counter() < deadline and any(c.frames == k for c, k in zip(clients, counts)):
+            await asyncio.sleep(0.01)
+        cpu += time.process_time() - cpu0
+        latencies += [(c.arrivals[k] - committed) * 1000.0 for c, k in zip(clients, counts) if c.frames > k]
+    missed = args.rounds * n - len(latencies)
+
+    stats1 = api.STREAM.stats()
+    # son kareler gelsin; tüm istemciler güncel token'dayken kontrol et (bucket sınırı geçerse tekrar dene)
+    wrong = -1
+    for _ in range(5):
+        await asyncio.sleep(api.STREAM_TICK_SEC + 0.5)
+        wrong = await asyncio.to_thread(_check, clients, args.level, args.window)
+        if wrong >= 0:
+            break
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    while api.STREAM.subscribers:
+        await asyncio.sleep(0.1)
+
+    latencies.sort()
+    k = len(latencies)
+    rendered = stats1["frames_rendered"] - stats0["frames_rendered"]
+    sent = stats1["frames_sent"] - stats0["frames_sent"]
+    per_client = f"{(rss1 - rss0) * 1024 / n:.1f} KiB" if rss0 is not None and rss1 is not None else "n/a"
+    print(f"{n:>5} clients: connect {connect:5.1f}s  latency p50 {latencies[k // 2]:6.1f} ms  "
+          f"p95 {latencies[int(k * 0.95)]:6.1f} ms  max {latencies[-1]:6.1f} ms  missed {missed}  "
+          f"renders {rendered} / frames {sent}  CPU {cpu / args.rounds:5.2f} s/round  RSS/client {per_client}  "
+          f"{'OK' if wrong == 0 else 'not checked (kept moving)' if wrong < 0 else f'{wrong} clients out of sync'}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, nargs="+", default=[1000, 5000])
+    ap.add_argument("--events", type=int, default=200000)
+    ap.add_argument("--batch", type=int, default=300, help="events per watcher commit")
+    ap.add_argument("--period", type=float, default=2.0, help="seconds between commits")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--window", default="15m")
+    ap.add_argument("--level", default="city")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    window_sec = api._parse_window_to_seconds(args.window)
+    now = time.time()
+    for _ in range(args.events):
+        _random_event(rng, now - rng.uniform(0, window_sec))
+    api.STREAM.max_subscribers = max(api.STREAM.max_subscribers, max(args.clients))
+    port = _free_port()
+    server = _serve(port)
+    print(f"{args.events} events in the last {args.window}; tick {api.STREAM_TICK_SEC}s, "
+          f"{args.batch} events every {args.period}s")
+    try:
+        for n in args.clients:
+            asyncio.run(run(n, port, args, rng))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Watcher throughput: sequential loop vs staged pipeline on a synthetic inbox.
+
+Usage (repo root):
+    python -m backend.bench_watcher [--lines 100000] [--files 100] [--modes sequential pipeline]
+                                    [--sentiment-model ...] [--topics-model ...]
+
+Every mode gets its own freshly generated inbox (different texts, so the
+result cache and the near-duplicate index cannot carry over between modes)
+in a temporary directory; the repo's twitter_data/ is never touched.
+Reports steady-state records/s for each mode.
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import backend.main as api
+from backend.models.nlp.sentiment.service import SentimentService
+
+_WORDS = (
+    "trafik yol su elektrik kesintisi sel yağmur deprem yangın yardım otobüs metro köprü çöp park "
+    "gürültü hastane okul belediye mahalle sokak kaza ambulans itfaiye barınma enerji doğalgaz "
+    "kaldırım çukur ağaç çevre hava kirlilik sabah akşam bugün yine hala çok yoğun kapalı açık"
+).split()
+_CITIES = ["İstanbul", "Ankara", "İzmir", "Bursa", "Antalya"]
+
+
+def make_inbox(inbox: Path, lines: int, files: int, seed: int) -> None:
+    rng = random.Random(seed)
+    inbox.mkdir(parents=True, exist_ok=True)
+    per_file = max(1, lines // files)
+    now = datetime.now().isoformat()
+    n = 0
+    for f in range(files):
+        with (inbox / f"tweets_selenium_batch_{seed}_{f:05d}.jsonl").open("w", encoding="utf-8") as out:
+            for _ in range(per_file if f < files - 1 else lines - n):
+                words = rng.choices(_WORDS, k=rng.randint(6, 40))
+                rec = {
+                    "id": f"{seed}-{n}",
+                    "text": " ".join(words) + f" #{n}",
+                    "ts": "2025-09-04T19:47:25.000Z",
+                    "city": rng.choice(_CITIES),
+                    "district": None,
+                    "scraping_timestamp": now,
+                }
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                n += 1
+
+
+def run_mode(mode: str, root: Path, lines: int, files: int, seed: int) -> float:
+    base = root / mode
+    api.INBOX_DIR, api.PROCESSING_DIR = base / "inbox", base / "processing"
+    api.ARCHIVE_DIR, api.FAILED_DIR = base / "archive", base / "failed"
+    api._ensure_dirs()
+    make_inbox(api.INBOX_DIR, lines, files, seed)
+
+    api.WATCHER_PIPELINE = mode == "pipeline"
+    t0 = time.perf_counter()
+    api._sweep_inbox()
+    if mode == "pipeline":
+        api.PIPELINE.wait_idle()
+    elapsed = time.perf_counter() - t0
+
+    written = sum(1 for p in api.ARCHIVE_DIR.glob("*.enriched.jsonl") for _ in p.open(encoding="utf-8"))
+    failed = len(list(api.FAILED_DIR.iterdir()))
+    print(f"{mode:<10} {written} records in {elapsed:.1f}s -> {written / elapsed:.1f} records/s"
+          f" (failed files: {failed})")
+    return written / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=100000)
+    ap.add_argument("--files", type=int, default=100)
+    ap.add_argument("--modes", nargs="+", default=["sequential", "pipeline"])
+    ap.add_argument("--sentiment-model", default=None, help="e.g. a small checkpoint for quick runs")
+    ap.add_argument("--topics-model", default=None)
+    ap.add_argument("--neardup", action="store_true", help="keep the near-duplicate shortcut on")
+    args = ap.parse_args()
+
+    if args.sentiment_model:
+        api.svc = SentimentService(model_name=args.sentiment_model, lazy=False, **api.SENTIMENT_KWARGS)
+    if args.topics_model:
+        api.topic_svc.MODEL_NAME = args.topics_model
+    api.NEARDUP_ENABLED = args.neardup
+
+    # yükleme + ısınma ölçüme girmesin
+    api.svc.warmup()
+    api.topic_svc.warmup()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="hasharita-bench-") as tmp:
+        for i, mode in enumerate(args.modes):
+            results[mode] = run_mode(mode, Path(tmp), args.lines, args.files, seed=i + 1)
+    if "sequential" in results and "pipeline" in results:
+        print(f"speedup x{results['pipeline'] / results['sequential']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Inbox throughput with 1..N standalone enrichment workers sharing one inbox.
+
+Usage (repo root):
+    python -m backend.bench_workers [--lines 20000] [--files 80] [--workers 1 2 4 8]
+                                    [--sentiment-model ...] [--topics-model ...]
+
+For every worker count a fresh synthetic inbox is written to a temporary
+directory and N `python -m backend.worker --drain` processes are started,
+each with cores / N torch threads. Timing starts once all of them have
+loaded and warmed their models and stops when the last one exits. The run
+also checks that every record was enriched exactly once (leases never let
+two workers take the same file).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from backend.bench_watcher import make_inbox
+
+
+def run(n: int, root: Path, args, seed: int) -> float:
+    base = root / f"w{n}"
+    make_inbox(base / "inbox", args.lines, args.files, seed)
+    threads = max(1, (os.cpu_count() or 1) // n)
+    cmd = [sys.executable, "-m", "backend.worker", "--drain", "--wait-go", "--data-dir", str(base),
+           "--threads", str(threads), "--log-level", "warning"]
+    if args.sentiment_model:
+        cmd += ["--sentiment-model", args.sentiment_model]
+    if args.topics_model:
+        cmd += ["--topics-model", args.topics_model]
+    env = dict(os.environ, HASHARITA_NEARDUP="0")
+    env.pop("HASHARITA_WORKER_ID", None)
+    procs = [subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env)
+             for _ in range(n)]
+    for p in procs:
+        for line in p.stdout:
+            if line.startswith("ready"):
+                break
+    t0 = time.perf_counter()
+    for p in procs:
+        p.stdin.write("go\n")
+        p.stdin.flush()
+    codes = [p.wait() for p in procs]
+    elapsed = time.perf_counter() - t0
+
+    ids = [json.loads(line)["id"] for out in (base / "archive").glob("*.enriched.jsonl")
+           for line in out.open(encoding="utf-8")]
+    ok = len(ids) == len(set(ids)) == args.lines and not any(codes)
+    rps = len(ids) / elapsed
+    print(f"{n} worker(s) x {threads} threads: {len(ids)} records in {elapsed:.1f}s -> {rps:.1f} records/s"
+          f"{'' if ok else '  (CHECK FAILED: duplicates, missing records or worker errors)'}")
+    return rps
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=20000)
+    ap.add_argument("--files", type=int, default=80)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--sentiment-model", default=None, help="e.g. a small checkpoint for quick runs")
+    ap.add_argument("--topics-model", default=None)
+    args = ap.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="hasharita-workers-") as tmp:
+        for i, n in enumerate(args.workers):
+            results[n] = run(n, Path(tmp), args, seed=i + 1)
+    base = results[args.workers[0]]
+    print("scaling: " + ", ".join(f"{n}: x{r / base:.2f}" for n, r in results.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Chaos test for the offset journal: SIGKILL the watcher at random points and
+check that every input record ends up enriched exactly once, in order.
+
+Usage (repo root):
+    python -m backend.chaos_journal [--lines 3000] [--files 6] [--kills 8] [--mode pipeline|sequential]
+                                    [--sentiment-model ...] [--topics-model ...] [--seed 0]
+
+A child process runs the watcher over a synthetic inbox in a temporary
+directory (the repo's twitter_data/ is never touched) and is killed after a
+random delay, then restarted; after --kills kills it runs to completion.
+Every raw file must end up in archive/ with an enriched file whose ids equal
+the input's valid ids (no duplicates, no gaps), nothing in failed/, and no
+file or journal left in processing/.
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from backend.bench_watcher import make_inbox
+
+
+def _point_at(base: Path, api) -> None:
+    api.INBOX_DIR, api.PROCESSING_DIR = base / "inbox", base / "processing"
+    api.ARCHIVE_DIR, api.FAILED_DIR = base / "archive", base / "failed"
+    api._ensure_dirs()
+
+
+def child(args) -> int:
+    """Worker process: resume + drain the inbox, then exit 0."""
+    import backend.main as api
+    from backend.models.nlp.sentiment.service import SentimentService
+
+    if args.sentiment_model:
+        api.svc = SentimentService(model_name=args.sentiment_model, lazy=False, **api.SENTIMENT_KWARGS)
+    if args.topics_model:
+        api.topic_svc.MODEL_NAME = args.topics_model
+    api.WATCHER_PIPELINE = args.mode == "pipeline"
+    _point_at(Path(args.child), api)
+    api.svc.warmup()
+    api.topic_svc.warmup()
+    print("ready", flush=True)
+
+    api._resume_interrupted()
+    while True:
+        if api.WATCHER_PIPELINE:
+            api.PIPELINE.wait_idle()
+        if not api._inbox_files():
+            break
+        api._sweep_inbox()
+    if api.WATCHER_PIPELINE:
+        api.PIPELINE.wait_idle()
+    api.LEASES.release()
+    print(f"done resumed_files={api.RESUMED_FILES}", flush=True)
+    return 0
+
+
+def _spawn(args, base: Path) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "backend.chaos_journal", "--child", str(base), "--mode", args.mode]
+    if args.sentiment_model:
+        cmd += ["--sentiment-model", args.sentiment_model]
+    if args.topics_model:
+        cmd += ["--topics-model", args.topics_model]
+    # sabit worker id: yeniden başlayan süreç kendi lease dizinine hemen devam eder
+    env = dict(os.environ, HASHARITA_WATCHER="0", HASHARITA_PRELOAD_MODELS="0", HASHARITA_WORKER_ID="chaos")
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, env=env)
+
+
+def _wait_ready(proc: subprocess.Popen) -> bool:
+    for line in proc.stdout:
+        if line.startswith("ready"):
+            return True
+    return False
+
+
+def verify(base: Path) -> list:
+    errors = []
+    archive = base / "archive"
+    for name in ("inbox", "processing", "failed"):
+        left = sorted(p.name for p in (base / name).iterdir())
+        if left:
+            errors.append(f"{name}/ not empty: {left[:5]}")
+    for raw in sorted(archive.glob("*.jsonl")):
+        if raw.name.endswith(".enriched.jsonl"):
+            continue
+        want = [json.loads(line)["id"] for line in raw.open(encoding="utf-8") if line.strip()]
+        out = archive / (raw.stem + ".enriched.jsonl")
+        got = [json.loads(line)["id"] for line in out.open(encoding="utf-8")] if out.exists() else []
+        if got != want:
+            dup = [i for i, c in Counter(got).items() if c > 1]
+            lost = set(want) - set(got)
+            errors.append(f"{raw.name}: {len(got)}/{len(want)} enriched, {len(dup)} duplicated, {len(lost)} lost")
+    return errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=3000)
+    ap.add_argument("--files", type=int, default=6)
+    ap.add_argument("--kills", type=int, default=8)
+    ap.add_argument("--max-delay", type=float, default=3.0, help="kill within this many seconds after ready")
+    ap.add_argument("--mode", choices=["pipeline", "sequential"], default="pipeline")
+    ap.add_argument("--sentiment-model", default=None, help="e.g. a small checkpoint for quick runs")
+    ap.add_argument("--topics-model", default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="hasharita-chaos-") as tmp:
+        base = Path(tmp)
+        make_inbox(base / "inbox", args.lines, args.files, seed=args.seed + 1)
+        kills = 0
+        while True:
+            proc = _spawn(args, base)
+            if not _wait_ready(proc):
+                proc.wait()
+                print(f"worker exited before ready (code {proc.returncode})")
+                return 1
+            if kills < args.kills:
+                time.sleep(rng.uniform(0.0, args.max_delay))
+                if proc.poll() is None:
+                    proc.send_signal(signal.SIGKILL)
+                    proc.wait()
+                    kills += 1
+                    journals = len(list((base / "processing").rglob("*.journal")))
+                    print(f"kill {kills}/{args.kills}: {journals} journal(s) in processing/")
+                    continue
+            tail = proc.stdout.read().strip()
+            proc.wait()
+            if proc.returncode != 0:
+                print(f"worker failed (code {proc.returncode})")
+                return 1
+            print(tail)
+            break
+
+        errors = verify(base)
+    if errors:
+        print("FAIL")
+        for e in errors:
+            print("  " + e)
+        return 1
+    print(f"OK: {args.lines} records, {kills} kills, no duplicate or lost enrichments")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
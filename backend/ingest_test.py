@@ -0,0 +1,96 @@
+"""
+/ingest aborted mid-stream: whatever reached the aggregates must be in
+archive/ (as ingest_*_truncated), and nothing else.
+
+    python -m pytest backend/ingest_test.py
+"""
+
+import json
+import os
+
+os.environ.setdefault("HASHARITA_WATCHER", "0")
+os.environ.setdefault("HASHARITA_PRELOAD_MODELS", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main as api
+
+BATCH = 4
+
+
+def _fake_enrich(batch_recs, batch_texts, batch_ids, lane="bulk"):
+    # modelsiz: her kayda sabit bir konu ve duygu (agregat / archive yolu aynı kalır)
+    if any(r["id"].endswith("-boom") for r in batch_recs):
+        raise RuntimeError("enrich failed")
+    return [dict(r, sentiment={"label": "negative", "score": 0.9}, topics=["sel"]) for r in batch_recs], 0
+
+
+@pytest.fixture
+def ingest_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "ARCHIVE_DIR", tmp_path)
+    monkeypatch.setattr(api, "_enrich_batch", _fake_enrich)
+    monkeypatch.setattr(api.BATCH_SIZER, "next_size", lambda lane="bulk": BATCH)
+    monkeypatch.setattr(api, "INGEST_MAX_LINE_BYTES", 256)
+    return TestClient(api.app)
+
+
+def _line(city: str, i: int, suffix: str = "") -> bytes:
+    rec = {"id": f"{city}-{i}{suffix}", "text": f"{city} su baskını {i}", "ts": "2025-01-01T00:00:00Z", "city": city}
+    return json.dumps(rec, ensure_ascii=False).encode() + b"\n"
+
+
+def _agg_count(city: str) -> int:
+    return sum(it["count"] for it in api._agg_snapshot("city", "1h")["items"] if it["city"] == city)
+
+
+def _archived(archive, pattern: str):
+    files = sorted(archive.glob(pattern))
+    return [json.loads(line) for p in files for line in p.read_text(encoding="utf-8").splitlines() if line]
+
+
+def test_413_archives_committed_prefix_and_matches_aggregates(ingest_env, tmp_path):
+    city = "Testkent413"
+
+    def body():
+        yield b"".join(_line(city, i) for i in range(10))  # 2 tam batch + 2 bekleyen kayıt
+        yield b"x" * 1024                                     # satır sonu yok -> 413
+
+    r = ingest_env.post("/ingest", content=body())
+    assert r.status_code == 413
+    detail = r.json()["detail"]
+    assert detail["accepted"] == 2 * BATCH and detail["committed_lines"] == 2 * BATCH
+
+    enriched = _archived(tmp_path, "*_truncated.enriched.jsonl")
+    raw = [json.loads(line) for line in (tmp_path / detail["archived"]).read_text(encoding="utf-8").splitlines()]
+    assert [r["id"] for r in enriched] == [r["id"] for r in raw] == [f"{city}-{i}" for i in range(2 * BATCH)]
+    assert _agg_count(city) == len(enriched)
+    assert not list(tmp_path.glob("*.partial"))
+
+
+def test_enrich_error_archives_batches_before_it(ingest_env, tmp_path):
+    city = "Testkent500"
+    body = b"".join(_line(city, i) for i in range(BATCH)) + _line(city, BATCH, "-boom")
+    with pytest.raises(RuntimeError):
+        ingest_env.post("/ingest", content=body)
+
+    enriched = _archived(tmp_path, "*_truncated.enriched.jsonl")
+    assert [r["id"] for r in enriched] == [f"{city}-{i}" for i in range(BATCH)]
+    assert _agg_count(city) == len(enriched)
+    assert not list(tmp_path.glob("*.partial"))
+
+
+def test_full_bulk_lane_does_not_reject_emergency_streams(ingest_env, monkeypatch):
+    for sched in (api.topic_sched, api.sentiment_sched):
+        monkeypatch.setattr(sched, "max_queue_items", 100)
+        monkeypatch.setitem(sched._lane_items, api.PRIORITY_NORMAL, 100)  # bulk şeridi dolu
+    body = b"".join(_line("Testkent429", i) for i in range(BATCH))
+
+    r = ingest_env.post("/ingest", content=body)
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    r = ingest_env.post("/ingest", content=body, headers={"X-Priority": "emergency"})
+    assert r.status_code == 200 and r.json()["accepted"] == BATCH
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
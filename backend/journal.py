@@ -0,0 +1,155 @@
+"""
+Per-file offset journal for crash-safe, resumable inbox processing.
+
+While an inbox file sits in processing/, a small JSON journal next to it
+(`<name>.jsonl.journal`) records the last committed batch boundary:
+
+  input_offset    byte offset in the raw file just past the last line of the
+                  last written batch
+  output_offset   size of archive/<stem>.enriched.jsonl after that batch
+  ok / dedup      record counters up to that point (for the processed log)
+
+Commit order at every batch boundary: enriched lines are flushed and fsynced
+first, then the journal is replaced atomically (tmp + fsync + rename). A
+crash can therefore only leave output *past* output_offset, never a journal
+ahead of the output. On resume the output is truncated back to
+output_offset and reading continues at input_offset, so already enriched
+lines are neither repeated nor lost and their NLP is not redone.
+
+The output is always (re)opened as a fresh file: on resume the committed
+prefix is copied into a new file that replaces the old one, instead of
+truncating it in place. A worker whose lease expired (backend.lease) may
+still hold the old file open; whatever it writes afterwards goes to the
+replaced inode and never reaches the new owner's output.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import IO, Any, Dict
+import json
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path(processing_path: Path) -> Path:
+    return processing_path.with_name(processing_path.name + JOURNAL_SUFFIX)
+
+
+class FileJournal:
+    def __init__(self, path: Path, fsync: bool = True) -> None:
+        self.path = path
+        self.fsync = fsync
+        self.input_offset = 0
+        self.output_offset = 0
+        self.ok = 0
+        self.dedup = 0
+        self.resumed = False  # önceki bir süreçten kalan commit bulundu mu
+
+    @classmethod
+    def for_file(cls, processing_path: Path, fsync: bool = True) -> "FileJournal":
+        journal = cls(journal_path(processing_path), fsync=fsync)
+        journal._load()
+        return journal
+
+    # ---------- public API ----------
+
+    def open_output(self, out_path: Path) -> IO[str]:
+        """
+        Opens the enriched output for writing, always as a new file (see the
+        module docstring). On resume the new file holds the output up to the
+        last commit (lines written after it are redone); if the old one is
+        shorter than the journal says, the file is processed again from the
+        start.
+        """
+        if self.resumed:
+            try:
+                size = out_path.stat().st_size
+            except FileNotFoundError:
+                size = -1
+            if size >= self.output_offset:
+                tmp = out_path.with_name(out_path.name + ".tmp")
+                with out_path.open("rb") as src, tmp.open("wb") as dst:
+                    shutil.copyfileobj(_Prefix(src, self.output_offset), dst)
+                    if self.fsync:
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                os.replace(tmp, out_path)
+                logger.info("[journal] resuming %s at input byte %d (%d records already enriched)",
+                            out_path.name, self.input_offset, self.ok)
+                return out_path.open("a", encoding="utf-8")
+            logger.warning("[journal] %s is shorter than its journal (%d < %d); starting over",
+                           out_path.name, size, self.output_offset)
+            self.input_offset = self.output_offset = self.ok = self.dedup = 0
+            self.resumed = False
+        out_path.unlink(missing_ok=True)  # aynı inode'u "w" ile kesmek eski sahibin fd'sini de keser
+        return out_path.open("w", encoding="utf-8")
+
+    def commit(self, fout: IO[str], input_offset: int, ok: int, dedup: int) -> None:
+        """Batch boundary: make the output durable, then move the journal forward."""
+        fout.flush()
+        if self.fsync:
+            os.fsync(fout.fileno())
+        self.output_offset = os.fstat(fout.fileno()).st_size
+        self.input_offset = int(input_offset)
+        self.ok, self.dedup = int(ok), int(dedup)
+
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def discard(self) -> None:
+        for p in (self.path, self.path.with_name(self.path.name + ".tmp")):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "input_offset": self.input_offset,
+            "output_offset": self.output_offset,
+            "ok": self.ok,
+            "dedup": self.dedup,
+        }
+
+    # ---------- internals ----------
+
+    def _load(self) -> None:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            # rename atomik olduğu için olmamalı; yine de baştan işlemek güvenli tarafta kalır
+            logger.warning("[journal] unreadable %s (%s); starting over", self.path.name, e)
+            return
+        self.input_offset = int(data.get("input_offset", 0))
+        self.output_offset = int(data.get("output_offset", 0))
+        self.ok = int(data.get("ok", 0))
+        self.dedup = int(data.get("dedup", 0))
+        self.resumed = True
+
+
+class _Prefix:
+    """Read-only view of the first `limit` bytes of a binary file (for shutil.copyfileobj)."""
+
+    def __init__(self, f: IO[bytes], limit: int) -> None:
+        self.f = f
+        self.left = limit
+
+    def read(self, n: int = -1) -> bytes:
+        n = self.left if n < 0 else min(n, self.left)
+        data = self.f.read(n) if n > 0 else b""
+        self.left -= len(data)
+        return data
@@ -0,0 +1,240 @@
+"""
+File leasing between enrichment workers sharing one inbox (one host or a
+shared filesystem).
+
+Every worker owns a directory processing/<worker_id>/ holding a `.lease`
+file that a heartbeat thread rewrites every heartbeat_sec with
+`expires_at = now + ttl_sec`.
+
+  claim      inbox/<name> -> processing/<worker_id>/<name> with os.rename;
+             exactly one worker's rename succeeds, the others get
+             FileNotFoundError and move on
+  expiry     a worker whose lease has expired (crashed, frozen, host gone)
+             loses its directory: any live worker takes its files over with
+             the same atomic rename, the offset journal (backend.journal)
+             travels along, so the new owner resumes at the last commit
+  ownership  before writing a batch the owner checks its file is still in
+             its directory; if it was taken over, LeaseLost is raised and
+             the file is left to the new owner
+  fencing    the check and the takeover can interleave (an owner that was
+             only slow renews after another worker already judged it
+             expired), so nothing relies on the check alone:
+               - the journal is re-checked after its atomic rename; a
+                 journal written after a takeover is an orphan in the old
+                 directory and is dropped (LeaseLost)
+               - the new owner writes its output to a new file
+                 (FileJournal.open_output), so late writes of the old owner
+                 land in a replaced inode
+               - archiving is a rename of the raw file out of the owner's
+                 directory, which only the current owner can do
+
+Files directly in processing/ (older layout, single watcher) have no owner
+and are taken over like expired ones.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator, List, Optional
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from backend.journal import JOURNAL_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+LEASE_FILE = ".lease"
+
+
+class LeaseLost(Exception):
+    """The file was taken over by another worker after our lease expired."""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseManager:
+    def __init__(
+        self,
+        processing_dir: Path,
+        worker_id: Optional[str] = None,
+        ttl_sec: float = 30.0,
+        heartbeat_sec: float = 5.0,
+    ) -> None:
+        self.processing_dir = Path(processing_dir)
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl_sec = float(ttl_sec)
+        self.heartbeat_sec = min(float(heartbeat_sec), self.ttl_sec / 3.0)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._taken_over = 0
+        self._expires_at: Optional[float] = None
+        self._lapsed = 0  # heartbeat geç kaldı, lease arada düşmüştü
+
+    @property
+    def workdir(self) -> Path:
+        return self.processing_dir / self.worker_id
+
+    # ---------- public API ----------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.renew()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._heartbeat_loop, name=f"lease-{self.worker_id}",
+                                            daemon=True)
+            self._thread.start()
+
+    def renew(self, expires_at: Optional[float] = None) -> None:
+        now = time.time()
+        if self._expires_at is not None and 0.0 < self._expires_at < now:
+            # arada başka bir worker dosyalarımızı devralmış olabilir; yazma yolu LeaseLost ile öğrenir
+            self._lapsed += 1
+            logger.warning("[lease] %s renewed %.1fs after its lease expired; files may have been taken over",
+                           self.worker_id, now - self._expires_at)
+        lease = {
+            "worker": self.worker_id,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "expires_at": now + self.ttl_sec if expires_at is None else expires_at,
+        }
+        self.workdir.mkdir(parents=True, exist_ok=True)  # süresi dolup dizini toplanmışsa yeniden
+        path = self.workdir / LEASE_FILE
+        tmp = path.with_name(LEASE_FILE + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(lease, f)
+        os.replace(tmp, path)
+        self._expires_at = lease["expires_at"]
+
+    def claim(self, src: Path) -> Path:
+        """inbox -> own directory; FileNotFoundError if another worker was faster."""
+        self.start()
+        self.workdir.mkdir(parents=True, exist_ok=True)  # src yoksa rename yine FileNotFoundError verir
+        dst = self.workdir / src.name
+        os.rename(src, dst)
+        return dst
+
+    def check(self, path: Path) -> None:
+        """Raises LeaseLost if `path` is no longer in our directory."""
+        if not path.exists():
+            raise LeaseLost(f"{path.name} was taken over by another worker")
+
+    def owned_files(self) -> List[Path]:
+        if not self.workdir.is_dir():
+            return []
+        return [p for p in self.workdir.iterdir() if p.is_file() and p.suffix.lower() == ".jsonl"]
+
+    def foreign_files(self) -> List[Path]:
+        """Files held by other workers (live or expired) or by nobody."""
+        out: List[Path] = []
+        for d in [self.processing_dir] + [p for p in self.processing_dir.iterdir() if p.is_dir()]:
+            if d.name == self.worker_id:
+                continue
+            try:
+                out.extend(p for p in d.iterdir() if p.is_file() and p.suffix.lower() == ".jsonl")
+            except FileNotFoundError:
+                pass
+        return out
+
+    def take_over_expired(self) -> List[Path]:
+        """Moves files of expired (or ownerless) leases into our directory; returns them."""
+        self.start()
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        taken: List[Path] = []
+        for source in self._expired_sources():
+            for raw in sorted(p for p in source.iterdir() if p.is_file() and p.suffix.lower() == ".jsonl"):
+                dst = self.workdir / raw.name
+                try:
+                    os.rename(raw, dst)
+                except FileNotFoundError:
+                    continue  # başka bir worker aldı
+                journal = raw.with_name(raw.name + JOURNAL_SUFFIX)
+                try:
+                    os.rename(journal, dst.with_name(dst.name + JOURNAL_SUFFIX))
+                except FileNotFoundError:
+                    pass  # journal yoksa dosya baştan işlenir
+                taken.append(dst)
+            if source != self.processing_dir:
+                self._remove_if_empty(source)
+        if taken:
+            self._taken_over += len(taken)
+            logger.warning("[lease] %s took over %d file(s) from expired leases: %s",
+                           self.worker_id, len(taken), [p.name for p in taken[:5]])
+        return taken
+
+    def release(self) -> None:
+        """Stops the heartbeat; files still owned become available to others at once."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.heartbeat_sec + 1.0)
+            self._thread = None
+        if not self.workdir.is_dir():
+            return
+        if self.owned_files():
+            self.renew(expires_at=0.0)
+        else:
+            self._remove_if_empty(self.workdir)
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "ttl_sec": self.ttl_sec,
+            "owned_files": len(self.owned_files()),
+            "taken_over": self._taken_over,
+            "lapsed": self._lapsed,
+        }
+
+    # ---------- internals ----------
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_sec):
+            try:
+                self.renew()
+            except Exception as e:
+                logger.error("[lease] %s heartbeat failed: %s", self.worker_id, e)
+
+    def _expired_sources(self) -> Iterator[Path]:
+        yield self.processing_dir  # sahipsiz (eski düzen)
+        now = time.time()
+        for d in self.processing_dir.iterdir():
+            if not d.is_dir() or d.name == self.worker_id:
+                continue
+            try:
+                with (d / LEASE_FILE).open("r", encoding="utf-8") as f:
+                    expires_at = float(json.load(f).get("expires_at", 0.0))
+            except FileNotFoundError:
+                # lease yazılmadan ölmüş olabilir; dizin yeterince eskiyse sahipsiz say
+                try:
+                    expires_at = d.stat().st_mtime + self.ttl_sec
+                except FileNotFoundError:
+                    continue
+            except (OSError, ValueError):
+                continue  # yarım yazılmış lease: bir sonraki turda tekrar bak
+            if expires_at < now:
+                yield d
+
+    def _remove_if_empty(self, d: Path) -> None:
+        """Drops journals without a raw file, the lease and the directory once no file is left."""
+        try:
+            entries = list(d.iterdir())
+        except FileNotFoundError:
+            return
+        if any(p.suffix.lower() == ".jsonl" for p in entries):
+            return
+        for p in entries:
+            try:
+                p.unlink()
+            except (FileNotFoundError, IsADirectoryError, PermissionError):
+                pass
+        try:
+            d.rmdir()
+        except OSError:
+            pass
@@ -0,0 +1,67 @@
+"""
+Lease fencing: a worker whose lease expired keeps writing after another
+worker took its file over; none of that may reach the new owner's output,
+journal or archive.
+
+    python -m pytest backend/lease_test.py
+"""
+
+import pytest
+
+from backend.journal import FileJournal
+from backend.lease import LeaseLost, LeaseManager
+
+
+def test_stale_owner_cannot_touch_taken_over_file(tmp_path):
+    processing, archive = tmp_path / "processing", tmp_path / "archive"
+    (tmp_path / "inbox").mkdir()
+    archive.mkdir()
+    raw = tmp_path / "inbox" / "f.jsonl"
+    raw.write_text("".join(f'{{"id": {i}}}\n' for i in range(4)), encoding="utf-8")
+    out = archive / "f.enriched.jsonl"
+
+    a = LeaseManager(processing, worker_id="a", ttl_sec=30)
+    b = LeaseManager(processing, worker_id="b", ttl_sec=30)
+    try:
+        path_a = a.claim(raw)
+        journal_a = FileJournal.for_file(path_a, fsync=False)
+        fout_a = journal_a.open_output(out)
+        fout_a.write("a0\n")
+        journal_a.commit(fout_a, 12, 1, 0)
+        fout_a.write("a1-uncommitted\n")
+        fout_a.flush()
+
+        a.renew(expires_at=0.0)  # a donmuş gibi: lease düştü, b devralır
+        (path_b,) = b.take_over_expired()
+        journal_b = FileJournal.for_file(path_b, fsync=False)
+        assert journal_b.resumed and journal_b.input_offset == 12
+        fout_b = journal_b.open_output(out)
+
+        # a henüz fark etmedi: check'ten geçmiş bir batch'i yazıp commit ediyor
+        fout_a.write("a1-late\n")
+        path_a.parent.mkdir(exist_ok=True)  # b boşalan dizini topladı; a'nın heartbeat'i yeniden açar
+        journal_a.commit(fout_a, 24, 2, 0)
+        with pytest.raises(LeaseLost):
+            a.check(path_a)  # journal rename'inden sonraki tekrar kontrol
+        journal_a.discard()
+        with pytest.raises(FileNotFoundError):
+            path_a.rename(archive / path_a.name)  # arşivleme de yalnızca sahibin rename'i
+        fout_a.close()
+
+        fout_b.write("b1\n")
+        journal_b.commit(fout_b, 24, 2, 0)
+        fout_b.close()
+        assert out.read_text(encoding="utf-8") == "a0\nb1\n"
+        assert journal_b.path.exists() and not journal_a.path.exists()
+    finally:
+        a.release()
+        b.release()
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as d:
+        test_stale_owner_cannot_touch_taken_over_file(pathlib.Path(d))
+    print("ok")
@@ -3,21 +3,37 @@ from __future__ import annotations
 from typing import List, Optional
 from enum import Enum
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel, Field, ConfigDict
 
 from backend.models.nlp.sentiment.service import SentimentService
 from backend.models.nlp.topics.service import TopicClassificationService
+from backend.models.nlp.scheduler import (
+    MicroBatchScheduler, QueueFull, DeadlineExceeded, PRIORITY_HIGH, PRIORITY_NORMAL,
+)
+from backend.models.nlp.replicas import ReplicaPool
+from backend.neardup import NearDupIndex, hamming
+from backend.procmem import smaps_rollup
+from backend.pipeline import FilePipeline
+from backend.batch_sizer import AdaptiveBatchSizer
+from backend.aggregates import TOTAL, TieredCounters
+from backend.journal import JOURNAL_SUFFIX, FileJournal
+from backend.lease import LeaseLost, LeaseManager
+from backend.stream import StreamHub, sse_frame
 
 import logging, traceback
-import os, json, time, threading
+import os, json, math, time, threading, asyncio, uuid, hashlib
+from concurrent.futures import Future
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
-from collections import defaultdict, deque
+from collections import deque
 from typing import Dict, Tuple, Optional
 
 logger = logging.getLogger("api")
+_PROCESS_START = time.monotonic()  # cold start ölçümü için
 
 
 # --------- frontend urlleri merhaba efe ----------
@@ -102,25 +118,285 @@ class TopicClassificationBatchRequest(BaseModel):
 class TopicClassificationBatchResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     items: List[TopicClassificationResponse]
+    nli_pairs: Optional[int] = None             # bu istek için değerlendirilen NLI çifti sayısı
+
 
+class IngestResponse(BaseModel):
+    accepted: int                               # zenginleştirilip agregata yazılan kayıt
+    near_dup: int                               # bunlardan near-dup indeksinden gelen
+    skipped: Dict[str, int]                     # "400" boş metin, "413" çok uzun, "other"
+    archived: str                               # archive/ altındaki ham dosya adı
 
 
 # --------- servis (lazy yükleme) ----------
-svc = SentimentService(
-    lazy=True,
+# tahmin cache'i (normalize metin hash'i + model/eşik konfigi), 0 -> kapalı
+CACHE_MAX_ENTRIES = int(os.getenv("HASHARITA_CACHE_MAX_ENTRIES", "50000"))
+CACHE_TTL_SEC = float(os.getenv("HASHARITA_CACHE_TTL_SEC", "3600"))
+CACHE_MAX_MB = float(os.getenv("HASHARITA_CACHE_MAX_MB", "64"))
+
+SENTIMENT_KWARGS = dict(
     max_length=256,
     max_batch=64,
     neutral_threshold=0.65,
     tie_margin=0.08,
+    cache_entries=CACHE_MAX_ENTRIES,
+    cache_ttl_sec=CACHE_TTL_SEC,
+    cache_max_mb=CACHE_MAX_MB,
+)
+svc = SentimentService(lazy=True, **SENTIMENT_KWARGS)
+# flat: her metin 20 etikete karşı | hierarchical: önce kaba üst başlıklar, sonra kazanan dallar
+TOPICS_MODE = os.getenv("HASHARITA_TOPICS_MODE", "flat").lower()
+# anahtar kelime ön-filtresi isteğe bağlı: aday seti daraldığında altın etiketlerin bir kısmı hiç skorlanmaz;
+# açmadan önce hierarchy_eval --prior-only ile aday recall'ına bakın
+TOPICS_KEYWORD_PRIOR = os.getenv("HASHARITA_TOPICS_KEYWORD_PRIOR", "0") == "1"
+TOPICS_KWARGS = dict(
+    hierarchical=(TOPICS_MODE == "hierarchical"),
+    keyword_prior=TOPICS_KEYWORD_PRIOR,
+    cache_entries=CACHE_MAX_ENTRIES,
+    cache_ttl_sec=CACHE_TTL_SEC,
+    cache_max_mb=CACHE_MAX_MB,
 )
-topic_svc = TopicClassificationService()
+topic_svc = TopicClassificationService(**TOPICS_KWARGS)
+
+# --------- replica process pool (opsiyonel) ----------
+# 0 -> model bu process'te çalışır; >0 -> her replica modeli bir kez yükler, sabit torch thread'i ile çalışır
+# örn. 32 çekirdek: sentiment 2x4 + topics 3x8 thread, HASHARITA_PIN_CORES=1 ile çekirdekler ayrık
+SENTIMENT_REPLICAS = int(os.getenv("HASHARITA_SENTIMENT_REPLICAS", "0"))
+TOPICS_REPLICAS = int(os.getenv("HASHARITA_TOPICS_REPLICAS", "0"))
+SENTIMENT_THREADS = int(os.getenv("HASHARITA_SENTIMENT_THREADS_PER_REPLICA", "4"))
+TOPICS_THREADS = int(os.getenv("HASHARITA_TOPICS_THREADS_PER_REPLICA", "8"))
+PIN_CORES = os.getenv("HASHARITA_PIN_CORES", "0") == "1"
+
+# /metrics replikalardan servis sayaçlarını toplarken en fazla bu kadar bekler (meşgul replika atlanır)
+METRICS_REPLICA_TIMEOUT_SEC = float(os.getenv("HASHARITA_METRICS_REPLICA_TIMEOUT_SEC", "2"))
+
+sentiment_pool: Optional[ReplicaPool] = None
+topic_pool: Optional[ReplicaPool] = None
+if SENTIMENT_REPLICAS > 0:
+    sentiment_pool = ReplicaPool(
+        ("backend.models.nlp.sentiment.service", "SentimentService", dict(lazy=False, **SENTIMENT_KWARGS)),
+        replicas=SENTIMENT_REPLICAS,
+        threads_per_replica=SENTIMENT_THREADS,
+        pin_cores=PIN_CORES,
+        name="sentiment",
+    )
+if TOPICS_REPLICAS > 0:
+    topic_pool = ReplicaPool(
+        ("backend.models.nlp.topics.service", "TopicClassificationService", TOPICS_KWARGS),
+        replicas=TOPICS_REPLICAS,
+        threads_per_replica=TOPICS_THREADS,
+        pin_cores=PIN_CORES,
+        core_offset=SENTIMENT_REPLICAS * SENTIMENT_THREADS if PIN_CORES else 0,
+        name="topics",
+    )
+
+
+# ilk gerçek batch'in süresi (cold start sonrası ilk istek gecikmesi), /readyz'de raporlanır
+FIRST_BATCH_MS: Dict[str, float] = {}
+
+
+def _timed_first(name, fn, items):
+    if name in FIRST_BATCH_MS:
+        return fn(items)
+    t0 = time.perf_counter()
+    out = fn(items)
+    ms = (time.perf_counter() - t0) * 1000.0
+    if name not in FIRST_BATCH_MS:
+        FIRST_BATCH_MS[name] = round(ms, 1)
+        logger.info("[ready] first %s batch: %d items in %.1f ms", name, len(items), ms)
+    return out
+
+
+def _sentiment_batch(items):
+    if sentiment_pool is not None:
+        return _timed_first("sentiment", lambda x: sentiment_pool.call("predict_batch", x), items)
+    return _timed_first("sentiment", svc.predict_batch, items)
+
+
+def _topics_batch(texts):
+    if topic_pool is not None:
+        return _timed_first("topics", lambda x: topic_pool.call("classify_batch_detailed", x), texts)
+    return _timed_first("topics", topic_svc.classify_batch_detailed, texts)
+
+# --------- ortak inference scheduler (HTTP + watcher istekleri birleşir) ----------
+SCHED_MAX_BATCH_SENTIMENT = int(os.getenv("HASHARITA_SENTIMENT_SCHED_BATCH", "64"))
+SCHED_MAX_BATCH_TOPICS = int(os.getenv("HASHARITA_TOPICS_SCHED_BATCH", "32"))
+SCHED_MAX_WAIT_MS = float(os.getenv("HASHARITA_SCHED_MAX_WAIT_MS", "10"))
+# admission control: kuyrukta bekleyebilecek en fazla item; aşılırsa HTTP 429 + Retry-After
+SCHED_QUEUE_ITEMS_SENTIMENT = int(os.getenv("HASHARITA_SENTIMENT_QUEUE_ITEMS", "1024"))
+SCHED_QUEUE_ITEMS_TOPICS = int(os.getenv("HASHARITA_TOPICS_QUEUE_ITEMS", "256"))
+# istek başına deadline (kuyrukta bu kadar bekleyen iş modele hiç gitmez); X-Request-Deadline-Ms ile kısaltılabilir
+REQUEST_DEADLINE_MS = float(os.getenv("HASHARITA_REQUEST_DEADLINE_MS", "30000"))
+DISCONNECT_POLL_SEC = 0.25
+
+# sentiment + topics aynı batch için eşzamanlı çalışır; çekirdekler iki model arasında bölünür
+# (topics = xlm-roberta-large, ağır olan -> varsayılan 3/4). 0 -> seri (eski davranış)
+CONCURRENT_NLP = os.getenv("HASHARITA_CONCURRENT_NLP", "1") == "1"
+
+
+def nlp_thread_split(total: int) -> Tuple[int, int]:
+    """(sentiment, topics) intra-op thread sayıları; seri modda ikisi de tüm çekirdekleri kullanır."""
+    total = max(1, int(total))
+    if not CONCURRENT_NLP:
+        return total, total
+    topics = max(1, (total * 3) // 4)
+    return max(1, total - topics), topics
+
+
+_DEFAULT_SENTIMENT_THREADS, _DEFAULT_TOPICS_THREADS = nlp_thread_split(os.cpu_count() or 1)
+SENTIMENT_INTRA_THREADS = int(os.getenv("HASHARITA_SENTIMENT_INTRA_THREADS", str(_DEFAULT_SENTIMENT_THREADS)))
+TOPICS_INTRA_THREADS = int(os.getenv("HASHARITA_TOPICS_INTRA_THREADS", str(_DEFAULT_TOPICS_THREADS)))
+
+sentiment_sched = MicroBatchScheduler(
+    _sentiment_batch,
+    max_batch=SCHED_MAX_BATCH_SENTIMENT,
+    max_wait_ms=SCHED_MAX_WAIT_MS,
+    name="sentiment",
+    max_queue_items=SCHED_QUEUE_ITEMS_SENTIMENT,
+    # replica havuzunda thread'leri replikalar kendisi ayarlıyor
+    intra_op_threads=SENTIMENT_INTRA_THREADS if sentiment_pool is None else 0,
+)
+topic_sched = MicroBatchScheduler(
+    _topics_batch,
+    max_batch=SCHED_MAX_BATCH_TOPICS,
+    max_wait_ms=SCHED_MAX_WAIT_MS,
+    name="topics",
+    max_queue_items=SCHED_QUEUE_ITEMS_TOPICS,
+    intra_op_threads=TOPICS_INTRA_THREADS if topic_pool is None else 0,
+)
+
+
+def _request_deadline(request: Request) -> float:
+    deadline_ms = REQUEST_DEADLINE_MS
+    header = request.headers.get("x-request-deadline-ms")
+    if header:
+        try:
+            deadline_ms = min(deadline_ms, max(1.0, float(header)))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Deadline-Ms must be a number")
+    return time.monotonic() + deadline_ms / 1000.0
+
+
+def _request_priority(request: Request) -> int:
+    # acil istemciler "X-Priority: emergency" (veya high) ile bulk işin önüne geçer
+    value = (request.headers.get("x-priority") or "").strip().lower()
+    return PRIORITY_HIGH if value in ("emergency", "high") else PRIORITY_NORMAL
+
+
+async def _run_inference(sched: MicroBatchScheduler, items, request: Request):
+    """
+    Kuyruğa koyar ve sonucu event loop'u bloklamadan bekler.
+    Kuyruk dolu -> 429 + Retry-After | deadline -> 504 | client koptu -> iş iptal edilir.
+    """
+    deadline = _request_deadline(request)
+    try:
+        fut = sched.submit_async(items, deadline=deadline, priority=_request_priority(request))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    waiter = asyncio.wrap_future(fut)
+    waiter.add_done_callback(lambda f: f.cancelled() or f.exception())  # "never retrieved" uyarısı olmasın
+    while True:
+        done, _ = await asyncio.wait({waiter}, timeout=DISCONNECT_POLL_SEC)
+        if done:
+            try:
+                return waiter.result()
+            except DeadlineExceeded as e:
+                raise HTTPException(status_code=504, detail=str(e))
+        if await request.is_disconnected():
+            fut.cancel()  # henüz batch'e alınmadıysa model hiç çalışmaz
+            raise HTTPException(status_code=499, detail="client disconnected")
+        if time.monotonic() > deadline:
+            fut.cancel()
+            raise HTTPException(status_code=504, detail="deadline exceeded")
 
 # --------- healthcheckkkkkkk ----------
+# /healthz: liveness (process ayakta) | /readyz: modeller yüklü + ısınmış mı (LB bunu kullanır)
+PRELOAD_MODELS = os.getenv("HASHARITA_PRELOAD_MODELS", "1") == "1"
+COLD_START_SEC: Optional[float] = None
+
+
 @app.get("/healthz")
 def healthz():
     return {"ready": True}
 
 
+def _model_states() -> dict:
+    return {
+        "sentiment": sentiment_pool.load_status() if sentiment_pool is not None else svc.load_status(),
+        "topics": topic_pool.load_status() if topic_pool is not None else topic_svc.load_status(),
+    }
+
+
+@app.get("/readyz")
+def readyz():
+    models = _model_states()
+    # preload kapalıysa eski lazy davranış: model ilk istekte yüklenir, instance hazır sayılır
+    ready = all(m["state"] == "ready" for m in models.values()) or not PRELOAD_MODELS
+    body = {
+        "ready": ready,
+        "preload": PRELOAD_MODELS,
+        "cold_start_sec": COLD_START_SEC,
+        "first_batch_ms": dict(FIRST_BATCH_MS),
+        "models": models,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+# --------- metrics ----------
+# replika başına ayar olan alanlar toplanmaz; oranlar toplamlardan yeniden hesaplanır
+_REPLICA_STAT_SETTINGS = {"max_entries", "max_bytes", "ttl_sec"}
+
+
+def _replica_stats(pool: ReplicaPool, method: str):
+    """
+    Replika modunda servis sayaçları replika süreçlerinde artar, parent'taki servis hiç çalışmaz:
+    her replikadan `method`() toplanıp sayaçlar toplanır. Hiçbiri cevap vermezse None.
+    """
+    parts = [p for p in pool.call_each(method, timeout=METRICS_REPLICA_TIMEOUT_SEC) if p]
+    if not parts:
+        return None
+    out = {}
+    for key, value in parts[0].items():
+        if key not in _REPLICA_STAT_SETTINGS and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = sum(p.get(key, 0) for p in parts)
+        out[key] = value
+    if "hit_ratio" in out:
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = (out["hits"] / lookups) if lookups else 0.0
+    if "avg_pairs_per_text" in out:
+        out["avg_pairs_per_text"] = (out["nli_pairs"] / out["texts"]) if out["texts"] else 0.0
+    out["replicas_reporting"] = len(parts)
+    return out
+
+
+@app.get("/metrics")
+def get_metrics():
+    return {
+        "scheduler": {
+            "sentiment": sentiment_sched.stats(),
+            "topics": topic_sched.stats(),
+        },
+        "topics": topic_svc.stats() if topic_pool is None else _replica_stats(topic_pool, "stats"),
+        "cache": {
+            "sentiment": svc.cache_stats() if sentiment_pool is None else _replica_stats(sentiment_pool, "cache_stats"),
+            "topics": topic_svc.cache_stats() if topic_pool is None else _replica_stats(topic_pool, "cache_stats"),
+        },
+        "neardup": NEARDUP.stats(),
+        "lanes": _lane_latency_stats(),
+        "aggregates": dict(AGG.stats(), snapshots=dict(SNAPSHOT_STATS)),
+        "watcher": _watcher_stats(),
+        "ingest": dict(INGEST_STATS),
+        "stream": STREAM.stats(),
+        "replicas": {
+            "sentiment": sentiment_pool.stats() if sentiment_pool is not None else None,
+            "topics": topic_pool.stats() if topic_pool is not None else None,
+        },
+        # worker başına: rss / pss / shared (paylaşılan model ağırlıkları) / private, MiB
+        "memory": dict(pid=os.getpid(), **(smaps_rollup() or {})),
+    }
+
+
 # --------- Topics: desteklenen etiketler ----------
 @app.get("/topics/labels", response_model=List[str])
 def get_topic_labels() -> List[str]:
@@ -135,26 +411,85 @@ def get_topic_labels() -> List[str]:
             raise HTTPException(status_code=500, detail="labels unavailable")
 #-------------------------------------------------- aggregates (in-memory) ----------
 @app.get("/map/aggregates")
-def get_map_aggregates(level: str = "city", window: str = "15m"):
+def get_map_aggregates(request: Request, level: str = "city", window: str = "15m", since: Optional[str] = None):
     """
     level: 'city' (il bazlı) veya 'district' (ilçe bazlı)
-    window: '15m', '60m', '30s', '2h' gibi
+    window: '15m', '60m', '30s', '2h', '7d' gibi; virgülle birden çok pencere tek istekte ("15m,1h,24h")
+    since: önceki yanıtın "version" token'ı; yalnızca o sürümden beri değişen satırlar (items) ve
+           pencereden düşenler (removed) döner. Token çok eskiyse tam snapshot, "full": true.
+    ETag döner; If-None-Match hâlâ eşleşiyorsa 304 (gövde yok).
     """
     level = (level or "city").lower()
     if level not in ("city", "district"):
         raise HTTPException(status_code=400, detail="level must be 'city' or 'district'")
+    windows = list(dict.fromkeys(w.strip() for w in (window or "15m").split(",") if w.strip())) or ["15m"]
+    since = (since or "").strip() or None
+    if since and len(windows) > 1:
+        raise HTTPException(status_code=400, detail="since is supported with a single window")
     try:
-        snap = _agg_snapshot(level, window)
-        return snap
+        parts = [_agg_snapshot_cached(level, w, since) for w in windows]
     except Exception as e:
         logger.exception("/map/aggregates failed: %s", e)
         raise HTTPException(status_code=500, detail="internal error")
 
+    if len(parts) == 1:
+        etag, body = parts[0]
+    else:
+        etag = _etag("".join(tag for tag, _ in parts).encode())
+        body = None
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # her seferinde doğrula, 304 ucuz
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        SNAPSHOT_STATS["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        # pencere gövdeleri zaten serileştirilmiş; sadece birleştir
+        body = b"".join([
+            b'{"level":', json.dumps(level).encode(), b',"windows":{',
+            b",".join(json.dumps(w, ensure_ascii=False).encode() + b":" + part for w, (_, part) in zip(windows, parts)),
+            b"}}",
+        ])
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/map/stream")
+async def map_stream(request: Request, level: str = "city", window: str = "15m", interval: float = 0.0):
+    """
+    /map/aggregates'in push karşılığı (Server-Sent Events). İlk kare tam snapshot (event: snapshot),
+    sonra değişiklik oldukça delta'lar (event: delta; ?since= yanıtıyla aynı gövde). id = sürüm token'ı:
+    yeniden bağlanan EventSource Last-Event-ID gönderir ve kaldığı yerden delta alır.
+    interval: bu abone için en az kaç saniyede bir kare (varsayılan STREAM_TICK_SEC).
+    """
+    level = (level or "city").lower()
+    if level not in ("city", "district"):
+        raise HTTPException(status_code=400, detail="level must be 'city' or 'district'")
+    window = (window or "15m").strip()
+    if "," in window:
+        raise HTTPException(status_code=400, detail="stream supports a single window")
+    since = (request.headers.get("last-event-id") or "").strip() or None
+    sub = await STREAM.subscribe((level, window), interval=max(0.0, interval), since=since)
+    if sub is None:
+        raise HTTPException(status_code=429, detail="too many stream subscribers", headers={"Retry-After": "30"})
+
+    async def frames():
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                frame = await sub.get()
+                if frame is None:  # yavaş tüketici olarak kapatıldı; EventSource yeniden bağlanır
+                    break
+                yield frame
+        finally:
+            STREAM.unsubscribe(sub)
+
+    # X-Accel-Buffering: nginx arkasında karelerin tamponlanmaması için
+    return StreamingResponse(frames(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
         
 # --------- Topics Batch endpoint ----------
 
 @app.post("/predict/topics", response_model=TopicClassificationBatchResponse)
-def predict_topics(payload: TopicClassificationBatchRequest) -> TopicClassificationBatchResponse:
+async def predict_topics(payload: TopicClassificationBatchRequest, request: Request) -> TopicClassificationBatchResponse:
     bad_ids = [it.id for it in payload.items if it.text.strip() == ""]
     if bad_ids:
         raise HTTPException(status_code=400, detail=f"Empty text for id(s): {', '.join(bad_ids)}")
@@ -162,10 +497,13 @@ def predict_topics(payload: TopicClassificationBatchRequest) -> TopicClassificat
     texts = [it.text for it in payload.items]
 
     try:
-        classified = topic_svc.classify_batch(texts)
-        items = [TopicClassificationResponse(id=req.id, topics=topics)
-                 for req, topics in zip(payload.items, classified)]
-        return TopicClassificationBatchResponse(items=items)
+        classified = await _run_inference(topic_sched, texts, request)
+        items = [TopicClassificationResponse(id=req.id, topics=res["topics"])
+                 for req, res in zip(payload.items, classified)]
+        nli_pairs = sum(res["nli_pairs"] for res in classified)
+        return TopicClassificationBatchResponse(items=items, nli_pairs=nli_pairs)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -178,7 +516,7 @@ def predict_topics(payload: TopicClassificationBatchRequest) -> TopicClassificat
 
 # --------- Batch endpoint ----------
 @app.post("/predict/sentiment", response_model=SentimentBatchResponse)
-def predict_sentiment(payload: SentimentBatchRequest) -> SentimentBatchResponse:
+async def predict_sentiment(payload: SentimentBatchRequest, request: Request) -> SentimentBatchResponse:
     # whitespace-only metinleri reddet (servis zaten kontrol ediyor, ama burada da erken yakalayalım)
     bad_ids = [it.id for it in payload.items if it.text.strip() == ""]
     if bad_ids:
@@ -188,7 +526,9 @@ def predict_sentiment(payload: SentimentBatchRequest) -> SentimentBatchResponse:
     req_items = [{"id": it.id, "text": it.text} for it in payload.items]
 
     try:
-        svc_out = svc.predict_batch(req_items)
+        svc_out = await _run_inference(sentiment_sched, req_items, request)
+    except HTTPException:
+        raise
     except ValueError as e:
         
         raise HTTPException(status_code=400, detail=str(e))
@@ -211,8 +551,33 @@ ARCHIVE_DIR = DATA_BASE / "archive"
 FAILED_DIR = DATA_BASE / "failed"
 
 # Ayarlar
-POLL_INTERVAL_SEC = 1.0          # her 1 sn bak
-BATCH_SIZE = 10                   # küçük batch (CPU-only hedef)
+POLL_INTERVAL_SEC = 1.0          # poll modunda her 1 sn bak
+# notify: watchfiles (inotify) ile .part -> .jsonl rename'ine anında tepki; hata olursa poll'a düşer
+WATCHER_MODE = os.getenv("HASHARITA_WATCHER_MODE", "notify").lower()
+WATCHER_RESCAN_SEC = float(os.getenv("HASHARITA_WATCHER_RESCAN_SEC", "30"))  # notify modunda kaçan olay için güvenlik taraması
+WATCHER_ACTIVE_MODE = None
+PICKUP_LATENCY: deque = deque(maxlen=2048)  # dosyanın inbox'a düşmesi (mtime) -> işlemeye başlama, sn
+# pipeline: okuma / inference / yazma ayrı thread'lerde, birden çok dosya aynı anda (0 -> eski sıralı döngü)
+WATCHER_PIPELINE = os.getenv("HASHARITA_WATCHER_PIPELINE", "1") == "1"
+PIPELINE_BULK_READERS = int(os.getenv("HASHARITA_PIPELINE_READERS", "2"))
+PIPELINE_INFER_WORKERS = int(os.getenv("HASHARITA_PIPELINE_INFER_WORKERS", "2"))
+PIPELINE_MAX_BATCHES = int(os.getenv("HASHARITA_PIPELINE_MAX_BATCHES", "16"))  # kuyruklardaki batch sınırı
+BATCH_SIZE = int(os.getenv("HASHARITA_BATCH_SIZE", "10"))  # başlangıç; adaptif kontrolcü büyütür / küçültür
+# adaptif batch: hedef NLP süresi / batch, inbox birikimi ve scheduler kuyruk derinliğine göre (backend.batch_sizer)
+ADAPTIVE_BATCH = os.getenv("HASHARITA_ADAPTIVE_BATCH", "1") == "1"
+BATCH_TARGET_MS = float(os.getenv("HASHARITA_BATCH_TARGET_MS", "1500"))
+BATCH_MIN = int(os.getenv("HASHARITA_BATCH_MIN", "1"))
+# sentiment servisi max_batch'ten büyük isteği reddeder -> üst sınır onu geçmez
+BATCH_MAX = min(int(os.getenv("HASHARITA_BATCH_MAX", "64")), SENTIMENT_KWARGS["max_batch"])
+EMERGENCY_BATCH_MAX = int(os.getenv("HASHARITA_EMERGENCY_BATCH_MAX", "8"))
+# her batch sınırında enriched çıktı + offset journal'ı diske (fsync); kapatılırsa çökme değil sadece süreç ölümüne karşı korur
+JOURNAL_FSYNC = os.getenv("HASHARITA_JOURNAL_FSYNC", "1") == "1"
+RESUMED_FILES = 0
+# birden çok enrichment worker'ı (backend.worker / API watcher'ı) aynı inbox'ı lease ile paylaşır
+LEASE_TTL_SEC = float(os.getenv("HASHARITA_LEASE_TTL_SEC", "30"))
+LEASES = LeaseManager(PROCESSING_DIR, worker_id=os.getenv("HASHARITA_WORKER_ID") or None, ttl_sec=LEASE_TTL_SEC)
+_LEASE_CHECK = [0.0]  # son süresi dolmuş lease taraması (monotonic)
+AVG_RECORD_BYTES = 400            # inbox birikimini bayttan kayıt sayısına çevirmek için kaba ortalama
 MAX_LINE_CHARS = 10000            # "çok uzun metin" için kaba sınır
 
 # Eşik varsayımları (NLP sonrası)
@@ -220,6 +585,67 @@ TOP_K = 3
 MIN_SCORE = 0.35
 RELATIVE_MARGIN = 0.02
 
+# Öncelik şeritleri: scraper'ın _save_emergency_tweets dosyaları bulk batch'lerin önüne geçer
+EMERGENCY_FILE_PREFIX = os.getenv("HASHARITA_EMERGENCY_PREFIX", "tweets_emergency_")
+LANE_LATENCY: Dict[str, deque] = {"emergency": deque(maxlen=2048), "bulk": deque(maxlen=2048)}
+LANE_LATENCY_LOCK = threading.Lock()
+
+
+def _scraped_at(rec: dict) -> Optional[float]:
+    raw = rec.get("scraping_timestamp") or rec.get("scraped_at")
+    if not raw:
+        return None
+    try:
+        # scraper naive yerel saat yazıyor -> timestamp() yerel saat dilimini kullanır
+        return datetime.fromisoformat(str(raw)).timestamp()
+    except ValueError:
+        return None
+
+
+def _record_lane_latency(lane: str, rec: dict, aggregated_at: float):
+    """scrape -> agregat gecikmesi (sn), şerit başına son 2048 kayıt"""
+    scraped = _scraped_at(rec)
+    if scraped is None:
+        return
+    with LANE_LATENCY_LOCK:
+        LANE_LATENCY.setdefault(lane, deque(maxlen=2048)).append(max(0.0, aggregated_at - scraped))
+
+
+def _watcher_stats() -> dict:
+    v = sorted(PICKUP_LATENCY)
+    return {
+        "mode": WATCHER_ACTIVE_MODE,
+        "pipeline": PIPELINE.stats() if WATCHER_PIPELINE else None,
+        "batch_size": BATCH_SIZER.stats(),
+        "files": len(v),
+        "resumed_files": RESUMED_FILES,
+        "lease": LEASES.stats(),
+        "pickup_latency_p50_ms": round(v[len(v) // 2] * 1000.0, 1) if v else None,
+        "pickup_latency_p95_ms": round(v[int(len(v) * 0.95)] * 1000.0, 1) if v else None,
+        "pickup_latency_max_ms": round(v[-1] * 1000.0, 1) if v else None,
+    }
+
+
+def _lane_latency_stats() -> dict:
+    out = {}
+    with LANE_LATENCY_LOCK:
+        for lane, values in LANE_LATENCY.items():
+            v = sorted(values)
+            out[lane] = {
+                "records": len(v),
+                "scrape_to_aggregate_p50_sec": round(v[len(v) // 2], 3) if v else None,
+                "scrape_to_aggregate_p95_sec": round(v[int(len(v) * 0.95)], 3) if v else None,
+                "scrape_to_aggregate_max_sec": round(v[-1], 3) if v else None,
+            }
+    return out
+
+# Near-duplicate (SimHash/LSH) kısa yolu: benzer metin -> temsilcinin sonuçlarını kopyala
+NEARDUP_ENABLED = os.getenv("HASHARITA_NEARDUP", "1") == "1"
+NEARDUP = NearDupIndex(
+    max_distance=int(os.getenv("HASHARITA_NEARDUP_MAX_DISTANCE", "3")),
+    horizon_sec=float(os.getenv("HASHARITA_NEARDUP_HORIZON_SEC", str(6 * 3600))),
+)
+
 # Grup de-dup kümeleri
 GROUPS = [
     {"trafik", "ulaşım"},
@@ -230,6 +656,7 @@ GROUPS = [
 def _ensure_dirs():
     for d in [INBOX_DIR, PROCESSING_DIR, ARCHIVE_DIR, FAILED_DIR]:
         d.mkdir(parents=True, exist_ok=True)
+    LEASES.processing_dir = PROCESSING_DIR  # bench / test dizinleri değiştirebilir
 
 def _is_jsonl_file(p: Path) -> bool:
     return p.is_file() and p.suffix.lower() == ".jsonl"
@@ -298,12 +725,64 @@ def _apply_thresholds_and_dedup(topic_scores, top_k=TOP_K, min_score=MIN_SCORE,
 
     return deduped
 
-def _process_and_write_batch(batch_recs, batch_texts, batch_ids, fout):
+def _match_near_duplicates(batch_texts):
+    """
+    Her kayıt için: (fingerprint, index temsilcisi veya None, batch içi temsilci indeksi veya None).
+    Index'te yoksa aynı batch'teki önceki taze kayıtlara da bakılır.
+    """
+    fps, hits, in_batch = [], [], []
+    fresh = []  # (idx, fp)
+    for i, text in enumerate(batch_texts):
+        fp = NEARDUP.fingerprint(text) if NEARDUP_ENABLED else None
+        hit = NEARDUP.lookup(fp) if fp is not None else None
+        local = None
+        if hit is None and fp is not None:
+            for j, fpj in fresh:
+                if hamming(fp, fpj) <= NEARDUP.max_distance:
+                    local = j
+                    break
+        if hit is None and local is None and fp is not None:
+            fresh.append((i, fp))
+        fps.append(fp)
+        hits.append(hit)
+        in_batch.append(local)
+    return fps, hits, in_batch
+
+
+def _submit_nlp(sched: MicroBatchScheduler, items, priority) -> Future:
+    """block=True ile kuyruğa koyar; gönderim hatası da future üzerinden döner."""
+    try:
+        return sched.submit_async(items, block=True, priority=priority)
+    except Exception as e:
+        fut = Future()
+        fut.set_exception(e)
+        return fut
+
+
+def _enrich_batch(batch_recs, batch_texts, batch_ids, lane="bulk"):
+    """
+    NLP + near-dup kısa yolu; dosyaya / agregata dokunmaz.
+    Returns (enriched kayıtlar (girdi sırasıyla), near-dup'tan gelen kayıt sayısı).
+    """
+    priority = PRIORITY_HIGH if lane == "emergency" else PRIORITY_NORMAL
+    fps, hits, in_batch = _match_near_duplicates(batch_texts)
+    fresh_idx = [i for i in range(len(batch_recs)) if hits[i] is None and in_batch[i] is None]
+    fresh_texts = [batch_texts[i] for i in fresh_idx]
+    fresh_ids = [batch_ids[i] for i in fresh_idx]
+    req_items = [{"id": i, "text": t} for i, t in zip(fresh_ids, fresh_texts)]
+    nlp_started = time.perf_counter()
+
+    # eşzamanlı mod: iki model kendi scheduler thread'lerinde aynı anda; batch süresi ~ yavaş olanınki
+    topics_fut = _submit_nlp(topic_sched, fresh_texts, priority) if CONCURRENT_NLP else None
+    sent_fut = _submit_nlp(sentiment_sched, req_items, priority) if CONCURRENT_NLP else None
+
     # ---- Topics ----
     try:
-        topics_raw = topic_svc.classify_batch(batch_texts)  # List[List[TopicScore veya dict]]
+        # watcher 429 almaz: kuyrukta yer açılana kadar bekler
+        topics_raw = (topics_fut or _submit_nlp(topic_sched, fresh_texts, priority)).result()  # List[{topics, nli_pairs}]
         topics_clean = []
-        for lst in topics_raw:
+        for res in topics_raw:
+            lst = res["topics"]
             items = [
                 {
                     "label": (it.label if hasattr(it, "label") else it["label"]),
@@ -314,149 +793,710 @@ def _process_and_write_batch(batch_recs, batch_texts, batch_ids, fout):
             topics_clean.append(_apply_thresholds_and_dedup(items))
     except Exception as e:
         logger.exception("topics classify failed: %s", e)
-        topics_clean = [[] for _ in batch_texts]
+        topics_clean = [[] for _ in fresh_texts]
 
     # ---- Sentiment ----
     try:
-        req_items = [{"id": i, "text": t} for i, t in zip(batch_ids, batch_texts)]
-        sent_out = svc.predict_batch(req_items)  # [{id, sentiment{label,score}, topics:[]}]
+        sent_out = (sent_fut or _submit_nlp(sentiment_sched, req_items, priority)).result()  # [{id, sentiment{label,score}, topics:[]}]
         sent_map = {x["id"]: x["sentiment"] for x in sent_out}
     except Exception as e:
         logger.exception("sentiment failed: %s", e)
         sent_map = {}
 
-    # ---- Enriched kayıtları yaz ----
-    for rec, topics_labels in zip(batch_recs, topics_clean):
-        sid = rec["id"]
-        sentiment = sent_map.get(sid)
+    if fresh_texts:
+        # yalnızca gerçekten modelden geçen kayıtlar: near-dup'lar kayıt başı süreyi düşük gösterirdi
+        BATCH_SIZER.observe(
+            len(fresh_texts),
+            time.perf_counter() - nlp_started,
+            queue_depth=topic_sched.pending_items + sentiment_sched.pending_items,
+        )
+
+    # taze kayıtların sonuçları + near-dup index'e temsilci olarak ekle
+    results = {}
+    for i, topics_labels in zip(fresh_idx, topics_clean):
+        sentiment = sent_map.get(batch_ids[i])
+        results[i] = (sentiment, topics_labels)
+        if sentiment is not None:
+            NEARDUP.add(fps[i], str(batch_ids[i]), {"sentiment": sentiment, "topics": topics_labels})
+
+    # ---- Enriched kayıtlar ----
+    dedup_hits = 0
+    enriched_recs = []
+    for i, rec in enumerate(batch_recs):
         enriched = dict(rec)  # kopya
+        if i in results:
+            sentiment, topics_labels = results[i]
+        else:
+            # near-duplicate: temsilcinin sonucunu kopyala, denetlenebilir olsun diye id'sini yaz
+            if hits[i] is not None:
+                rep_id, payload = hits[i]
+                sentiment, topics_labels = payload["sentiment"], payload["topics"]
+            else:
+                rep_id = str(batch_ids[in_batch[i]])
+                sentiment, topics_labels = results[in_batch[i]]
+            enriched["dedup_of"] = rep_id
+            dedup_hits += 1
+
         if sentiment:
-            enriched["sentiment"] = sentiment
-        enriched["topics"] = topics_labels or []
+            enriched["sentiment"] = dict(sentiment)
+        enriched["topics"] = list(topics_labels or [])
+        enriched_recs.append(enriched)
+
+    return enriched_recs, dedup_hits
 
+
+def _write_enriched(enriched_recs, fout, lane="bulk"):
+    """Agregata ekler ve enriched satırları yazar (çağıran dosya sırasını korur)."""
+    for enriched in enriched_recs:
         # >>>>> : agregata yaz
         now_ts = time.time()
         city = (enriched.get("city") or "İstanbul")
         district = enriched.get("district")
         sent_label = None
+        sentiment = enriched.get("sentiment")
         if sentiment:
             sent_label = sentiment.get("label")
 
         for tp in enriched["topics"]:
             # Her topic için sentiment bilgisini de ekle
             _agg_add(city, district, tp, now_ts, sent_label)
+        _record_lane_latency(lane, enriched, now_ts)
 
         # <<<<< EKLEME BİTTİ
 
         fout.write(json.dumps(enriched, ensure_ascii=False) + "\n")
+    if enriched_recs:
+        STREAM.notify()  # /map/stream aboneleri: tick başına tek kare
+
+
+def _parse_valid_line(line, counts) -> Optional[dict]:
+    """Tek JSONL satırı -> geçerli kayıt ya da None (atlanan counts'a yazılır; boş satır sayılmaz)."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        rec = json.loads(line)
+    except Exception:
+        counts["other"] += 1
+        return None
+
+    valid, reason = _validate_line(rec)
+    if not valid:
+        if reason == "empty_text":
+            counts["400"] += 1
+        elif reason == "text_too_long":
+            counts["413"] += 1
+        else:
+            counts["other"] += 1
+        return None
+    return rec
 
 
-def _process_jsonl_file(file_path: Path):
+def _iter_valid_batches(fin, counts, lane="bulk", offset=0):
+    """
+    JSONL satırlarını (binary fin, `offset`'ten itibaren) doğrular, geçerlileri
+    (recs, texts, ids, end_offset) batch'leri halinde verir; end_offset batch'in son
+    satırından sonraki bayt -> journal commit noktası.
+    Batch boyu her batch başında adaptif kontrolcüden alınır.
+    Atlananlar counts'a yazılır: "400" (boş metin), "413" (çok uzun), "other".
+    """
+    batch_size = BATCH_SIZER.next_size(lane)
+    batch_recs, batch_texts, batch_ids = [], [], []
+    for raw in fin:
+        offset += len(raw)
+        rec = _parse_valid_line(raw, counts)
+        if rec is None:
+            continue
+
+        # batch'e ekle
+        batch_recs.append(rec)
+        batch_texts.append(rec["text"])
+        batch_ids.append(rec["id"])
+
+        # batch doldu mu?
+        if len(batch_recs) >= batch_size:
+            yield batch_recs, batch_texts, batch_ids, offset
+            batch_recs, batch_texts, batch_ids = [], [], []
+            batch_size = BATCH_SIZER.next_size(lane)
+
+    # kalanlar
+    if batch_recs:
+        yield batch_recs, batch_texts, batch_ids, offset
+
+
+def _claim_inbox_file(file_path: Path) -> Path:
+    """
+    inbox -> processing/<worker_id>/ (lease; pickup gecikmesini ölçerek). Başka bir worker
+    önce aldıysa FileNotFoundError. Zaten bizim dizinimizdeki (yarım kalmış) dosya olduğu gibi döner.
     """
-    JSONL dosyasını işler:
+    if file_path.parent == LEASES.workdir:
+        return file_path
+    processing_path = LEASES.claim(file_path)
+    PICKUP_LATENCY.append(max(0.0, time.time() - processing_path.stat().st_mtime))  # rename mtime'ı korur
+    return processing_path
+
+
+def _commit_batch(journal: FileJournal, processing_path: Path, fout, end_offset: int, ok: int, dedup: int):
+    """Journal'ı ilerletir; rename'den sonra sahipliği tekrar kontrol eder (lease fencing)."""
+    try:
+        journal.commit(fout, end_offset, ok, dedup)
+    except FileNotFoundError:
+        LEASES.check(processing_path)  # dizinimiz devralınıp toplanmış -> LeaseLost
+        raise
+    try:
+        LEASES.check(processing_path)
+    except LeaseLost:
+        journal.discard()  # devralınmış: yazdığımız journal eski dizinde sahipsiz, yeni sahibinki kendi dizininde
+        raise
+
+
+def _archive_raw(processing_path: Path):
+    """Ham dosyayı archive'a taşır; dosya artık dizinimizde değilse (devralınmış) LeaseLost."""
+    try:
+        _safe_move(processing_path, ARCHIVE_DIR / processing_path.name)
+    except FileNotFoundError:
+        raise LeaseLost(f"{processing_path.name} was taken over by another worker") from None
+
+
+def _open_journal(processing_path: Path) -> FileJournal:
+    global RESUMED_FILES
+    journal = FileJournal.for_file(processing_path, fsync=JOURNAL_FSYNC)
+    if journal.resumed:
+        RESUMED_FILES += 1
+    return journal
+
+
+def _interrupted_files():
+    """
+    Yarım kalmış .jsonl'ler: kendi lease dizinimizde kalanlar (aynı worker id ile yeniden başlama)
+    ve süresi dolmuş lease'lerden devralınanlar. Ham dosyası artık olmayan journal'lar
+    (archive'a taşındıktan sonra ölmüş) silinir.
+    """
+    _LEASE_CHECK[0] = time.monotonic()
+    LEASES.take_over_expired()
+    for j in LEASES.workdir.glob("*" + JOURNAL_SUFFIX):
+        if not j.with_name(j.name[: -len(JOURNAL_SUFFIX)]).exists():
+            j.unlink(missing_ok=True)
+    return sorted(LEASES.owned_files(), key=lambda p: (_file_lane(p) != "emergency", p.name))
+
+
+def _resume_interrupted():
+    """Yarım kalan dosyalara journal'daki offset'ten devam et (inbox'takilerden önce)."""
+    files = _interrupted_files()
+    if WATCHER_PIPELINE:
+        files = [p for p in files if PIPELINE.submit(p, _file_lane(p))]  # uçuştakiler elenir
+    if files:
+        logger.info("[watcher] resuming %d interrupted file(s) from processing/", len(files))
+    if not WATCHER_PIPELINE:
+        for p in files:
+            _process_jsonl_file(p, _file_lane(p))
+
+
+def _log_processed(processing_path: Path, lane, ok_count, dedup_count, counts, enriched_out: Path):
+    logger.info(
+        "[watcher] processed %s [%s] | ok=%d (near-dup=%d), 400-skip=%d, 413-skip=%d, other=%d | enriched=%s",
+        processing_path.name, lane, ok_count, dedup_count, counts["400"], counts["413"], counts["other"],
+        enriched_out.name,
+    )
+
+
+def _process_jsonl_file(file_path: Path, lane: str = "bulk"):
+    """
+    JSONL dosyasını işler (sıralı yol; HASHARITA_WATCHER_PIPELINE=0):
       - processing/'e taşır
       - satırları doğrular (400/413/other sayımı)
       - NLP (sentiment + topics) uygular
       - Eşik / relative margin / grup de-dup uygular
-      - Sonucu archive/<name>.enriched.jsonl olarak yazar
+      - Sonucu archive/<name>.enriched.jsonl olarak yazar, her batch'te journal'ı ilerletir
       - Ham dosyayı archive/'a taşır
+    processing/'teki yarım bir dosya verilirse journal'daki offset'ten devam eder.
     """
-    ok_count = 0
-    skipped_400 = 0
-    skipped_413 = 0
-    other_err = 0
+    counts = {"400": 0, "413": 0, "other": 0}
 
-    processing_path = PROCESSING_DIR / file_path.name
     try:
-        _safe_move(file_path, processing_path)
+        processing_path = _claim_inbox_file(file_path)
+    except FileNotFoundError:
+        logger.debug("[watcher] %s was claimed by another worker", file_path.name)
+        return
     except Exception as e:
         logger.exception("move to processing failed: %s", e)
         return
 
     enriched_out = ARCHIVE_DIR / (processing_path.stem + ".enriched.jsonl")
+    journal = _open_journal(processing_path)
 
     try:
-        batch_recs = []
-        batch_texts = []
-        batch_ids = []
-
-        with processing_path.open("r", encoding="utf-8") as fin, enriched_out.open("w", encoding="utf-8") as fout:
-            for line_no, line in enumerate(fin, start=1):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    rec = json.loads(line)
-                except Exception:
-                    other_err += 1
-                    continue
-
-                valid, reason = _validate_line(rec)
-                if not valid:
-                    if reason == "empty_text":
-                        skipped_400 += 1
-                    elif reason == "text_too_long":
-                        skipped_413 += 1
-                    else:
-                        other_err += 1
-                    continue
-
-                # batch'e ekle
-                batch_recs.append(rec)
-                batch_texts.append(rec["text"])
-                batch_ids.append(rec["id"])
-
-                # batch doldu mu?
-                if len(batch_recs) >= BATCH_SIZE:
-                    _process_and_write_batch(batch_recs, batch_texts, batch_ids, fout)
-                    ok_count += len(batch_recs)
-                    batch_recs, batch_texts, batch_ids = [], [], []
-
-            # kalanlar
-            if batch_recs:
-                _process_and_write_batch(batch_recs, batch_texts, batch_ids, fout)
+        with processing_path.open("rb") as fin, journal.open_output(enriched_out) as fout:
+            ok_count, dedup_count = journal.ok, journal.dedup
+            fin.seek(journal.input_offset)
+            for batch_recs, batch_texts, batch_ids, end_offset in _iter_valid_batches(
+                fin, counts, lane, journal.input_offset
+            ):
+                enriched_recs, dedup_hits = _enrich_batch(batch_recs, batch_texts, batch_ids, lane)
+                LEASES.check(processing_path)  # lease düştüyse yeni sahibin çıktısına yazma
+                _write_enriched(enriched_recs, fout, lane)
+                dedup_count += dedup_hits
                 ok_count += len(batch_recs)
+                _commit_batch(journal, processing_path, fout, end_offset, ok_count, dedup_count)
+                # batch sınırı: bu arada acil dosya geldiyse önce onu bitir
+                if lane != "emergency":
+                    _drain_emergency_inbox()
 
         # ham dosyayı da archive'a taşı
-        _safe_move(processing_path, ARCHIVE_DIR / processing_path.name)
-
-        logger.info(
-            "[watcher] processed %s | ok=%d, 400-skip=%d, 413-skip=%d, other=%d | enriched=%s",
-            processing_path.name, ok_count, skipped_400, skipped_413, other_err, enriched_out.name
-        )
+        _archive_raw(processing_path)
+        journal.discard()
+        _log_processed(processing_path, lane, ok_count, dedup_count, counts, enriched_out)
+    except LeaseLost as e:
+        logger.warning("[watcher] %s; leaving it to the new owner", e)
     except Exception as e:
         logger.exception("process failed for %s: %s", processing_path.name, e)
         try:
             _safe_move(processing_path, FAILED_DIR / processing_path.name)
+            journal.discard()
         except Exception:
             pass
 
+
+# --------- pipeline'lı yol: okuma/doğrulama -> inference -> sıralı yazma (backend.pipeline) ----------
+
+def _pipeline_read(job):
+    job.state["counts"] = {"400": 0, "413": 0, "other": 0}
+    try:
+        processing_path = _claim_inbox_file(job.path)
+    except FileNotFoundError:
+        logger.debug("[watcher] %s was claimed by another worker", job.path.name)
+        job.state["claimed_elsewhere"] = True
+        return
+    job.state["processing"] = processing_path
+    journal = job.state["journal"] = _open_journal(processing_path)
+    job.state["out"] = ARCHIVE_DIR / (processing_path.stem + ".enriched.jsonl")
+    job.state["fout"] = journal.open_output(job.state["out"])
+    job.state["ok"] = journal.ok
+    job.state["dedup"] = journal.dedup
+    with processing_path.open("rb") as fin:
+        fin.seek(journal.input_offset)
+        yield from _iter_valid_batches(fin, job.state["counts"], job.lane, journal.input_offset)
+
+
+def _pipeline_enrich(job, batch):
+    batch_recs, batch_texts, batch_ids, end_offset = batch
+    enriched_recs, dedup_hits = _enrich_batch(batch_recs, batch_texts, batch_ids, job.lane)
+    return enriched_recs, dedup_hits, end_offset
+
+
+def _pipeline_write(job, result):
+    enriched_recs, dedup_hits, end_offset = result
+    LEASES.check(job.state["processing"])
+    _write_enriched(enriched_recs, job.state["fout"], job.lane)
+    job.state["ok"] += len(enriched_recs)
+    job.state["dedup"] += dedup_hits
+    # writer batch'leri dosya sırasıyla yazar -> commit edilen offset hep ileri gider
+    _commit_batch(job.state["journal"], job.state["processing"], job.state["fout"], end_offset,
+                  job.state["ok"], job.state["dedup"])
+    return len(enriched_recs)
+
+
+def _pipeline_finish(job):
+    if job.state.get("claimed_elsewhere"):
+        return
+    job.state["fout"].close()
+    processing_path = job.state["processing"]
+    _archive_raw(processing_path)
+    job.state["journal"].discard()
+    _log_processed(processing_path, job.lane, job.state["ok"], job.state["dedup"], job.state["counts"],
+                   job.state["out"])
+
+
+def _pipeline_fail(job, error):
+    fout = job.state.get("fout")
+    if fout is not None:
+        fout.close()
+    processing_path = job.state.get("processing")
+    if processing_path is None:
+        logger.error("move to processing failed for %s: %s", job.path.name, error)
+        return
+    if isinstance(error, LeaseLost):
+        logger.warning("[watcher] %s; leaving it to the new owner", error)
+        return
+    logger.error("process failed for %s: %s", processing_path.name, error)
+    try:
+        _safe_move(processing_path, FAILED_DIR / processing_path.name)
+        job.state["journal"].discard()
+    except Exception:
+        pass
+
+
+_BACKLOG_CACHE = [0.0, 0]  # (ölçüm zamanı, kayıt) - her batch'te inbox'ı stat'lamamak için
+
+
+def _inbox_backlog_records() -> int:
+    """Inbox'ta bekleyen + pipeline'da uçuşta olan kayıtların kaba tahmini."""
+    now = time.monotonic()
+    if now - _BACKLOG_CACHE[0] >= 1.0:
+        size = 0
+        for p in INBOX_DIR.iterdir():
+            try:
+                if _is_jsonl_file(p):
+                    size += p.stat().st_size
+            except OSError:
+                pass
+        _BACKLOG_CACHE[0], _BACKLOG_CACHE[1] = now, size // AVG_RECORD_BYTES
+    in_flight = PIPELINE.stats()["infer_queue"] * BATCH_SIZER.size if WATCHER_PIPELINE else 0
+    return _BACKLOG_CACHE[1] + in_flight
+
+
+BATCH_SIZER = AdaptiveBatchSizer(
+    initial=BATCH_SIZE,
+    min_size=BATCH_MIN,
+    max_size=BATCH_MAX,
+    target_ms=BATCH_TARGET_MS,
+    emergency_max=EMERGENCY_BATCH_MAX,
+    workers=PIPELINE_INFER_WORKERS if WATCHER_PIPELINE else 1,
+    backlog_fn=_inbox_backlog_records,
+    enabled=ADAPTIVE_BATCH,
+)
+
+PIPELINE = FilePipeline(
+    _pipeline_read,
+    _pipeline_enrich,
+    _pipeline_write,
+    _pipeline_finish,
+    _pipeline_fail,
+    bulk_readers=PIPELINE_BULK_READERS,
+    infer_workers=PIPELINE_INFER_WORKERS,
+    max_batches_in_flight=PIPELINE_MAX_BATCHES,
+    name="watcher",
+)
+
+def _file_lane(p: Path) -> str:
+    return "emergency" if p.name.startswith(EMERGENCY_FILE_PREFIX) else "bulk"
+
+
+def _inbox_files():
+    """Inbox'taki .jsonl dosyaları: önce acil şerit, şerit içinde isim (zaman damgası) sırası."""
+    files = [p for p in INBOX_DIR.iterdir() if _is_jsonl_file(p)]
+    return sorted(files, key=lambda p: (_file_lane(p) != "emergency", p.name))
+
+
+def _drain_emergency_inbox():
+    for p in _inbox_files():
+        if _file_lane(p) != "emergency":
+            break
+        _process_jsonl_file(p, "emergency")
+
+
+def _sweep_inbox():
+    # süresi dolmuş lease'ler (ölmüş worker'lar) heartbeat aralığında bir kontrol edilir
+    if time.monotonic() - _LEASE_CHECK[0] >= LEASES.heartbeat_sec:
+        _resume_interrupted()
+    # sadece .jsonl al; .part'ı görmezden gel
+    for p in _inbox_files():
+        if WATCHER_PIPELINE:
+            PIPELINE.submit(p, _file_lane(p))  # zaten uçuştaysa yok sayılır
+        elif p.exists():  # bulk dosya işlenirken araya giren acil dosyalar zaten alınmış olabilir
+            _process_jsonl_file(p, _file_lane(p))
+
+
 def _poll_inbox_loop():
+    global WATCHER_ACTIVE_MODE
+    WATCHER_ACTIVE_MODE = "poll"
     _ensure_dirs()
-    logger.info("[watcher] started; watching: %s", INBOX_DIR)
+    logger.info("[watcher] started (poll every %.1fs); watching: %s", POLL_INTERVAL_SEC, INBOX_DIR)
     while True:
         try:
-            # sadece .jsonl al; .part'ı görmezden gel
-            for p in sorted(INBOX_DIR.iterdir()):
-                if _is_jsonl_file(p):
-                    _process_jsonl_file(p)
+            _sweep_inbox()
         except Exception as e:
             logger.exception("[watcher] loop error: %s", e)
         time.sleep(POLL_INTERVAL_SEC)
 
+
+def _watch_inbox_loop():
+    """
+    inotify (watchfiles) tabanlı watcher: .jsonl oluştuğunda / rename ile geldiğinde uyanır.
+    Açılışta inbox bir kez süpürülür (servis kapalıyken gelenler), WATCHER_RESCAN_SEC'te
+    bir olay gelmezse yine süpürülür. watchfiles yoksa ya da hata verirse poll'a düşer.
+    """
+    global WATCHER_ACTIVE_MODE
+    try:
+        from watchfiles import Change, watch
+    except ImportError:
+        logger.warning("[watcher] watchfiles not installed; falling back to polling")
+        return _poll_inbox_loop()
+
+    _ensure_dirs()
+    WATCHER_ACTIVE_MODE = "notify"
+    logger.info("[watcher] started (notify); watching: %s", INBOX_DIR)
+
+    def _jsonl_arrived(change, path: str) -> bool:
+        return change != Change.deleted and path.endswith(".jsonl")
+
+    try:
+        _sweep_inbox()  # startup sweep
+        for _changes in watch(
+            INBOX_DIR,
+            watch_filter=_jsonl_arrived,
+            debounce=50,           # varsayılan 1600 ms; rename tek olay, beklemeye gerek yok
+            step=10,
+            rust_timeout=int(WATCHER_RESCAN_SEC * 1000),
+            yield_on_timeout=True,  # zaman aşımında boş küme -> güvenlik taraması
+            recursive=False,
+            raise_interrupt=False,
+        ):
+            try:
+                _sweep_inbox()
+            except Exception as e:
+                logger.exception("[watcher] loop error: %s", e)
+    except Exception as e:
+        logger.exception("[watcher] notify watcher failed (%s); falling back to polling", e)
+    return _poll_inbox_loop()
+
+@app.on_event("startup")
+def _start_replicas():
+    for pool in (sentiment_pool, topic_pool):
+        if pool is not None:
+            pool.start()
+
+
+def load_models():
+    """
+    Sadece ağırlıkları yükler (forward pass yok). backend.serve bunu fork'tan
+    önce çağırır: ağırlık sayfaları worker'lar arasında copy-on-write paylaşılır.
+    """
+    # onnxruntime session'ları kendi thread havuzlarını açar -> fork sonrası worker'da yüklenir
+    if sentiment_pool is None and svc.backend.startswith("torch"):
+        svc._ensure_model()
+    if topic_pool is None and topic_svc.backend.startswith("torch"):
+        topic_svc._load_model()
+
+
+def _preload_models():
+    """Arka planda: modelleri yükle + ısıt; bitince cold start süresini logla."""
+    global COLD_START_SEC
+    for name, service, pool in (("sentiment", svc, sentiment_pool), ("topics", topic_svc, topic_pool)):
+        try:
+            if pool is not None:
+                pool.wait_ready()  # replikalar kendi içinde yükleyip ısıtıyor
+            else:
+                service.warmup()
+        except Exception as e:
+            logger.exception("[ready] %s preload failed: %s", name, e)
+    if all(m["state"] == "ready" for m in _model_states().values()):
+        COLD_START_SEC = round(time.monotonic() - _PROCESS_START, 3)
+        logger.info("[ready] models loaded and warm; cold start %.2fs", COLD_START_SEC)
+
+
+@app.on_event("startup")
+def _start_preload():
+    if PRELOAD_MODELS:
+        threading.Thread(target=_preload_models, name="model-preload", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def _release_leases():
+    LEASES.release()
+
+
+@app.on_event("shutdown")
+def _stop_replicas():
+    for pool in (sentiment_pool, topic_pool):
+        if pool is not None:
+            pool.stop()
+
+# birden çok worker varken inbox'ı sadece biri izlemeli (backend.serve worker 0'a bırakır)
+WATCHER_ENABLED = os.getenv("HASHARITA_WATCHER", "1") == "1"
+
+
+def _run_watcher(loop):
+    try:
+        _resume_interrupted()
+    except Exception as e:
+        logger.exception("[watcher] resume of interrupted files failed: %s", e)
+    loop()
+
+
 # FastAPI startup'ta watcher başlat
 @app.on_event("startup")
 def _start_watcher():
+    if not WATCHER_ENABLED:
+        logger.info("[watcher] disabled in this worker (pid=%d)", os.getpid())
+        return
     _ensure_dirs()
-    t = threading.Thread(target=_poll_inbox_loop, daemon=True)
+    loop = _poll_inbox_loop if WATCHER_MODE == "poll" else _watch_inbox_loop
+    t = threading.Thread(target=_run_watcher, args=(loop,), daemon=True)
     t.start()
     logger.info("[watcher] background poller thread started.")
 # ============================ /watcher section ================================
+# ================= Direct ingest (NDJSON) =================
+# Aynı makinedeki üreticiler için: .part -> rename -> watcher turu yerine kayıtlar doğrudan
+# enrich + agregat + archive'a gider. Geri basınç: bir batch zenginleşirken gövdeden okunmaz
+# (TCP akışı üreticiyi yavaşlatır); inference kuyrukları doluysa / akış sınırı aşıldıysa 429.
+INGEST_MAX_STREAMS = int(os.getenv("HASHARITA_INGEST_MAX_STREAMS", "4"))
+INGEST_MAX_LINE_BYTES = 1 << 20   # satır sonu gelmeden bu kadar birikirse 413
+INGEST_FILE_PREFIX = "ingest_"
+INGEST_STATS = {"active_streams": 0, "streams": 0, "records": 0, "rejected": 0}
+
+
+def _ingest_admit(priority: int = PRIORITY_NORMAL):
+    """Yeni akışı kabul et ya da 429 + Retry-After (kuyruk limiti şerit başına: dolu bulk acili reddettirmez)."""
+    retry_after = None
+    if INGEST_STATS["active_streams"] >= INGEST_MAX_STREAMS:
+        retry_after = 1
+    for sched in (topic_sched, sentiment_sched):
+        if sched.is_full(1, priority):
+            retry_after = max(retry_after or 0, sched.retry_after(1, priority))
+    if retry_after is not None:
+        INGEST_STATS["rejected"] += 1
+        raise HTTPException(status_code=429, detail="ingest saturated", headers={"Retry-After": str(retry_after)})
+
+
+def _ingest_batch(batch_recs, fout, lane):
+    """Worker thread'inde: enrich + agregat + enriched satırlar (watcher'la aynı yol)."""
+    batch_texts = [r["text"] for r in batch_recs]
+    batch_ids = [r["id"] for r in batch_recs]
+    enriched_recs, dedup_hits = _enrich_batch(batch_recs, batch_texts, batch_ids, lane)
+    _write_enriched(enriched_recs, fout, lane)
+    fout.flush()
+    return len(enriched_recs), dedup_hits
+
+
+@app.post("/ingest", response_model=IngestResponse)
+async def ingest(request: Request) -> IngestResponse:
+    """
+    NDJSON gövde: satır başına bir kayıt, inbox dosyalarıyla aynı şema (id, text, ts, city, district).
+    Ham satırlar archive/ingest_*.jsonl, sonuçlar archive/ingest_*.enriched.jsonl olarak saklanır.
+    Akış sürerken ikisi de .partial adlarla yazılır ve başarıda yerine taşınır.
+    Akış yarıda kalırsa (413, 499 istemci koptu, hata) agregata girmiş olan kısım, yani tamamlanan
+    batch'lere kadarki satırlar, ingest_*_truncated.jsonl / .enriched.jsonl olarak arşivlenir; archive ile
+    agregat aynı kayıtları içerir. 413 yanıtı kabul edilen kayıt ve gövde satırı sayısını döner
+    (üretici committed_lines'tan sonrasını yeniden gönderir).
+    "X-Priority: emergency" acil şeritte işlenir.
+    """
+    priority = _request_priority(request)
+    lane = "emergency" if priority == PRIORITY_HIGH else "bulk"
+    _ingest_admit(priority)
+    name = f"{INGEST_FILE_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    counts = {"400": 0, "413": 0, "other": 0}
+    ok = dedup = 0
+    batch_recs = []
+    buf = b""
+    raw_partial = ARCHIVE_DIR / f"{name}.jsonl.partial"
+    out_partial = ARCHIVE_DIR / f"{name}.enriched.jsonl.partial"
+    fraw = fout = None
+    lines_read = 0
+    committed = (0, 0, 0)  # son tamamlanan batch'e kadar: (ham bayt, enriched bayt, gövde satırı)
+    inflight = None        # thread'de çalışan batch ve başladığı andaki (ham bayt, gövde satırı)
+
+    def _commit(n, hits, raw_end, lines_end):
+        nonlocal ok, dedup, committed, inflight
+        inflight = None
+        ok, dedup = ok + n, dedup + hits
+        committed = (raw_end, fout.tell(), lines_end)
+
+    async def _run_batch():
+        nonlocal inflight
+        # shield: istek iptal edilse de thread batch'i agregata yazmaya devam eder; abort yolu onu bekler
+        inflight = (asyncio.ensure_future(asyncio.to_thread(_ingest_batch, list(batch_recs), fout, lane)),
+                    fraw.tell(), lines_read)
+        batch_recs.clear()
+        task, raw_end, lines_end = inflight
+        _commit(*(await asyncio.shield(task)), raw_end, lines_end)
+
+    async def _take(lines):
+        nonlocal lines_read
+        for line in lines:
+            lines_read += 1
+            if line.strip():
+                fraw.write(line.rstrip(b"\r") + b"\n")
+            rec = _parse_valid_line(line, counts)
+            if rec is not None:
+                batch_recs.append(rec)
+            if len(batch_recs) >= BATCH_SIZER.next_size(lane):
+                await _run_batch()
+
+    INGEST_STATS["active_streams"] += 1
+    INGEST_STATS["streams"] += 1
+    try:
+        ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+        fraw, fout = raw_partial.open("wb"), out_partial.open("w", encoding="utf-8")
+        async for chunk in request.stream():
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            await _take(lines)  # önceki tam satırlar işlensin, 413 onlardan sonra
+            if len(buf) > INGEST_MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail="NDJSON line too long")
+        if buf:
+            await _take([buf])  # sonda satır sonu olmayan kayıt
+        if batch_recs:
+            await _run_batch()
+    except BaseException as e:
+        archived = await _ingest_abort(name, fraw, fout, raw_partial, out_partial, inflight, lambda: committed, _commit)
+        ok_lines = committed[2]
+        logger.warning("[ingest] %s [%s] aborted (%s) | accepted=%d (near-dup=%d), committed lines=%d, archived=%s",
+                       name, lane, getattr(e, "status_code", type(e).__name__), ok, dedup, ok_lines, archived)
+        if isinstance(e, ClientDisconnect):
+            raise HTTPException(status_code=499, detail="client disconnected")
+        if isinstance(e, HTTPException) and e.status_code == 413:
+            raise HTTPException(status_code=413, detail={
+                "error": e.detail, "accepted": ok, "near_dup": dedup, "skipped": counts,
+                "committed_lines": ok_lines, "archived": archived,
+            })
+        raise
+    finally:
+        INGEST_STATS["active_streams"] -= 1
+        INGEST_STATS["records"] += ok
+
+    fraw.close()
+    fout.close()
+    # önce sonuç, sonra ham dosya: archive'da ham dosya varsa sonucu da tamdır
+    os.replace(out_partial, ARCHIVE_DIR / f"{name}.enriched.jsonl")
+    os.replace(raw_partial, ARCHIVE_DIR / f"{name}.jsonl")
+    logger.info("[ingest] %s [%s] | ok=%d (near-dup=%d), 400-skip=%d, 413-skip=%d, other=%d",
+                name, lane, ok, dedup, counts["400"], counts["413"], counts["other"])
+    return IngestResponse(accepted=ok, near_dup=dedup, skipped=counts, archived=f"{name}.jsonl")
+
+
+async def _ingest_abort(name, fraw, fout, raw_partial, out_partial, inflight, get_committed,
+                        commit) -> Optional[str]:
+    """
+    Yarıda kalan akış: thread'de bitmekte olan batch'i bekler (agregata yazılıyor, o da sayılır), dosyaları
+    son tamamlanan batch'e kesip ingest_*_truncated adıyla arşivler. Hiç batch tamamlanmadıysa siler.
+    Arşivlenen ham dosyanın adını döner.
+    """
+    if inflight is not None:
+        task, raw_end, lines_end = inflight
+        try:
+            n, hits = await task
+        except BaseException:
+            pass  # enrich hatası: agregata bir şey yazılmadı
+        else:
+            commit(n, hits, raw_end, lines_end)
+    raw_end, out_end, lines_end = get_committed()
+    for f in (fraw, fout):
+        if f is not None:
+            f.close()
+    if out_end == 0:
+        for p in (raw_partial, out_partial):
+            p.unlink(missing_ok=True)
+        return None
+    os.truncate(raw_partial, raw_end)
+    os.truncate(out_partial, out_end)
+    truncated = f"{name}_truncated"
+    os.replace(out_partial, ARCHIVE_DIR / f"{truncated}.enriched.jsonl")
+    os.replace(raw_partial, ARCHIVE_DIR / f"{truncated}.jsonl")
+    return f"{truncated}.jsonl"
+
 # ================= In-memory Aggregates =================
-# Anahtar: (city, district, topic)
-# Değer: deque[(timestamp, sentiment_label)]
-AGG: Dict[Tuple[str, Optional[str], str], deque] = defaultdict(deque)
-AGG_LOCK = threading.Lock()
+# Anahtar: (city, district, topic) -> zaman bucket'larında [positive, neutral, negative, total] sayaçları
+# (backend.aggregates). Snapshot maliyeti olay sayısından bağımsız: O(anahtar x bucket).
+# Rollup katmanları "bucket_sn:saklama_sn": 10 sn / 1 saat, 1 dk / 1 gün, 1 saat / 90 gün
+AGG_TIERS = [
+    tuple(float(x) for x in tier.split(":"))
+    for tier in os.getenv("HASHARITA_AGG_TIERS", "10:3600,60:86400,3600:7776000").split(",")
+    if tier.strip()
+]
+# ?since=<version> delta'ları için hatırlanan (sürüm, anahtar) değişikliği; daha eskisi -> tam snapshot
+AGG_CHANGELOG = int(os.getenv("HASHARITA_AGG_CHANGELOG", "100000"))
+AGG = TieredCounters(AGG_TIERS, changelog=AGG_CHANGELOG)
 
 def _parse_window_to_seconds(window_str: str) -> int:
     """
@@ -489,74 +1529,172 @@ def _agg_add(city: str, district: Optional[str], topic: str, now_ts: float, sent
     Hem city hem district seviyesinde aggregation'a ekler.
     """
     # City seviyesi (district=None olarak sakla)
-    city_key = (city, None, topic)
-    with AGG_LOCK:
-        AGG[city_key].append((now_ts, sentiment_label))
-        
-        # District seviyesi (eğer district varsa)
-        if district:
-            district_key = (city, district, topic)
-            AGG[district_key].append((now_ts, sentiment_label))
+    AGG.add((city, None, topic), now_ts, sentiment_label)
+    # District seviyesi (eğer district varsa)
+    if district:
+        AGG.add((city, district, topic), now_ts, sentiment_label)
+
+# Snapshot önbelleği: (level, window, since) -> (AGG.version, katmanın güncel bucket'ı, etag, JSON gövdesi).
+# Sonuçlar bucket hizalı: ne yeni olay ne de bucket sınırı geçilmişse snapshot aynıdır.
+# Sürüm token'ı "<AGG.version>-<bucket>": aynı level/window için ?since= ile geri gönderilir.
+AGG_SNAPSHOT_CACHE = os.getenv("HASHARITA_AGG_SNAPSHOT_CACHE", "1") == "1"
+_SNAPSHOTS: Dict[Tuple[str, str, Optional[str]], tuple] = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+_SNAPSHOTS_MAX = 256  # keyfi window / since stringleriyle sınırsız büyümesin
+SNAPSHOT_STATS = {"hits": 0, "misses": 0, "not_modified": 0, "deltas": 0, "delta_fallbacks": 0}
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+
+def _agg_snapshot_cached(level: str, window_str: str, since: Optional[str] = None) -> Tuple[str, bytes]:
+    """(etag, JSON gövdesi); aynı sürüm + bucket için yeniden hesaplamaz / serileştirmez."""
+    return _agg_snapshot_entry(level, window_str, since)[:2]
+
+
+def _agg_snapshot_entry(level: str, window_str: str, since: Optional[str] = None) -> Tuple[str, bytes, str, str]:
+    """(etag, JSON gövdesi, sürüm token'ı, tür): tür "snapshot", "delta" ya da "empty" (değişiklik yok delta'sı)."""
+    tier = AGG.tier_for(_parse_window_to_seconds(window_str or "15m"))
+    key = (level, window_str, since)
+    with _SNAPSHOTS_LOCK:  # aynı anda gelen istekler tek hesaplamayı bekler
+        # sürüm sayımlardan önce okunur: arada gelen olaylar bir sonraki delta'da tekrar gönderilir, kaybolmaz
+        version, bucket = AGG.version, int(time.time() // tier.bucket_sec)
+        hit = _SNAPSHOTS.get(key)
+        if AGG_SNAPSHOT_CACHE and hit is not None and hit[0] == version and hit[1] == bucket:
+            SNAPSHOT_STATS["hits"] += 1
+            return hit[2:]
+        SNAPSHOT_STATS["misses"] += 1
+        snap = _agg_delta(level, window_str, since) if since else None
+        if snap is not None:
+            SNAPSHOT_STATS["deltas"] += 1
+        else:
+            if since:
+                SNAPSHOT_STATS["delta_fallbacks"] += 1
+            snap = _agg_snapshot(level, window_str)
+            if since:
+                snap["full"] = True  # token çok eski / geçersiz: istemci listeyi baştan kurar
+        token = snap["version"] = f"{version}-{bucket}"
+        # updated_at / purged / version ETag'e girmez: içerik aynıysa istemci 304 alır
+        removed = snap.pop("removed", None)
+        kind = "snapshot" if removed is None else "delta" if removed or snap["items"] else "empty"
+        items = json.dumps(snap.pop("items"), ensure_ascii=False, separators=(",", ":")).encode()
+        if removed is not None:
+            items += b',"removed":' + json.dumps(removed, ensure_ascii=False, separators=(",", ":")).encode()
+        etag = _etag(items)
+        body = json.dumps(snap, ensure_ascii=False, separators=(",", ":")).encode()[:-1] + b',"items":' + items + b"}"
+        if AGG_SNAPSHOT_CACHE:
+            _SNAPSHOTS.pop(key, None)
+            if len(_SNAPSHOTS) >= _SNAPSHOTS_MAX:
+                _SNAPSHOTS.pop(next(iter(_SNAPSHOTS)))
+            _SNAPSHOTS[key] = (version, bucket, etag, body, token, kind)
+        return etag, body, token, kind
+
+
+def _agg_item(key: tuple, counts: List[int]) -> dict:
+    (city, district, topic), (pos, neu, neg, total) = key, counts
+    return {
+        "city": city,
+        "district": district,
+        "topic": topic,
+        "count": total,
+        "sentiment_summary": {"positive": pos, "neutral": neu, "negative": neg},
+    }
+
+
+def _agg_key_order(key: tuple) -> tuple:
+    return key[0], key[1] or "", key[2]  # sabit sıra -> sabit ETag
+
 
 def _agg_snapshot(level: str, window_str: str) -> dict:
     window_sec = _parse_window_to_seconds(window_str or "15m")
-    cutoff = time.time() - window_sec
-
-    items = []
-    purge_total = 0
-
-    with AGG_LOCK:
-        # purge & aggregate
-        for (city, district, topic), q in list(AGG.items()):
-            # eski kayıtları at
-            while q and q[0][0] < cutoff:
-                q.popleft()
-                purge_total += 1
-
-        if level == "city":
-            grouped: Dict[Tuple[str, str], dict] = defaultdict(lambda: {
-                "count": 0,
-                "sentiment_summary": {"positive": 0, "neutral": 0, "negative": 0}
-            })
-            for (city, district, topic), q in AGG.items():
-                if district is None and len(q) > 0:
-                    for _, s in q:
-                        grouped[(city, topic)]["count"] += 1
-                        if s in ("positive", "neutral", "negative"):
-                            grouped[(city, topic)]["sentiment_summary"][s] += 1
-
-            for (city, topic), agg in grouped.items():
-                items.append({
-                    "city": city,
-                    "district": None,
-                    "topic": topic,
-                    "count": agg["count"],
-                    "sentiment_summary": agg["sentiment_summary"]
-                })
-        else:
-            grouped: Dict[Tuple[str, str, str], dict] = defaultdict(lambda: {
-                "count": 0,
-                "sentiment_summary": {"positive": 0, "neutral": 0, "negative": 0}
-            })
-            for (city, district, topic), q in AGG.items():
-                if district is not None and len(q) > 0:
-                    for _, s in q:
-                        grouped[(city, district, topic)]["count"] += 1
-                        if s in ("positive", "neutral", "negative"):
-                            grouped[(city, district, topic)]["sentiment_summary"][s] += 1
-
-            for (city, district, topic), agg in grouped.items():
-                items.append({
-                    "city": city,
-                    "district": district,
-                    "topic": topic,
-                    "count": agg["count"],
-                    "sentiment_summary": agg["sentiment_summary"]
-                })
+    tier = AGG.tier_for(window_sec)  # pencereyi kapsayan en ince katman
+    counts = tier.window(window_sec)
+
+    # city seviyesi district=None anahtarlarından, district seviyesi diğerlerinden
+    keys = [k for k, c in counts.items() if (level == "city") == (k[1] is None) and c[TOTAL]]
+    items = [_agg_item(k, counts[k]) for k in sorted(keys, key=_agg_key_order)]
+
+    return {
+        "window": window_str,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "purged": AGG.take_reclaimed(),  # son snapshot'tan beri geri alınan (süresi dolmuş) bucket sayısı
+        "resolution_sec": tier.bucket_sec,
+        "items": items,
+    }
 
+
+def _agg_delta(level: str, window_str: str, since: str) -> Optional[dict]:
+    """
+    Sürüm token'ı `since`den beri penceresi değişmiş anahtarlar: yeni olay gelenler (AGG değişiklik
+    log'u) ve bucket'ları pencereden kaymış olanlar. items = güncel satırlar, removed = artık boş olanlar.
+    Token bozuk, gelecekten ya da log'un / halkanın gerisinde kalmışsa None (tam snapshot).
+    """
+    try:
+        v0, b0 = (int(x) for x in since.split("-"))
+    except ValueError:
+        return None
+    window_sec = _parse_window_to_seconds(window_str or "15m")
+    tier = AGG.tier_for(window_sec)
+    now = time.time()
+    last = int(now // tier.bucket_sec)
+    if b0 > last:
+        return None
+    changed = AGG.changed_since(v0)
+    if changed is None:
+        return None
+    # token'dan bu yana pencerenin başından kaymış olabilecek bucket'lar; bir fazlası zararsız
+    # (değişmemiş bir satır yeniden gönderilir), eksiği değil
+    span = int(math.ceil(min(window_sec, tier.retention_sec) / tier.bucket_sec)) + 1
+    expired = tier.keys_between(b0 - span, last - span + 1)
+    if expired is None:
+        return None
+
+    counts = tier.window(window_sec, now)
+    items, removed = [], []
+    for key in sorted((k for k in changed | expired if (level == "city") == (k[1] is None)), key=_agg_key_order):
+        c = counts.get(key)
+        if c and c[TOTAL]:
+            items.append(_agg_item(key, c))
+        else:
+            removed.append({"city": key[0], "district": key[1], "topic": key[2]})
     return {
         "window": window_str,
         "updated_at": datetime.now(timezone.utc).isoformat(),
-        "purged": purge_total,
+        "purged": AGG.take_reclaimed(),
+        "resolution_sec": tier.bucket_sec,
+        "since": since,
+        "full": False,
         "items": items,
-    }
\ No newline at end of file
+        "removed": removed,
+    }
+
+
+# ================= Push (/map/stream, SSE) =================
+# Watcher / ingest her batch'ten sonra STREAM.notify() çağırır; (level, window) başına tek publisher
+# en fazla STREAM_TICK_SEC'te bir delta'yı bir kez render edip aynı bytes'ı tüm abonelere dağıtır.
+STREAM_TICK_SEC = float(os.getenv("HASHARITA_STREAM_TICK_SEC", "1.0"))
+STREAM_IDLE_SEC = float(os.getenv("HASHARITA_STREAM_IDLE_SEC", "5"))  # notify olmadan da bak: pencereden düşen satırlar
+STREAM_HEARTBEAT_SEC = float(os.getenv("HASHARITA_STREAM_HEARTBEAT_SEC", "15"))
+STREAM_MAX_QUEUE = int(os.getenv("HASHARITA_STREAM_MAX_QUEUE", "8"))        # abone başına bekleyen kare
+STREAM_MAX_CLIENTS = int(os.getenv("HASHARITA_STREAM_MAX_CLIENTS", "10000"))
+
+
+def _stream_render(topic: Tuple[str, str], since: Optional[str]) -> Tuple[Optional[str], Optional[bytes]]:
+    level, window_str = topic
+    _, body, token, kind = _agg_snapshot_entry(level, window_str, since)
+    if kind == "empty":
+        return since, None
+    return token, sse_frame("delta" if kind == "delta" else "snapshot", body, token)
+
+
+STREAM = StreamHub(_stream_render, tick_sec=STREAM_TICK_SEC, idle_sec=STREAM_IDLE_SEC, heartbeat_sec=STREAM_HEARTBEAT_SEC,
+                   max_queue=STREAM_MAX_QUEUE, max_subscribers=STREAM_MAX_CLIENTS)
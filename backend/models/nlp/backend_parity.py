@@ -0,0 +1,70 @@
+"""
+Backend parity + speed check against torch-fp32.
+
+Usage (repo root):
+    python -m backend.models.nlp.backend_parity [--backends torch-int8-dynamic onnxruntime] [--limit 200]
+
+Sentiment: sentiment_demo.jsonl, label agreement with fp32.
+Topics:    train-data.json, exact agreement of the returned label sets with fp32.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from backend.models.nlp.backends import BACKENDS
+from backend.models.nlp.sentiment.service import SentimentService
+from backend.models.nlp.topics.service import TopicClassificationService
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+SENTIMENT_DEMO = BACKEND_DIR / "data" / "sentiment_demo.jsonl"
+TOPICS_DATA = BACKEND_DIR / "models" / "nlp" / "topics" / "train-data.json"
+
+
+def run_sentiment(backend, texts):
+    svc = SentimentService(backend=backend)
+    items = [{"id": str(i), "text": t} for i, t in enumerate(texts)]
+    svc.predict_batch(items[:1])  # yükleme + ısınma ölçüme girmesin
+    t0 = time.perf_counter()
+    out = []
+    for i in range(0, len(items), svc.max_batch):
+        out.extend(svc.predict_batch(items[i:i + svc.max_batch]))
+    return [o["sentiment"]["label"] for o in out], time.perf_counter() - t0
+
+
+def run_topics(backend, texts):
+    svc = TopicClassificationService(backend=backend)
+    svc.classify_batch(texts[:1])
+    t0 = time.perf_counter()
+    out = svc.classify_batch(texts)
+    return [frozenset(t["label"] for t in topics) for topics in out], time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=[b for b in BACKENDS if b != "torch-fp32"])
+    ap.add_argument("--limit", type=int, default=200)
+    args = ap.parse_args()
+
+    sent_texts = [
+        json.loads(line)["text"] for line in SENTIMENT_DEMO.read_text(encoding="utf-8").splitlines() if line.strip()
+    ]
+    topic_texts = [d["text"] for d in json.loads(TOPICS_DATA.read_text(encoding="utf-8"))][: args.limit]
+
+    ref_sent, ref_sent_t = run_sentiment("torch-fp32", sent_texts)
+    ref_topics, ref_topics_t = run_topics("torch-fp32", topic_texts)
+    print(f"torch-fp32           sentiment {ref_sent_t:.2f}s | topics {ref_topics_t:.2f}s")
+
+    for backend in args.backends:
+        sent, sent_t = run_sentiment(backend, sent_texts)
+        topics, topics_t = run_topics(backend, topic_texts)
+        sent_agree = sum(a == b for a, b in zip(sent, ref_sent)) / len(sent)
+        topic_agree = sum(a == b for a, b in zip(topics, ref_topics)) / len(topics)
+        print(f"{backend:<20} sentiment {sent_t:.2f}s (x{ref_sent_t / max(sent_t, 1e-9):.1f}, "
+              f"labels {sent_agree:.1%}) | topics {topics_t:.2f}s "
+              f"(x{ref_topics_t / max(topics_t, 1e-9):.1f}, label sets {topic_agree:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Pluggable inference backends for the NLP services.
+
+  torch-fp32          AutoModelForSequenceClassification as-is (default)
+  torch-int8-dynamic  torch dynamic quantization of nn.Linear to qint8
+  onnxruntime         ONNX export, fp32, run with onnxruntime on CPU
+  onnxruntime-int8    ONNX export + onnxruntime dynamic int8 quantization
+
+Chosen per service by constructor argument or env var
+(HASHARITA_SENTIMENT_BACKEND / HASHARITA_TOPICS_BACKEND). Exported and
+quantized artifacts are cached under HASHARITA_MODEL_CACHE
+(default: ~/.cache/hasharita/models/<model>/<backend>/).
+
+torch-fp32 weights are memory-mapped straight from model.safetensors (a
+one-time safetensors copy is written to the artifact cache for checkpoints
+that ship only .bin files): no random init, no read-and-copy of the
+weights, and the pages stay in the shared page cache across processes.
+HASHARITA_MMAP_WEIGHTS=0 falls back to plain from_pretrained.
+
+Every backend returns an object that is called like a HF model
+(model(input_ids=..., attention_mask=...).logits) and exposes .config,
+so the services' own tokenization / scoring code stays backend-agnostic.
+onnxruntime / onnx are optional and only imported when selected.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+import inspect
+import json
+import logging
+import os
+import re
+import struct
+
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch-fp32", "torch-int8-dynamic", "onnxruntime", "onnxruntime-int8")
+DEFAULT_BACKEND = "torch-fp32"
+
+
+def resolve_backend(name: Optional[str], env_var: str) -> str:
+    backend = (name or os.getenv(env_var) or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown inference backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def artifact_dir(model_name: str, backend: str) -> Path:
+    root = Path(os.getenv("HASHARITA_MODEL_CACHE", Path.home() / ".cache" / "hasharita" / "models"))
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name.strip("/"))
+    return root / slug / backend
+
+
+def load_sequence_classifier(model_name: str, backend: str, input_names=("input_ids", "attention_mask")):
+    """Returns a HF-callable sequence classifier for `backend` (see module docstring)."""
+    if backend == "torch-fp32":
+        if os.getenv("HASHARITA_MMAP_WEIGHTS", "1") == "1":
+            try:
+                return _load_torch_mmap(model_name)
+            except Exception as e:
+                logger.warning("mmap load of %s failed (%s), using from_pretrained", model_name, e)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        return model.eval()
+    if backend == "torch-int8-dynamic":
+        return _load_torch_int8(model_name)
+    if backend in ("onnxruntime", "onnxruntime-int8"):
+        return _load_onnx(model_name, quantized=(backend == "onnxruntime-int8"), input_names=tuple(input_names))
+    raise ValueError(f"unknown inference backend {backend!r}")
+
+
+# ---------- torch fp32 (mmap) ----------
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def mmap_safetensors(path: Path) -> Dict[str, torch.Tensor]:
+    """
+    Tensors of a .safetensors file as views on one private (copy-on-write)
+    file mapping. Nothing is read until a page is touched and read-only
+    pages are shared by every process that maps the same file.
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=path.stat().st_size)
+    base = 8 + header_len
+    tensors = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[meta["dtype"]]
+        start = base + meta["data_offsets"][0]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        if start % itemsize:
+            raise ValueError(f"{path.name}: tensor {name} is not aligned")
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, start // itemsize, meta["shape"])
+    return tensors
+
+
+def _safetensors_checkpoint(model_name: str) -> Path:
+    """Directory with config.json + a single model.safetensors for `model_name`."""
+    local = Path(model_name)
+    if (local / "model.safetensors").is_file():
+        return local
+    if not local.exists():
+        try:
+            from huggingface_hub import hf_hub_download
+
+            return Path(hf_hub_download(model_name, "model.safetensors")).parent
+        except Exception:
+            pass  # sadece .bin ya da parçalı checkpoint -> bir kerelik dönüştür
+
+    target = artifact_dir(model_name, "torch-fp32")
+    if not (target / "model.safetensors").is_file():
+        logger.info("writing a single-file safetensors copy of %s: %s", model_name, target)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        tmp = target.with_name(target.name + ".part")
+        model.save_pretrained(tmp, safe_serialization=True, max_shard_size="100GB")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, target)
+    return target
+
+
+def _load_torch_mmap(model_name: str):
+    from transformers.modeling_utils import no_init_weights
+
+    ckpt = _safetensors_checkpoint(model_name)
+    config = AutoConfig.from_pretrained(model_name)
+    with no_init_weights():
+        model = AutoModelForSequenceClassification.from_config(config)
+    state = mmap_safetensors(ckpt / "model.safetensors")
+
+    expected = model.state_dict()
+    for name, tensor in state.items():
+        if name in expected and expected[name].dtype != tensor.dtype:
+            raise ValueError(f"dtype mismatch for {name}: {tensor.dtype} vs {expected[name].dtype}")
+    missing, unexpected = model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    tied = set(getattr(model, "_tied_weights_keys", None) or [])
+    missing = [k for k in missing if k not in tied]
+    if missing:
+        raise ValueError(f"checkpoint is missing {len(missing)} tensors (e.g. {missing[0]})")
+    if unexpected:
+        logger.info("ignored %d unexpected checkpoint tensors of %s", len(unexpected), model_name)
+    logger.info("fp32 weights memory-mapped from %s", ckpt / "model.safetensors")
+    return model.eval()
+
+
+# ---------- torch int8 ----------
+
+def _load_torch_int8(model_name: str):
+    path = artifact_dir(model_name, "torch-int8-dynamic") / "model.pt"
+    if path.exists():
+        try:
+            model = torch.load(path, weights_only=False)
+            logger.info("int8 model loaded from cache: %s", path)
+            return model.eval()
+        except Exception as e:
+            logger.warning("int8 cache unreadable (%s), re-quantizing", e)
+
+    fp32 = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    model = torch.quantization.quantize_dynamic(fp32, {torch.nn.Linear}, dtype=torch.qint8)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".part")
+    torch.save(model, tmp)
+    os.replace(tmp, path)
+    logger.info("int8 model quantized and cached: %s", path)
+    return model.eval()
+
+
+# ---------- onnxruntime ----------
+
+class OnnxSequenceClassifier:
+    """Minimal HF-like wrapper around an onnxruntime session"""
+
+    def __init__(self, onnx_path: Path, config, intra_op_threads: int = 0) -> None:
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            opts.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(str(onnx_path), opts, providers=["CPUExecutionProvider"])
+        self.config = config
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs: Any):
+        feed = {
+            name: inputs[name].cpu().numpy() if isinstance(inputs[name], torch.Tensor) else inputs[name]
+            for name in self.input_names
+        }
+        logits = self.session.run(["logits"], feed)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+def _require_onnxruntime() -> None:
+    try:
+        import onnxruntime  # noqa: F401
+        import onnx  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("onnxruntime backend needs: pip install onnxruntime onnx") from e
+
+
+def _export_onnx(model_name: str, path: Path, input_names) -> None:
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    model.config.return_dict = False
+    # ONNX giriş isimleri forward() imzasındaki sırayla eşleşir
+    params = inspect.signature(model.forward).parameters
+    input_names = [name for name in params if name in set(input_names)]
+    dummy = {name: torch.ones((2, 8), dtype=torch.long) for name in input_names}
+    if "token_type_ids" in dummy:
+        dummy["token_type_ids"] = torch.zeros((2, 8), dtype=torch.long)
+    axes: Dict[str, Dict[int, str]] = {name: {0: "batch", 1: "seq"} for name in input_names}
+    axes["logits"] = {0: "batch"}
+
+    kwargs: Dict[str, Any] = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False  # klasik TorchScript exporter: dynamic_axes desteği net
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.stem + ".part.onnx")
+    torch.onnx.export(
+        model,
+        (dummy,),
+        str(tmp),
+        input_names=list(input_names),
+        output_names=["logits"],
+        dynamic_axes=axes,
+        opset_version=17,
+        **kwargs,
+    )
+    os.replace(tmp, path)
+
+
+def _load_onnx(model_name: str, quantized: bool, input_names) -> OnnxSequenceClassifier:
+    _require_onnxruntime()
+    fp32_path = artifact_dir(model_name, "onnxruntime") / "model.onnx"
+    if not fp32_path.exists():
+        logger.info("exporting %s to ONNX: %s", model_name, fp32_path)
+        _export_onnx(model_name, fp32_path, input_names)
+
+    path = fp32_path
+    if quantized:
+        path = artifact_dir(model_name, "onnxruntime-int8") / "model.int8.onnx"
+        if not path.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info("quantizing ONNX model to int8: %s", path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.stem + ".part.onnx")
+            quantize_dynamic(str(fp32_path), str(tmp), weight_type=QuantType.QInt8)
+            os.replace(tmp, path)
+
+    config = AutoConfig.from_pretrained(model_name)
+    return OnnxSequenceClassifier(path, config, intra_op_threads=torch.get_num_threads())
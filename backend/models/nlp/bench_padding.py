@@ -0,0 +1,85 @@
+"""
+Padding-waste benchmark: fixed-count batches vs token-budget length buckets.
+
+Usage (repo root):
+    python -m backend.models.nlp.bench_padding [--archive backend/twitter_data/archive]
+
+Tokenizes every text in the archived raw inbox files with the sentiment and
+topic tokenizers, then reports real vs padded tokens for
+  - fixed:    consecutive chunks of max_batch in arrival order (old behaviour)
+  - bucketed: plan_token_buckets() as used by the services
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import List
+
+from transformers import AutoTokenizer
+
+from backend.models.nlp.bucketing import fixed_count_buckets, padding_stats, plan_token_buckets
+from backend.models.nlp.sentiment.service import SentimentService
+from backend.models.nlp.topics.service import TopicClassificationService
+
+DEFAULT_ARCHIVE = Path(__file__).resolve().parents[2] / "twitter_data" / "archive"
+
+
+def load_texts(archive: Path) -> List[str]:
+    texts = []
+    for p in sorted(archive.glob("*.jsonl")):
+        if p.name.endswith(".enriched.jsonl"):
+            continue
+        with p.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    text = (json.loads(line).get("text") or "").strip()
+                except Exception:
+                    continue
+                if text:
+                    texts.append(text)
+    return texts
+
+
+def report(name: str, lengths: List[int], max_items: int, budget: int, cost: int) -> None:
+    fixed = padding_stats(lengths, fixed_count_buckets(len(lengths), max_items))
+    bucketed = padding_stats(lengths, plan_token_buckets(lengths, budget, max_items, cost_per_item=cost))
+    saved = 1.0 - bucketed["padded_tokens"] / fixed["padded_tokens"] if fixed["padded_tokens"] else 0.0
+    print(f"\n== {name} (max_items={max_items}, token_budget={budget}) ==")
+    for label, st in (("fixed", fixed), ("bucketed", bucketed)):
+        print(f"  {label:<9} batches={st['batches']:<5} real={st['real_tokens']:<8} "
+              f"padded={st['padded_tokens']:<8} waste={st['waste_ratio']:.1%}")
+    print(f"  padded tokens saved: {saved:.1%}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--archive", type=Path, default=DEFAULT_ARCHIVE)
+    args = ap.parse_args()
+
+    texts = load_texts(args.archive)
+    print(f"{len(texts)} texts from {args.archive}")
+    if not texts:
+        return
+
+    sent = SentimentService(lazy=True)
+    tok = AutoTokenizer.from_pretrained(sent.model_name)
+    lengths = [len(ids) for ids in tok(texts, truncation=True, max_length=sent.max_length)["input_ids"]]
+    report("sentiment", lengths, sent.max_batch, sent.token_budget, 1)
+
+    topics = TopicClassificationService
+    tok = AutoTokenizer.from_pretrained(topics.MODEL_NAME, use_fast=False)
+    longest_hyp = max(len(tok(topics.HYPOTHESIS_TEMPLATE.format(lb))["input_ids"]) for lb in topics.TOPIC_LABELS)
+    lengths = [
+        min(topics.MAX_LENGTH, len(tok(t, truncation=True, max_length=topics.MAX_LENGTH)["input_ids"]) + longest_hyp)
+        for t in texts
+    ]
+    report("topics (per NLI pair)", lengths, topics.MAX_BATCH, topics.TOKEN_BUDGET, len(topics.TOPIC_LABELS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Token-budget, length-bucketed batch planning shared by the NLP services.
+
+A forward pass costs roughly (items x longest item) because every batch is
+padded to its longest sequence. Sorting by token length and cutting batches on
+a padded-token budget keeps short tweets from paying for one long selftext.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+
+def plan_token_buckets(
+    lengths: Sequence[int],
+    token_budget: int,
+    max_items: int,
+    cost_per_item: int = 1,
+) -> List[List[int]]:
+    """
+    lengths: token length of each item (after truncation)
+    token_budget: max padded tokens per forward pass (items x longest x cost_per_item)
+    max_items: hard cap on items per bucket
+    cost_per_item: sequences produced per item (e.g. number of NLI hypotheses)
+    Returns buckets of original indices; callers scatter results back by index.
+    An item that alone exceeds the budget still gets its own bucket.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets: List[List[int]] = []
+    current: List[int] = []
+    for idx in order:
+        ln = max(1, int(lengths[idx]))
+        # sıralı olduğu için yeni eleman bucket'ın en uzunu olur
+        padded = (len(current) + 1) * ln * cost_per_item
+        if current and (padded > token_budget or len(current) + 1 > max_items):
+            buckets.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def padding_stats(lengths: Sequence[int], buckets: Sequence[Sequence[int]]) -> Dict[str, float]:
+    """Real vs padded token counts for a batching plan."""
+    real = sum(int(lengths[i]) for b in buckets for i in b)
+    padded = sum(len(b) * max(int(lengths[i]) for i in b) for b in buckets if b)
+    return {
+        "batches": len(buckets),
+        "real_tokens": real,
+        "padded_tokens": padded,
+        "waste_ratio": (1.0 - real / padded) if padded else 0.0,
+    }
+
+
+def fixed_count_buckets(n: int, max_items: int) -> List[List[int]]:
+    """The old behaviour: consecutive chunks of max_items in arrival order."""
+    return [list(range(i, min(i + max_items, n))) for i in range(0, n, max_items)]
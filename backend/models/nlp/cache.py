@@ -0,0 +1,139 @@
+"""
+Content-addressed prediction cache (LRU + TTL + approximate memory cap).
+
+Keys are sha1(config fingerprint + normalized text), so retweets, copy-paste
+appeals and texts re-scraped into several inbox files hit the same entry,
+while a model / threshold change never serves stale results.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFC + trimmed, single-spaced text. Case is kept (the sentiment model is cased)."""
+    return _WS.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    raw = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """Thread-safe bounded cache; values are deep-copied on the way in and out."""
+
+    ENTRY_OVERHEAD = 160  # OrderedDict node + tuple + key str (yaklaşık)
+
+    def __init__(
+        self,
+        fingerprint: str,
+        max_entries: int = 50000,
+        ttl_sec: float = 3600.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        name: str = "cache",
+    ) -> None:
+        self.fingerprint = fingerprint
+        self.max_entries = int(max_entries)
+        self.ttl_sec = float(ttl_sec)
+        self.max_bytes = int(max_bytes)
+        self.name = name
+
+        # key -> (expires_at, size, value)
+        self._data: OrderedDict[str, Tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # ---------- public API ----------
+
+    def key(self, text: str) -> str:
+        h = hashlib.sha1()
+        h.update(self.fingerprint.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(normalize_text(text).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at < now:
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Any) -> None:
+        value = copy.deepcopy(value)
+        size = self.ENTRY_OVERHEAD + len(key) + len(json.dumps(value, ensure_ascii=False, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl_sec, size, value)
+            self._bytes += size
+            self._evict_locked()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    # ---------- internals ----------
+
+    def _evict_locked(self) -> None:
+        now = time.monotonic()
+        # önce LRU ucundaki süresi dolmuşları temizle
+        while self._data:
+            k, (expires_at, size, _) = next(iter(self._data.items()))
+            if expires_at >= now:
+                break
+            del self._data[k]
+            self._bytes -= size
+            self.expirations += 1
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size, _) = self._data.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
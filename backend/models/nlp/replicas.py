@@ -0,0 +1,356 @@
+"""
+Model replica process pool.
+
+Each replica is a spawned process that builds one service instance (e.g.
+SentimentService), loads its model once and pins torch to a fixed number of
+intra-op threads (optionally to a fixed set of CPU cores), so concurrent
+sentiment and topic work no longer oversubscribe the same global thread pool.
+
+The router in the parent process sends every call to the least-loaded replica
+(by outstanding items) and splits large batches across replicas; results are
+concatenated back in order.
+
+A replica that crashes while serving is restarted. One whose service cannot
+be built or warmed up reports "failed" with the error instead (restarting it
+would only fail again) and is left out of routing and readiness.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import importlib
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _replica_main(
+    index: int,
+    spec: Tuple[str, str, Dict[str, Any]],
+    threads: int,
+    cores: Optional[List[int]],
+    requests,
+    results,
+) -> None:
+    """Replica process: pin threads/cores, build the service, serve (job_id, method, items); items=None -> method()."""
+    if cores:
+        try:
+            os.sched_setaffinity(0, cores)
+        except (AttributeError, OSError) as e:
+            logger.warning("replica %d: cpu affinity not applied: %s", index, e)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    module, cls_name, kwargs = spec
+    service = None
+    try:
+        service = getattr(importlib.import_module(module), cls_name)(**kwargs)
+        # model yüklü ve ısınmış olmadan "ready" deme; router hazır replikaları tercih eder
+        if hasattr(service, "warmup"):
+            service.warmup()
+    except Exception as e:
+        # yeniden başlatmak aynı hatayı tekrarlar: "failed" bildir ve temiz çık (crash-loop yok)
+        logger.exception("replica %d: model load / warmup failed: %s", index, e)
+        status = service.load_status() if hasattr(service, "load_status") else {}
+        status = dict(status or {}, state="failed", error=f"{type(e).__name__}: {e}")
+        results.put(("failed", index, None, status))
+        return
+    status = service.load_status() if hasattr(service, "load_status") else None
+    results.put(("ready", index, None, status))
+
+    while True:
+        job = requests.get()
+        if job is None:
+            return
+        job_id, method, items = job
+        try:
+            out = getattr(service, method)() if items is None else getattr(service, method)(items)
+            results.put(("ok", index, job_id, out))
+        except Exception as e:
+            try:
+                results.put(("err", index, job_id, e))
+            except Exception:
+                results.put(("err", index, job_id, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Replica:
+    def __init__(self, index: int, cores: Optional[List[int]]) -> None:
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.requests = None
+        self.results = None  # replika başına ayrı: öldürülen süreç paylaşılan kuyruğun kilidini kilitli bırakmasın
+        self.outstanding = 0          # gönderilmiş ama dönmemiş item sayısı
+        self.jobs: Dict[int, int] = {}  # job_id -> item sayısı
+        self.completed = 0
+        self.ready = False
+        self.failed = False           # yükleme / ısınma hatası: yeniden başlatılmaz
+        self.load_status: Optional[Dict[str, Any]] = None
+
+
+class ReplicaPool:
+    """
+    spec: (module path, class name, constructor kwargs) of the service to replicate
+    replicas / threads_per_replica: process count and torch threads in each
+    pin_cores: give every replica its own block of threads_per_replica cores,
+               starting at core_offset (so several pools can share a box)
+    min_chunk: batches are only split across replicas in chunks of >= this many items
+    """
+
+    def __init__(
+        self,
+        spec: Tuple[str, str, Dict[str, Any]],
+        replicas: int = 2,
+        threads_per_replica: int = 4,
+        pin_cores: bool = False,
+        core_offset: int = 0,
+        min_chunk: int = 8,
+        name: str = "pool",
+    ) -> None:
+        self.spec = spec
+        self.n_replicas = int(replicas)
+        self.threads = int(threads_per_replica)
+        self.pin_cores = bool(pin_cores)
+        self.core_offset = int(core_offset)
+        self.min_chunk = max(1, int(min_chunk))
+        self.name = name
+
+        self._ctx = mp.get_context("spawn")
+        self._replicas: List[_Replica] = []
+        self._futures: Dict[int, Future] = {}
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._monitor: Optional[threading.Thread] = None
+        self._stopped = False
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._replicas:
+                return
+            n_cpus = os.cpu_count() or 1
+            for i in range(self.n_replicas):
+                cores = None
+                if self.pin_cores:
+                    first = self.core_offset + i * self.threads
+                    cores = [c % n_cpus for c in range(first, first + self.threads)]
+                rep = _Replica(i, cores)
+                self._spawn(rep)
+                self._replicas.append(rep)
+            self._stopped = False
+        self._monitor = threading.Thread(target=self._monitor_loop, name=f"{self.name}-monitor", daemon=True)
+        self._monitor.start()
+        logger.info("[%s] %d replicas x %d threads started (pin_cores=%s)",
+                    self.name, self.n_replicas, self.threads, self.pin_cores)
+
+    def stop(self) -> None:
+        self._stopped = True
+        for rep in self._replicas:
+            try:
+                rep.requests.put(None)
+            except Exception:
+                pass
+        for rep in self._replicas:
+            rep.process.join(timeout=5)
+            if rep.process.is_alive():
+                rep.process.terminate()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every replica is ready or failed; True if the pool can serve."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(r.ready or r.failed for r in self._replicas):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return self.ready
+
+    @property
+    def ready(self) -> bool:
+        usable = [r for r in self._replicas if not r.failed]
+        return bool(usable) and all(r.ready for r in usable)
+
+    def load_status(self) -> Dict[str, Any]:
+        """/readyz view: ready once every replica that could load has loaded and warmed up its model."""
+        with self._lock:
+            replicas = [dict(r.load_status or {"state": "loading"}, index=r.index, ready=r.ready)
+                        for r in self._replicas]
+            all_failed = bool(self._replicas) and all(r.failed for r in self._replicas)
+        state = "failed" if all_failed else "ready" if self.ready else "loading"
+        return {"state": state, "replicas": replicas}
+
+    # ---------- public API ----------
+
+    def call(self, method: str, items: Sequence[Any], timeout: Optional[float] = None) -> List[Any]:
+        """Runs service.<method>(items) on the replicas; results come back in input order."""
+        items = list(items)
+        if not items:
+            return []
+        if not self._replicas:
+            self.start()
+
+        futures = self._dispatch(method, items)
+        out: List[Any] = []
+        for f in futures:
+            out.extend(f.result(timeout=timeout))
+        return out
+
+    def call_each(self, method: str, timeout: Optional[float] = None) -> List[Any]:
+        """
+        Runs service.<method>() once on every ready replica (e.g. stats); the
+        results of replicas that answered within `timeout`, in replica order.
+        """
+        with self._lock:
+            futures = []
+            for rep in self._replicas:
+                if rep.failed or not rep.ready or not rep.process.is_alive():
+                    continue
+                job_id = next(self._job_ids)
+                fut: Future = Future()
+                self._futures[job_id] = fut
+                rep.jobs[job_id] = 0
+                rep.requests.put((job_id, method, None))
+                futures.append(fut)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        out: List[Any] = []
+        for fut in futures:
+            try:
+                out.append(fut.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic())))
+            except Exception:
+                continue  # meşgul / ölmüş replika: bu turda eksik kalır
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "replicas": [
+                    {
+                        "index": r.index,
+                        "alive": bool(r.process and r.process.is_alive()),
+                        "ready": r.ready,
+                        "failed": r.failed,
+                        "outstanding_items": r.outstanding,
+                        "completed_jobs": r.completed,
+                        "cores": r.cores,
+                    }
+                    for r in self._replicas
+                ],
+                "threads_per_replica": self.threads,
+            }
+
+    # ---------- internals ----------
+
+    def _spawn(self, rep: _Replica) -> None:
+        rep.requests = self._ctx.Queue()
+        rep.results = self._ctx.Queue()
+        rep.ready = False
+        rep.failed = False
+        rep.load_status = None
+        rep.process = self._ctx.Process(
+            target=_replica_main,
+            args=(rep.index, self.spec, self.threads, rep.cores, rep.requests, rep.results),
+            name=f"{self.name}-replica-{rep.index}",
+            daemon=True,
+        )
+        rep.process.start()
+        threading.Thread(
+            target=self._listen, args=(rep, rep.process, rep.results),
+            name=f"{self.name}-results-{rep.index}", daemon=True,
+        ).start()
+
+    def _dispatch(self, method: str, items: List[Any]) -> List[Future]:
+        with self._lock:
+            usable = [r for r in self._replicas if not r.failed]
+            if not usable:
+                raise RuntimeError(f"{self.name}: no replica could load the model")
+            alive = [r for r in usable if r.process.is_alive()] or usable
+            # yüklenmekte olan (yeniden başlatılmış) replikaya iş verme, hazır olan varsa
+            alive = [r for r in alive if r.ready] or alive
+            n_chunks = min(len(alive), max(1, len(items) // self.min_chunk))
+            size = math.ceil(len(items) / n_chunks)
+            futures = []
+            for start in range(0, len(items), size):
+                chunk = items[start:start + size]
+                rep = min(alive, key=lambda r: r.outstanding)
+                job_id = next(self._job_ids)
+                fut: Future = Future()
+                self._futures[job_id] = fut
+                rep.jobs[job_id] = len(chunk)
+                rep.outstanding += len(chunk)
+                rep.requests.put((job_id, method, chunk))
+                futures.append(fut)
+            return futures
+
+    def _finish(self, rep: _Replica, job_id: int) -> Optional[Future]:
+        n = rep.jobs.pop(job_id, 0)
+        rep.outstanding -= n
+        rep.completed += 1
+        return self._futures.pop(job_id, None)
+
+    def _listen(self, rep: _Replica, process, results) -> None:
+        """One thread per spawned process; exits when that process is replaced."""
+        while not self._stopped and rep.process is process:
+            try:
+                kind, _, job_id, payload = results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                if rep.process is not process:
+                    return
+                if kind == "ready":
+                    rep.ready = True
+                    rep.load_status = payload
+                    continue
+                if kind == "failed":
+                    rep.failed = True
+                    rep.load_status = payload
+                    logger.error("[%s] replica %d failed to load: %s (not restarted)",
+                                 self.name, rep.index, (payload or {}).get("error"))
+                    return
+                fut = self._finish(rep, job_id)
+            if fut is None:
+                continue
+            if kind == "ok":
+                fut.set_result(payload)
+            else:
+                fut.set_exception(payload)
+
+    def _monitor_loop(self) -> None:
+        while not self._stopped:
+            time.sleep(1.0)
+            self._reap_dead()
+
+    def _reap_dead(self) -> None:
+        """A crashed replica fails its pending jobs and is restarted (not one that failed to load)."""
+        failed: List[Future] = []
+        with self._lock:
+            for rep in self._replicas:
+                if self._stopped or rep.process.is_alive() or rep.failed:
+                    continue
+                logger.error("[%s] replica %d died (exit=%s); restarting",
+                             self.name, rep.index, rep.process.exitcode)
+                for job_id in list(rep.jobs):
+                    fut = self._finish(rep, job_id)
+                    if fut is not None:
+                        failed.append(fut)
+                self._spawn(rep)
+        for fut in failed:
+            fut.set_exception(RuntimeError("inference replica crashed"))
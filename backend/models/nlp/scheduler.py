@@ -0,0 +1,369 @@
+"""
+Cross-request micro-batching scheduler for the NLP services.
+
+HTTP handlers and the inbox watcher submit small lists of items; a single
+worker thread merges whatever is pending into one batch (up to max_batch items
+or until max_wait_ms has passed since the oldest pending request), runs the
+wrapped batch function once and hands every caller back its own slice.
+
+Admission control: the queue holds at most max_queue_items pending items.
+Beyond that submit_async raises QueueFull with a retry-after estimate from
+the measured throughput (HTTP -> 429), or waits for room (block=True, used by
+the inbox watcher). Requests past their deadline are failed with
+DeadlineExceeded and cancelled futures are dropped before they reach the model.
+
+Priority lanes: every request has a priority (PRIORITY_HIGH for emergency
+traffic, PRIORITY_NORMAL for bulk). Each batch is filled from the highest
+lane first, FIFO within a lane, so urgent work overtakes queued bulk work at
+the next batch boundary. The queue limit is applied per lane.
+
+Thread budget: with intra_op_threads > 0 the worker thread pins torch's
+intra-op thread count for itself (OpenMP keeps it per calling thread), so two
+schedulers wrapping different models can run side by side on disjoint
+budgets instead of oversubscribing the cores.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Deque, Dict, List, Optional
+from collections import deque
+from concurrent.futures import Future
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+LANE_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal"}
+
+
+class QueueFull(RuntimeError):
+    """The inference queue is at max_queue_items; retry_after is in seconds."""
+
+    def __init__(self, name: str, pending_items: int, retry_after: int) -> None:
+        super().__init__(f"{name}: inference queue full ({pending_items} items pending)")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed while it was still queued."""
+
+
+class _Pending:
+    __slots__ = ("items", "future", "enqueued_at", "deadline", "priority")
+
+    def __init__(self, items: List[Any], deadline: Optional[float] = None, priority: int = PRIORITY_NORMAL) -> None:
+        self.items = items
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline  # time.monotonic() tabanlı; None -> süresiz
+        self.priority = priority
+
+
+class MicroBatchScheduler:
+    """
+    Wraps a batch function `fn(items) -> results` (len(results) == len(items)).
+    - requests are never split: a request larger than max_batch runs alone,
+      so the service's own size validation still applies to it
+    - if a merged batch fails, its requests are retried one by one so each
+      caller receives its own error (e.g. ValueError -> 400)
+    - max_queue_items=0 disables admission control
+    """
+
+    THROUGHPUT_ALPHA = 0.2  # items/s EWMA
+    MAX_RETRY_AFTER = 60
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = 64,
+        max_wait_ms: float = 10.0,
+        name: str = "scheduler",
+        max_queue_items: int = 0,
+        intra_op_threads: int = 0,
+    ) -> None:
+        self.fn = fn
+        self.max_batch = int(max_batch)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self.name = name
+        self.max_queue_items = int(max_queue_items)
+        self.intra_op_threads = int(intra_op_threads)  # 0 -> torch varsayılanı
+
+        self._pending: List[_Pending] = []
+        self._pending_items = 0
+        self._lane_items: Dict[int, int] = {p: 0 for p in LANE_NAMES}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+        # sayaçlar
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self._lane_waits: Dict[int, Deque[float]] = {p: deque(maxlen=1024) for p in LANE_NAMES}
+        self._lane_requests: Dict[int, int] = {p: 0 for p in LANE_NAMES}
+        self._throughput = 0.0
+        self._rejected = 0
+        self._expired = 0
+        self._cancelled = 0
+
+    # ---------- public API ----------
+
+    def submit(
+        self,
+        items: List[Any],
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        block: bool = False,
+        priority: int = PRIORITY_NORMAL,
+    ) -> List[Any]:
+        """Blocks until the batch containing `items` has run; returns results for `items` only."""
+        if not items:
+            return []
+        return self.submit_async(items, deadline=deadline, block=block, priority=priority).result(timeout=timeout)
+
+    def submit_async(
+        self,
+        items: List[Any],
+        deadline: Optional[float] = None,
+        block: bool = False,
+        priority: int = PRIORITY_NORMAL,
+    ) -> Future:
+        """
+        deadline: time.monotonic() value after which queued work is dropped
+        block: wait for queue room instead of raising QueueFull
+        priority: PRIORITY_HIGH requests are batched before PRIORITY_NORMAL ones
+        Cancelling the returned future before its batch starts removes the request.
+        """
+        if priority not in LANE_NAMES:
+            raise ValueError(f"unknown priority {priority!r}")
+        req = _Pending(list(items), deadline, priority)
+        if not req.items:
+            req.future.set_result([])
+            return req.future
+        self.start()
+        n = len(req.items)
+        with self._cond:
+            while self._is_full_locked(n, priority):
+                if not block:
+                    self._rejected += 1
+                    raise QueueFull(self.name, self._lane_items[priority], self._retry_after_locked(n, priority))
+                self._cond.wait(timeout=0.5)
+            self._pending.append(req)
+            self._pending_items += n
+            self._lane_items[priority] += n
+            self._cond.notify_all()
+        return req.future
+
+    @property
+    def pending_items(self) -> int:
+        return self._pending_items
+
+    def is_full(self, n_items: int = 1, priority: int = PRIORITY_NORMAL) -> bool:
+        """Would submit() of n_items in this lane block / raise QueueFull right now?"""
+        with self._cond:
+            return self._is_full_locked(n_items, priority)
+
+    def retry_after(self, n_items: int = 1, priority: int = PRIORITY_NORMAL) -> int:
+        with self._cond:
+            return self._retry_after_locked(n_items, priority)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._loop, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            batches = self._batches
+            waits = sorted(self._waits)
+            lanes = {}
+            for prio, lane in LANE_NAMES.items():
+                lane_waits = sorted(self._lane_waits[prio])
+                lanes[lane] = {
+                    "pending_items": self._lane_items[prio],
+                    "requests": self._lane_requests[prio],
+                    "queue_wait_p50_ms": (lane_waits[len(lane_waits) // 2] * 1000.0) if lane_waits else 0.0,
+                    "queue_wait_p95_ms": (lane_waits[int(len(lane_waits) * 0.95)] * 1000.0) if lane_waits else 0.0,
+                }
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_queue_items": self.max_queue_items,
+                "intra_op_threads": self.intra_op_threads,
+                "pending_requests": len(self._pending),
+                "pending_items": self._pending_items,
+                "rejected": self._rejected,
+                "expired": self._expired,
+                "cancelled": self._cancelled,
+                "throughput_items_per_sec": round(self._throughput, 2),
+                "queue_wait_p50_ms": (waits[len(waits) // 2] * 1000.0) if waits else 0.0,
+                "queue_wait_p95_ms": (waits[int(len(waits) * 0.95)] * 1000.0) if waits else 0.0,
+                "batches": batches,
+                "requests": self._requests,
+                "items": self._items,
+                "avg_batch_items": (self._items / batches) if batches else 0.0,
+                "avg_queue_wait_ms": (self._wait_total / self._requests * 1000.0) if self._requests else 0.0,
+                "avg_run_ms": (self._run_total / batches * 1000.0) if batches else 0.0,
+                "lanes": lanes,
+            }
+
+    # ---------- internals ----------
+
+    def _is_full_locked(self, n: int, priority: int) -> bool:
+        # limit şerit başına: bulk yığılması acil istekleri reddettirmesin
+        # boş şeride tek büyük istek her zaman girer (yoksa hiç kabul edilemezdi)
+        lane = self._lane_items[priority]
+        return self.max_queue_items > 0 and lane > 0 and lane + n > self.max_queue_items
+
+    def _retry_after_locked(self, n: int, priority: int = PRIORITY_NORMAL) -> int:
+        if self._throughput <= 0:
+            return 1
+        ahead = sum(items for prio, items in self._lane_items.items() if prio <= priority)
+        eta = (ahead + n) / self._throughput
+        return max(1, min(self.MAX_RETRY_AFTER, math.ceil(eta)))
+
+    def _purge_locked(self) -> None:
+        """Drops cancelled requests and fails the ones whose deadline has passed."""
+        now = time.monotonic()
+        keep: List[_Pending] = []
+        for p in self._pending:
+            if p.future.cancelled():
+                self._cancelled += 1
+            elif p.deadline is not None and p.deadline < now:
+                self._expired += 1
+                p.future.set_exception(DeadlineExceeded(f"{self.name}: deadline passed after "
+                                                        f"{(now - p.enqueued_at) * 1000.0:.0f} ms in queue"))
+            else:
+                keep.append(p)
+                continue
+            self._pending_items -= len(p.items)
+            self._lane_items[p.priority] -= len(p.items)
+        if len(keep) != len(self._pending):
+            self._pending = keep
+            self._cond.notify_all()
+
+    def _take_batch(self) -> List[_Pending]:
+        """Waits for work, then collects requests until the batch is full or the deadline passes."""
+        with self._cond:
+            while True:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return []
+
+                deadline = self._pending[0].enqueued_at + self.max_wait
+                while self._pending:
+                    remaining = deadline - time.monotonic()
+                    if self._pending_items >= self.max_batch or remaining <= 0 or self._stopped:
+                        break
+                    self._cond.wait(timeout=remaining)
+
+                self._purge_locked()
+                taken: List[_Pending] = []
+                size = 0
+                # yüksek öncelikli şerit önce; şerit içinde FIFO (sorted kararlı)
+                for p in sorted(self._pending, key=lambda r: r.priority):
+                    n = len(p.items)
+                    if taken and size + n > self.max_batch:
+                        break
+                    self._pending.remove(p)
+                    self._pending_items -= n
+                    self._lane_items[p.priority] -= n
+                    # bundan sonra cancel() başarısız olur -> set_result güvenli
+                    if not p.future.set_running_or_notify_cancel():
+                        self._cancelled += 1
+                        continue
+                    taken.append(p)
+                    size += n
+                self._cond.notify_all()  # block=True ile bekleyenlere yer açıldı
+                if taken:
+                    return taken
+
+    def _loop(self) -> None:
+        while True:
+            taken = self._take_batch()
+            if not taken:
+                if self._stopped:
+                    return
+                continue
+            self._run(taken)
+
+    def _apply_thread_budget(self) -> None:
+        """Runs on the worker thread; re-applied if intra_op_threads is changed at runtime."""
+        if self.intra_op_threads <= 0:
+            return
+        import torch
+
+        # torch bu thread'in sayısını ilk op'ta tembelce kurar ve o an en son set edilen değeri alır
+        # (başka scheduler'ınki olabilir): önce get_num_threads ile kurulumu zorla, sonra kendi değerini yaz.
+        # Önbellek değil gerçek değerle karşılaştır: tembel kurulum değeri sonradan ezebilir.
+        if torch.get_num_threads() != self.intra_op_threads:
+            torch.set_num_threads(self.intra_op_threads)
+
+    def _run(self, taken: List[_Pending]) -> None:
+        self._apply_thread_budget()
+        started = time.monotonic()
+        merged: List[Any] = []
+        for p in taken:
+            merged.extend(p.items)
+
+        try:
+            results = self.fn(merged)
+            if len(results) != len(merged):
+                raise RuntimeError(f"{self.name}: batch fn returned {len(results)} results for {len(merged)} items")
+        except Exception as e:
+            if len(taken) == 1:
+                taken[0].future.set_exception(e)
+            else:
+                # hangi isteğin bozduğunu bilmiyoruz -> tek tek tekrar dene
+                logger.warning("%s: merged batch failed (%s); retrying %d requests individually",
+                               self.name, e, len(taken))
+                for p in taken:
+                    try:
+                        p.future.set_result(self.fn(p.items))
+                    except Exception as e2:
+                        p.future.set_exception(e2)
+            self._record(taken, len(merged), started)
+            return
+
+        offset = 0
+        for p in taken:
+            n = len(p.items)
+            p.future.set_result(results[offset:offset + n])
+            offset += n
+        self._record(taken, len(merged), started)
+
+    def _record(self, taken: List[_Pending], n_items: int, started: float) -> None:
+        finished = time.monotonic()
+        with self._cond:
+            self._batches += 1
+            self._items += n_items
+            self._requests += len(taken)
+            self._wait_total += sum(started - p.enqueued_at for p in taken)
+            self._waits.extend(started - p.enqueued_at for p in taken)
+            for p in taken:
+                self._lane_waits[p.priority].append(started - p.enqueued_at)
+                self._lane_requests[p.priority] += 1
+            self._run_total += finished - started
+            rate = n_items / max(finished - started, 1e-6)
+            if self._throughput <= 0:
+                self._throughput = rate
+            else:
+                self._throughput += self.THROUGHPUT_ALPHA * (rate - self._throughput)
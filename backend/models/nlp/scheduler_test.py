@@ -0,0 +1,52 @@
+"""
+Thread budget of MicroBatchScheduler: two schedulers with different
+intra_op_threads must each run their batches on their own budget.
+
+    python -m pytest backend/models/nlp/scheduler_test.py
+"""
+
+import threading
+
+import torch
+
+from backend.models.nlp.scheduler import MicroBatchScheduler
+
+
+def _recording_scheduler(name: str, threads: int, seen: dict, gate: threading.Barrier) -> MicroBatchScheduler:
+    def fn(items):
+        if items == ["first"]:
+            gate.wait(timeout=10)  # iki worker da ilk op'tan önce set etmiş olsun
+        seen.setdefault(name, []).append(torch.get_num_threads())
+        return items
+
+    sched = MicroBatchScheduler(fn, max_batch=8, max_wait_ms=0, name=name, intra_op_threads=threads)
+    sched.start()
+    return sched
+
+
+def test_schedulers_keep_their_own_thread_budget():
+    seen: dict = {}
+    gate = threading.Barrier(2)
+    sent = _recording_scheduler("sent", 1, seen, gate)
+    topics = _recording_scheduler("topics", 3, seen, gate)
+    try:
+        futures = [sent.submit_async(["first"]), topics.submit_async(["first"])]
+        for f in futures:
+            f.result(timeout=10)
+        for _ in range(3):
+            sent.submit(["x"], timeout=10)
+            topics.submit(["x"], timeout=10)
+        assert seen == {"sent": [1] * 4, "topics": [3] * 4}
+
+        topics.intra_op_threads = 2  # çalışırken değiştirilince bir sonraki batch'te uygulanır
+        topics.submit(["x"], timeout=10)
+        sent.submit(["x"], timeout=10)
+        assert seen["topics"][-1] == 2 and seen["sent"][-1] == 1
+    finally:
+        sent.stop()
+        topics.stop()
+
+
+if __name__ == "__main__":
+    test_schedulers_keep_their_own_thread_budget()
+    print("ok")
@@ -12,20 +12,34 @@ from __future__ import annotations
 
 from typing import List, Dict, Any, Optional, Tuple
 import logging
+import threading
+import time
 
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    TextClassificationPipeline,
-    pipeline,
-)
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+
+from backend.models.nlp.backends import load_sequence_classifier, resolve_backend
+from backend.models.nlp.bucketing import plan_token_buckets
+from backend.models.nlp.cache import ResultCache, config_fingerprint
+from backend.models.nlp.warmup import LoadStatus, warmup_texts
+
+
+WARMUP_LENGTHS = (16, 64, 256)  # kelime; max_length'te kesilir
 
 
 class SentimentService:
     """
-    Lazy-loaded Transformers pipeline wrapper for Turkish sentiment (2-class).
+    Lazy-loaded Transformers model wrapper for Turkish sentiment (2-class).
     - device: CPU
+    - backend: torch-fp32 | torch-int8-dynamic | onnxruntime | onnxruntime-int8
+      (arg or HASHARITA_SENTIMENT_BACKEND); scores are computed exactly like the
+      HF text-classification pipeline (softmax, return_all_scores)
     - batch inference with truncation
+    - forward passes are length-bucketed under a padded-token budget
+    - optional content-addressed result cache (cache_entries > 0); hits skip
+      tokenization and the forward pass
+    - load_status() / warmup() for readiness gating (see /readyz)
     - returns schema-shaped items:
       {
         "id": "...",
@@ -42,6 +56,11 @@ class SentimentService:
         tie_margin: float = 0.08,          # m
         max_batch: int = 64,
         lazy: bool = True,                 # your choice: lazy
+        token_budget: int = 4096,          # padded tokens per forward pass
+        cache_entries: int = 0,            # 0 -> cache off
+        cache_ttl_sec: float = 3600.0,
+        cache_max_mb: float = 64.0,
+        backend: Optional[str] = None,     # None -> env / torch-fp32
     ) -> None:
         self.model_name = model_name
         self.max_length = int(max_length)
@@ -49,8 +68,30 @@ class SentimentService:
         self.tie_margin = float(tie_margin)
         self.max_batch = int(max_batch)
         self.lazy = bool(lazy)
-
-        self._pipe: Optional[TextClassificationPipeline] = None
+        self.token_budget = int(token_budget)
+        self.backend = resolve_backend(backend, "HASHARITA_SENTIMENT_BACKEND")
+
+        self._model = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+        self.status = LoadStatus("sentiment")
+
+        self._cache: Optional[ResultCache] = None
+        if cache_entries > 0:
+            fingerprint = config_fingerprint({
+                "model": self.model_name,
+                "max_length": self.max_length,
+                "neutral_threshold": self.neutral_threshold,
+                "tie_margin": self.tie_margin,
+                "backend": self.backend,
+            })
+            self._cache = ResultCache(
+                fingerprint,
+                max_entries=cache_entries,
+                ttl_sec=cache_ttl_sec,
+                max_bytes=int(cache_max_mb * 1024 * 1024),
+                name="sentiment",
+            )
 
         # basic logger
         self._log = logging.getLogger("SentimentService")
@@ -58,7 +99,7 @@ class SentimentService:
             logging.basicConfig(level=logging.INFO)
 
         if not self.lazy:
-            self._ensure_pipeline()
+            self._ensure_model()
 
     # ---------- public API (schema-shaped) ----------
 
@@ -100,59 +141,135 @@ class SentimentService:
             ids.append(str(_id))
             texts.append(_tx)
 
-        pipe = self._ensure_pipeline()
-
-        # HF pipeline: return_all_scores=True -> list[ list[ {label, score}, ... ] ]
-        raw: List[List[Dict[str, Any]]] = pipe(
-            texts,
-            return_all_scores=True,
-            truncation=True,
-            max_length=self.max_length,
-        )
+        sentiments = self._predict_texts(texts, ids)
 
         out: List[Dict[str, Any]] = []
-        for idx, scores_list in enumerate(raw):
-            score_map = self._normalize_score_map(scores_list)  # prefers {"positive","negative"}
-            label, reason = self._apply_policy(score_map)       # "positive"/"negative"/"neutral"
-
-            # schema sentiment.score:
-            # - if pos: score = p_pos
-            # - if neg: score = p_neg
-            # - if neutral: score = 1 - max(p_pos, p_neg)   (S1)
-            sent_score = self._schema_sentiment_score(label, score_map)
-
+        for idx, sentiment in enumerate(sentiments):
             out.append({
                 "id": ids[idx],
-                "sentiment": {"label": label, "score": sent_score},
+                "sentiment": sentiment,
                 "topics": [],  # reserved for future topic model
             })
 
-            # optional: debug log (not exposed to API)
-            self._log.debug("id=%s label=%s score_map=%s reason=%s", ids[idx], label, score_map, reason)
-
         return out
 
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        return self._cache.stats() if self._cache is not None else None
+
+    def warmup(self, lengths=WARMUP_LENGTHS) -> float:
+        """Loads the model and runs one forward pass per length (cache bypassed)."""
+        self._ensure_model()
+        self.status.warming()
+        t0 = time.monotonic()
+        try:
+            self._run_bucketed(warmup_texts(lengths))
+        except Exception as e:
+            self.status.failed(e)  # /readyz "warming"de takılı kalmasın, hatayı göstersin
+            raise
+        self.status.warmed()
+        elapsed = time.monotonic() - t0
+        self._log.info("Sentiment warmup done in %.2fs (lengths=%s)", elapsed, list(lengths))
+        return elapsed
+
+    def load_status(self) -> Dict[str, Any]:
+        return dict(self.status.snapshot(), backend=self.backend)
+
     # ---------- internals ----------
 
-    def _ensure_pipeline(self) -> TextClassificationPipeline:
-        if self._pipe is not None:
-            return self._pipe
-
-        tok = AutoTokenizer.from_pretrained(self.model_name)
-        mdl = AutoModelForSequenceClassification.from_pretrained(self.model_name)
-        self._pipe = pipeline(
-            task="text-classification",
-            model=mdl,
-            tokenizer=tok,
-            device=-1,  # CPU
-        )
-        self._log.info("Sentiment pipeline loaded (lazy=%s)", self.lazy)
-        self._log.info("Model labels: %s", getattr(self._pipe.model.config, "id2label", None))
-        return self._pipe
+    def _predict_texts(self, texts: List[str], ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Returns {"label","score"} per text. Cache hits and repeated texts inside
+        the batch never reach the tokenizer; only unique misses are run.
+        """
+        cache = self._cache
+        keys = [cache.key(t) for t in texts] if cache is not None else list(texts)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+
+        todo: Dict[str, List[int]] = {}
+        for idx, key in enumerate(keys):
+            hit = cache.get(key) if cache is not None else None
+            if hit is not None:
+                results[idx] = hit
+            else:
+                todo.setdefault(key, []).append(idx)
+
+        if todo:
+            uniq = [positions[0] for positions in todo.values()]
+            raw = self._run_bucketed([texts[i] for i in uniq])
+
+            for positions, scores_list in zip(todo.values(), raw):
+                score_map = self._normalize_score_map(scores_list)  # prefers {"positive","negative"}
+                label, reason = self._apply_policy(score_map)       # "positive"/"negative"/"neutral"
+
+                # schema sentiment.score:
+                # - if pos: score = p_pos
+                # - if neg: score = p_neg
+                # - if neutral: score = 1 - max(p_pos, p_neg)   (S1)
+                sent_score = self._schema_sentiment_score(label, score_map)
+                sentiment = {"label": label, "score": sent_score}
+
+                if cache is not None:
+                    cache.put(keys[positions[0]], sentiment)
+                for i in positions:
+                    results[i] = dict(sentiment)
+
+                # optional: debug log (not exposed to API)
+                self._log.debug("id=%s label=%s score_map=%s reason=%s", ids[positions[0]], label, score_map, reason)
+
+        return results  # type: ignore[return-value]
+
+    def _run_bucketed(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        """
+        Sort by token length, cut buckets on self.token_budget, run each bucket as
+        one padded forward pass and return scores in the original order.
+        Output per text matches the HF pipeline with return_all_scores=True:
+        [{label, score}, ...] in id2label order.
+        """
+        model, tok = self._ensure_model()
+        enc = tok(texts, truncation=True, max_length=self.max_length)
+        lengths = [len(ids) for ids in enc["input_ids"]]
+        buckets = plan_token_buckets(lengths, self.token_budget, self.max_batch)
+        id2label = model.config.id2label
+
+        raw: List[Optional[List[Dict[str, Any]]]] = [None] * len(texts)
+        with torch.inference_mode():
+            for bucket in buckets:
+                batch = tok.pad(
+                    {k: [enc[k][i] for i in bucket] for k in tok.model_input_names if k in enc},
+                    return_tensors="pt",
+                )
+                logits = model(**batch).logits.float().numpy()
+                # pipeline ile aynı: kararlı softmax
+                shifted = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+                probs = shifted / shifted.sum(axis=-1, keepdims=True)
+                for i, row in zip(bucket, probs):
+                    raw[i] = [{"label": id2label[j], "score": row[j].item()} for j in range(len(row))]
+        return raw  # type: ignore[return-value]
+
+    def _ensure_model(self):
+        if self._model is not None:
+            return self._model, self._tokenizer
+
+        with self._load_lock:
+            if self._model is None:
+                self.status.loading()
+                try:
+                    tok = AutoTokenizer.from_pretrained(self.model_name)
+                    mdl = load_sequence_classifier(self.model_name, self.backend, tok.model_input_names)
+                except Exception as e:
+                    self.status.failed(e)
+                    raise
+                self._tokenizer = tok
+                self._model = mdl
+                self.status.loaded()
+                self._log.info("Sentiment model loaded in %.2fs (lazy=%s, backend=%s)",
+                               self.status.load_sec, self.lazy, self.backend)
+                self._log.info("Model labels: %s", getattr(mdl.config, "id2label", None))
+        return self._model, self._tokenizer
 
     def _normalize_score_map(self, scores_list: List[Dict[str, Any]]) -> Dict[str, float]:
         """
-        Convert pipeline list-of-scores into a dict with canonical keys when possible.
+        Convert list-of-scores into a dict with canonical keys when possible.
         Example item: {'label': 'NEGATIVE', 'score': 0.73}
         Returns preferably {"positive": p_pos, "negative": p_neg};
         otherwise returns top-2 labels as a generic map.
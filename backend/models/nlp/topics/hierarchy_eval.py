@@ -0,0 +1,104 @@
+"""
+Flat vs hierarchical vs keyword-prior topic classification on train-data.json.
+
+Usage (repo root):
+    python -m backend.models.nlp.topics.hierarchy_eval [--limit 200] [--prior-only]
+
+Reports micro precision / recall / F1 against the gold topics, average NLI
+pairs per text and wall-clock latency for both modes.
+
+It first reports the keyword prior's candidate recall (no model needed): how
+many gold labels stay in the narrowed candidate set. A gold label outside it
+can never be predicted, so this bounds the keyword mode's recall.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from backend.models.nlp.topics.keywords import KeywordPrior
+from backend.models.nlp.topics.service import TopicClassificationService
+
+TRAIN_DATA = Path(__file__).resolve().parent / "train-data.json"
+
+
+def evaluate(svc, data):
+    texts = [d["text"] for d in data]
+    t0 = time.perf_counter()
+    results = svc.classify_batch_detailed(texts)
+    elapsed = time.perf_counter() - t0
+
+    tp = fp = fn = 0
+    for d, res in zip(data, results):
+        gold = set(d.get("topics", []))
+        pred = {t["label"] for t in res["topics"]}
+        tp += len(gold & pred)
+        fp += len(pred - gold)
+        fn += len(gold - pred)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    pairs = sum(r["nli_pairs"] for r in results)
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "pairs_per_text": pairs / len(texts),
+        "ms_per_text": elapsed / len(texts) * 1000.0,
+    }
+
+
+def candidate_recall(prior: KeywordPrior, data):
+    fired = candidates = gold = kept = 0
+    for d in data:
+        labels = set(d.get("topics", []))
+        cands = prior.candidates(d["text"])
+        gold += len(labels)
+        if cands is None:  # tam etiket seti skorlanır
+            kept += len(labels)
+            continue
+        fired += 1
+        candidates += len(cands)
+        kept += len(labels & set(cands))
+    return {
+        "fired": fired,
+        "candidate_recall": kept / gold if gold else 0.0,
+        "dropped": gold - kept,
+        "gold": gold,
+        "candidates_per_fired": candidates / fired if fired else 0.0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--prior-only", action="store_true", help="only the keyword prior's candidate recall")
+    args = ap.parse_args()
+
+    data = json.loads(TRAIN_DATA.read_text(encoding="utf-8"))
+    if args.limit:
+        data = data[: args.limit]
+
+    c = candidate_recall(KeywordPrior(TopicClassificationService.TOPIC_LABELS), data)
+    print(f"keyword prior: fires on {c['fired']}/{len(data)} texts, candidate recall {c['candidate_recall']:.3f} "
+          f"({c['dropped']}/{c['gold']} gold labels dropped), {c['candidates_per_fired']:.1f} candidates/text")
+    if args.prior_only:
+        return
+
+    flat = TopicClassificationService()
+    hier = TopicClassificationService(hierarchical=True)
+    keyword = TopicClassificationService(keyword_prior=True)
+    for other in (hier, keyword):
+        other._model, other._tokenizer = flat._load_model()  # aynı ağırlıkları paylaş
+    flat.classify_batch(["ısınma"])  # model yükleme süresini ölçüme katma
+
+    print(f"{len(data)} texts")
+    for name, svc in (("flat", flat), ("hierarchical", hier), ("keyword", keyword)):
+        r = evaluate(svc, data)
+        print(f"{name:<13} P={r['precision']:.3f} R={r['recall']:.3f} F1={r['f1']:.3f} "
+              f"pairs/text={r['pairs_per_text']:.1f} latency={r['ms_per_text']:.1f} ms/text")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Keyword -> topic label prior for TopicClassificationService.
+
+Compiled from the scrapers' topic-grouped keyword lists
+(SeleniumTwitterScraper.disaster_keywords, MockDataGenerator keywords).
+A text with strong keyword hits is only scored against its 3-5 plausible
+labels; texts without hits (or with too many competing hits) fall back to
+the full label set.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import re
+
+# etiket -> anahtar kelimeler; kelime başından eşleşir, ardından yalnızca SUFFIXES'tan ekler gelebilir
+# ("deprem" -> "depremde", "depremzedelere"; "metro" -> "metroda" ama "metropol" değil)
+KEYWORD_LABELS: Dict[str, List[str]] = {
+    "trafik": ["trafik", "yoğunluk", "kilit", "e-5", "d-100", "d100", "kaza", "şerit", "tıkan"],
+    "ulaşım": ["metrobüs", "metro", "otobüs", "sefer iptal", "aktarma", "marmaray", "vapur", "tramvay",
+               "toplu taşıma"],
+    "yağış": ["yağmur", "sağanak", "dolu", "fırtına", "şiddetli yağış", "yağış", "kar yağ"],
+    "sel": ["sel ", "selde", "sel felaket", "su baskın", "dere taştı", "mazgal", "altgeçit", "su bast"],
+    "elektrik kesintisi": ["elektrik kesil", "elektrik yok", "elektrikler git", "elektrik kesinti",
+                           "elektrik arıza"],
+    "enerji": ["enerji", "trafo", "hat arızası", "yüksek tüketim", "doğalgaz", "doğal gaz"],
+    "atık/çöp": ["çöp", "atık", "döküntü", "konteyner"],
+    "çevre kirliliği": ["kirlilik", "kirliliği", "duman", "is kokusu", "zehirli", "sanayi atığı", "koku"],
+    "yardım": ["yardım", "gönüllü", "ihtiyaç", "bağış", "destek", "kurtarma"],
+    "deprem": ["deprem", "artçı", "afad", "sarsıntı", "fay hattı", "enkaz", "#deprem"],
+    "yangın": ["yangın", "itfaiye", "alev", "orman yangın", "#yangın", "baca"],
+    "gürültü": ["gürültü", "yüksek ses", "inşaat sesi", "rahatsız"],
+    "kamusal alan": ["kaldırım", "bank kırık", "oyun alanı", "kamusal alan", "meydan"],
+    "yeşil alan": ["park bakımsız", "ağaç kesim", "yeşil alan", "koru", "millet bahçe"],
+    "su kesintisi": ["su kesil", "sular yok", "su yok", "baraj seviye", "isale hattı", "şebeke suyu",
+                     "su kesinti", "sular kesil"],
+    "barınma": ["barınma", "çadır", "kira", "yurt yok", "sokakta kal", "konteyner kent"],
+    "sağlık": ["ambulans", "acil servis", "hastane", "eczane", "sağlık"],
+    "eğitim": ["okul", "uzaktan eğitim", "sınav", "öğrenci", "eğitim"],
+    "sosyal yardım": ["sosyal yardım", "gıda kolisi", "erzak", "aşevi", "gıda"],
+    "altyapı": ["altyapı", "yol çalışma", "çukur", "boru patla", "kazı çalışma", "bakım-onarım",
+                "bakım onarım", "isale"],
+}
+
+# tek başına zayıf sinyal veren genel kelimeler (ağırlık 1, diğerleri 2)
+WEAK_KEYWORDS = {
+    "yoğunluk", "kilit", "şerit", "dolu", "destek", "ihtiyaç", "rahatsız", "koku", "kira", "meydan",
+    "koru", "alev", "baca", "gıda", "öğrenci", "sağlık", "eğitim", "kaza", "aktarma", "konteyner",
+}
+
+# anahtar kelimeden sonra izin verilen ekler (en fazla MAX_SUFFIXES tanesi art arda, sonra kelime sonu):
+# çoğul, iyelik, hâl ekleri, -ki, yapım ekleri ve kök olarak verilen fiillerin ("kesil", "tıkan") çekimleri
+SUFFIXES = [
+    "lar", "ler", "lık", "lik", "luk", "lük", "cı", "ci", "cu", "cü", "çı", "çi", "çu", "çü", "zede", "sız", "siz",
+    "ım", "im", "um", "üm", "ın", "in", "un", "ün", "sı", "si", "su", "sü", "ı", "i", "u", "ü", "a", "e",
+    "ya", "ye", "yı", "yi", "yu", "yü", "na", "ne", "nı", "ni", "nu", "nü", "nın", "nin", "nun", "nün",
+    "da", "de", "ta", "te", "dan", "den", "tan", "ten", "nda", "nde", "ndan", "nden", "ki", "la", "le",
+    "yla", "yle", "dır", "dir", "dur", "dür", "tır", "tir", "tur", "tür",
+    "dı", "di", "du", "dü", "tı", "ti", "tu", "tü", "mış", "miş", "muş", "müş", "ıyor", "iyor", "uyor",
+    "üyor", "yor", "acak", "ecek", "ma", "me", "mak", "mek", "an", "en", "ık", "ik", "uk", "ük", "ır", "ir",
+    "ur", "ür", "ar", "er", "dık", "dik", "duk", "dük", "mış",
+]
+MAX_SUFFIXES = 3
+
+# aday listesini MIN_CANDIDATES'e tamamlamak için yakın etiketler
+RELATED_LABELS: Dict[str, List[str]] = {
+    "trafik": ["ulaşım", "altyapı"],
+    "ulaşım": ["trafik", "altyapı"],
+    "yağış": ["sel", "trafik"],
+    "sel": ["yağış", "altyapı"],
+    "elektrik kesintisi": ["enerji", "altyapı"],
+    "enerji": ["elektrik kesintisi", "altyapı"],
+    "su kesintisi": ["altyapı", "sağlık"],
+    "altyapı": ["ulaşım", "su kesintisi"],
+    "deprem": ["yardım", "barınma"],
+    "yangın": ["çevre kirliliği", "yardım"],
+    "yardım": ["sosyal yardım", "barınma"],
+    "sosyal yardım": ["yardım", "barınma"],
+    "barınma": ["yardım", "sosyal yardım"],
+    "atık/çöp": ["çevre kirliliği", "kamusal alan"],
+    "çevre kirliliği": ["atık/çöp", "sağlık"],
+    "gürültü": ["çevre kirliliği", "kamusal alan"],
+    "yeşil alan": ["kamusal alan", "çevre kirliliği"],
+    "kamusal alan": ["yeşil alan", "altyapı"],
+    "sağlık": ["yardım", "sosyal yardım"],
+    "eğitim": ["kamusal alan", "sosyal yardım"],
+}
+
+
+def turkish_lower(text: str) -> str:
+    return text.replace("I", "ı").replace("İ", "i").lower()
+
+
+class KeywordPrior:
+    """Compiled keyword matcher that narrows candidate labels per text"""
+
+    STRONG_HIT = 2       # toplam ağırlık bu eşiğin altındaysa tam etiket setine düş
+    # yalnız zayıf kelimeler ("dolu dolu ... destek") aday setini daraltmaz: en az bir güçlü kelime gerekir
+    MIN_CANDIDATES = 3
+    MAX_CANDIDATES = 5
+
+    def __init__(
+        self,
+        labels: Sequence[str],
+        keyword_labels: Optional[Dict[str, List[str]]] = None,
+        weak_keywords: Optional[set] = None,
+        related: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
+        self.labels = list(labels)
+        keyword_labels = keyword_labels if keyword_labels is not None else KEYWORD_LABELS
+        weak = weak_keywords if weak_keywords is not None else WEAK_KEYWORDS
+        self.related = related if related is not None else RELATED_LABELS
+
+        allowed = set(self.labels)
+        self._kw_labels: Dict[str, List[str]] = {}
+        self._kw_weight: Dict[str, int] = {}
+        for label, kws in keyword_labels.items():
+            if label not in allowed:
+                continue
+            for kw in kws:
+                kw = turkish_lower(kw).strip()  # "sel " gibi boşlukla biten tam kelimeler: ek listesi yeterli
+                self._kw_labels.setdefault(kw, []).append(label)
+                self._kw_weight[kw] = 1 if kw in weak else 2
+
+        # uzun ifadeler önce denensin ("orman yangın" > "yangın"); ekler de uzundan kısaya
+        alternation = "|".join(re.escape(k) for k in sorted(self._kw_labels, key=len, reverse=True))
+        suffixes = "|".join(re.escape(x) for x in sorted(set(SUFFIXES), key=len, reverse=True))
+        self._pattern = re.compile(rf"(?<!\w)({alternation})(?:{suffixes}){{0,{MAX_SUFFIXES}}}(?!\w)")
+
+    def label_weights(self, text: str) -> Dict[str, int]:
+        return self._hits(text)[0]
+
+    def _hits(self, text: str) -> Tuple[Dict[str, int], bool]:
+        """(label -> keyword weight, whether any strong keyword matched)"""
+        weights: Dict[str, int] = {}
+        strong = False
+        seen = set()
+        for m in self._pattern.finditer(turkish_lower(text) + " "):
+            kw = m.group(1)
+            if kw in seen:
+                continue
+            seen.add(kw)
+            strong = strong or self._kw_weight[kw] > 1
+            for label in self._kw_labels[kw]:
+                weights[label] = weights.get(label, 0) + self._kw_weight[kw]
+        return weights, strong
+
+    def candidates(self, text: str) -> Optional[List[str]]:
+        """Plausible labels for text, or None when the full label set should be scored."""
+        weights, strong = self._hits(text)
+        if sum(weights.values()) < self.STRONG_HIT or not strong:
+            return None
+        hits = sorted(weights, key=lambda lb: (-weights[lb], self.labels.index(lb)))
+        if len(hits) > self.MAX_CANDIDATES:
+            return None  # çok dağınık sinyal -> tam set daha güvenli
+
+        out = list(hits)
+        for label in hits:
+            for rel in self.related.get(label, []):
+                if len(out) >= self.MIN_CANDIDATES:
+                    break
+                if rel not in out and rel in self.labels:
+                    out.append(rel)
+        return out[:self.MAX_CANDIDATES]
@@ -3,10 +3,19 @@ Topic Classification Service for HasHarita
 Multi-label classification using zero-shot learning
 """
 
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 import torch
 from transformers import pipeline
 import logging
+import threading
+import time
+
+from backend.models.nlp.bucketing import plan_token_buckets
+from backend.models.nlp.topics.zeroshot import ZeroShotEngine
+from backend.models.nlp.topics.keywords import KeywordPrior
+from backend.models.nlp.cache import ResultCache, config_fingerprint
+from backend.models.nlp.backends import load_sequence_classifier, resolve_backend
+from backend.models.nlp.warmup import LoadStatus, warmup_texts
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +46,16 @@ class TopicClassificationService:
         "sosyal yardım"
     ]
     
+    # Coarse parent hypotheses for hierarchical mode -> fine labels they expand into
+    TOPIC_HIERARCHY = {
+        "afet": ["deprem", "sel", "yağış", "yangın", "yardım"],
+        "altyapı ve ulaşım": ["altyapı", "trafik", "ulaşım", "elektrik kesintisi", "su kesintisi", "enerji"],
+        "çevre": ["çevre kirliliği", "atık/çöp", "gürültü", "yeşil alan", "kamusal alan"],
+        "sosyal konular": ["barınma", "sağlık", "eğitim", "sosyal yardım", "yardım"],
+    }
+    PARENT_MIN_SCORE = 0.50   # a parent branch is expanded above this score
+    MAX_PARENTS = 2           # at most this many branches per text (the best one always)
+
     # Post-processing parameters
     TOP_K = 3
     MIN_SCORE = 0.30
@@ -46,25 +65,104 @@ class TopicClassificationService:
     HYPOTHESIS_TEMPLATE = "Bu metin {} hakkında."
     MAX_LENGTH = 256
     MAX_BATCH = 32  # Adjust based on CPU memory
+    TOKEN_BUDGET = 32768  # padded NLI tokens per forward pass (texts x labels x longest pair)
+    WARMUP_LENGTHS = (16, 64, 192)  # words per synthetic warmup text
+
+    # "native": ZeroShotEngine (pair tensors built from cached token ids)
+    # "pipeline": HF zero-shot-classification pipeline (reference / parity checks)
+    ENGINE = "native"
     
-    def __init__(self):
+    def __init__(
+        self,
+        engine: Optional[str] = None,
+        hierarchical: bool = False,
+        keyword_prior: bool = False,
+        cache_entries: int = 0,
+        cache_ttl_sec: float = 3600.0,
+        cache_max_mb: float = 64.0,
+        backend: Optional[str] = None,
+    ):
         """Initialize service (lazy loading)"""
+        self.engine_name = engine or self.ENGINE
+        if self.engine_name not in ("native", "pipeline"):
+            raise ValueError(f"unknown zero-shot engine: {self.engine_name}")
+        self.hierarchical = bool(hierarchical)
+        if self.hierarchical and self.engine_name != "native":
+            raise ValueError("hierarchical mode requires the native zero-shot engine")
+        if keyword_prior and self.engine_name != "native":
+            raise ValueError("keyword prior requires the native zero-shot engine")
+        # torch-fp32 | torch-int8-dynamic | onnxruntime | onnxruntime-int8 (arg veya HASHARITA_TOPICS_BACKEND)
+        self.backend = resolve_backend(backend, "HASHARITA_TOPICS_BACKEND")
+        if self.engine_name == "pipeline" and not self.backend.startswith("torch"):
+            raise ValueError("the HF pipeline engine only supports torch backends")
+        # anahtar kelime isabeti olan metinler sadece 3-5 olası etikete karşı skorlanır
+        self.keyword_prior = KeywordPrior(self.TOPIC_LABELS) if keyword_prior else None
+        self._tokenizer = None
+        self._model = None
         self._classifier = None
-        logger.info("TopicClassificationService initialized (lazy loading)")
+        self._engine = None
+        self._longest_hyp = None
+        self._load_lock = threading.Lock()
+        self.status = LoadStatus("topics")
+        self._stats_lock = threading.Lock()
+        self._texts = 0
+        self._nli_pairs = 0
+        self._keyword_hits = 0
+
+        # content-addressed cache: aynı (normalize) metin + aynı konfig -> model çalışmaz
+        self._cache = None
+        if cache_entries > 0:
+            fingerprint = config_fingerprint({
+                "model": self.MODEL_NAME,
+                "template": self.HYPOTHESIS_TEMPLATE,
+                "labels": self.TOPIC_LABELS,
+                "min_score": self.MIN_SCORE,
+                "top_k": self.TOP_K,
+                "engine": self.engine_name,
+                "hierarchical": self.hierarchical,
+                "keyword_prior": keyword_prior,
+                "backend": self.backend,
+            })
+            self._cache = ResultCache(
+                fingerprint,
+                max_entries=cache_entries,
+                ttl_sec=cache_ttl_sec,
+                max_bytes=int(cache_max_mb * 1024 * 1024),
+                name="topics",
+            )
+        logger.info(
+            "TopicClassificationService initialized (lazy loading, engine=%s, hierarchical=%s, keyword_prior=%s)",
+            self.engine_name, self.hierarchical, self.keyword_prior is not None,
+        )
+
+    def _load_model(self):
+        with self._load_lock:
+            if self._model is None: #lazy load
+                logger.info(f"Loading topic model: {self.MODEL_NAME} (backend={self.backend})")
+                from transformers import AutoTokenizer
+
+                self.status.loading()
+                try:
+                    # load tokenizer and model separately to avoid issues
+                    tokenizer = AutoTokenizer.from_pretrained(
+                        self.MODEL_NAME,
+                        use_fast=False  # tokenizer sorunlarını önlemek için yavaş zorlayıcıyı kullan
+                    )
+                    model = load_sequence_classifier(
+                        self.MODEL_NAME, self.backend, tokenizer.model_input_names
+                    )
+                except Exception as e:
+                    self.status.failed(e)
+                    raise
+                self._tokenizer, self._model = tokenizer, model
+                self.status.loaded()
+                logger.info("Topic model loaded successfully in %.2fs", self.status.load_sec)
+        return self._model, self._tokenizer
     
     @property
     def classifier(self):
-        if self._classifier is None: #lazy load
-            logger.info(f"Loading topic model: {self.MODEL_NAME}")
-            from transformers import AutoTokenizer, AutoModelForSequenceClassification
-            
-            # load tokenizer and model separately to avoid issues
-            tokenizer = AutoTokenizer.from_pretrained(
-                self.MODEL_NAME,
-                use_fast=False  # tokenizer sorunlarını önlemek için yavaş zorlayıcıyı kullan
-            )
-            model = AutoModelForSequenceClassification.from_pretrained(self.MODEL_NAME)
-            
+        if self._classifier is None:
+            model, tokenizer = self._load_model()
             self._classifier = pipeline(
                 "zero-shot-classification",
                 model=model,
@@ -73,30 +171,143 @@ class TopicClassificationService:
                 max_length=self.MAX_LENGTH,
                 truncation=True
             )
-            logger.info("Topic model loaded successfully")
         return self._classifier
+
+    @property
+    def engine(self) -> ZeroShotEngine:
+        if self._engine is None:
+            model, tokenizer = self._load_model()
+            engine = ZeroShotEngine(
+                model,
+                tokenizer,
+                self.HYPOTHESIS_TEMPLATE,
+                token_budget=self.TOKEN_BUDGET,
+                max_pairs=self.MAX_BATCH * len(self.TOPIC_LABELS),
+            )
+            engine.warm_hypotheses(self.TOPIC_LABELS)
+            engine.warm_hypotheses(list(self.TOPIC_HIERARCHY))
+            self._engine = engine
+        return self._engine
     
+    def warmup(self, lengths=None) -> float:
+        """
+        Loads the model and scores a few synthetic texts against every label
+        (and the parent hypotheses in hierarchical mode). Bypasses the cache
+        and the stats counters.
+        """
+        lengths = self.WARMUP_LENGTHS if lengths is None else lengths
+        self._load_model()
+        self.status.warming()
+        t0 = time.monotonic()
+        texts = warmup_texts(lengths)
+        try:
+            if self.engine_name == "native":
+                self.engine.score(texts, self.TOPIC_LABELS)
+                if self.hierarchical:
+                    self.engine.score(texts, list(self.TOPIC_HIERARCHY))
+            else:
+                self.classifier(texts, candidate_labels=self.TOPIC_LABELS,
+                                hypothesis_template=self.HYPOTHESIS_TEMPLATE, multi_label=True)
+        except Exception as e:
+            self.status.failed(e)  # /readyz "warming"de takılı kalmasın, hatayı göstersin
+            raise
+        self.status.warmed()
+        elapsed = time.monotonic() - t0
+        logger.info("Topic warmup done in %.2fs (lengths=%s)", elapsed, list(lengths))
+        return elapsed
+
+    def load_status(self) -> Dict[str, Any]:
+        return dict(self.status.snapshot(), backend=self.backend, engine=self.engine_name)
+
     def classify_batch(self, texts: List[str]) -> List[List[Dict[str, float]]]:
+        return [r["topics"] for r in self.classify_batch_detailed(texts)]
+
+    def classify_batch_detailed(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        classify_batch plus the number of NLI pairs each text cost:
+        [{"topics": [{label, score}, ...], "nli_pairs": int}, ...]
+        Cache hits come back with nli_pairs=0.
+        """
         if not texts:
             return []
+        if self._cache is None:
+            return self._classify_uncached(texts)
+
+        cache = self._cache
+        keys = [cache.key(t) for t in texts]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        todo: Dict[str, List[int]] = {}
+        for idx, key in enumerate(keys):
+            hit = cache.get(key)
+            if hit is not None:
+                results[idx] = {"topics": hit, "nli_pairs": 0}
+            else:
+                todo.setdefault(key, []).append(idx)
+
+        if todo:
+            computed = self._classify_uncached([texts[positions[0]] for positions in todo.values()])
+            for (key, positions), res in zip(todo.items(), computed):
+                if res["nli_pairs"] > 0:  # hata sonucu (boş, 0 çift) cache'lenmez
+                    cache.put(key, res["topics"])
+                results[positions[0]] = res
+                for i in positions[1:]:
+                    results[i] = {"topics": [dict(t) for t in res["topics"]], "nli_pairs": 0}
+
+        return results
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        return self._cache.stats() if self._cache is not None else None
+
+    def _classify_uncached(self, texts: List[str]) -> List[Dict[str, Any]]:
+        if self.engine_name == "native":
+            # pair seviyesinde bucketing engine içinde yapılıyor
+            return self._process_batch(texts)
         
-        results = []
-        for i in range(0, len(texts), self.MAX_BATCH):
-            batch = texts[i:i + self.MAX_BATCH]
-            batch_results = self._process_batch(batch)
-            results.extend(batch_results)
-        
+        # length buckets: short tweets are not padded up to a long selftext
+        lengths = self._pair_lengths(texts)
+        buckets = plan_token_buckets(
+            lengths, self.TOKEN_BUDGET, self.MAX_BATCH, cost_per_item=len(self.TOPIC_LABELS)
+        )
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        for bucket in buckets:
+            batch_results = self._process_batch([texts[i] for i in bucket])
+            for i, topics in zip(bucket, batch_results):
+                results[i] = topics
+
         return results
+
+    def _pair_lengths(self, texts: List[str]) -> List[int]:
+        """Token length of the longest premise/hypothesis pair for each text"""
+        _, tokenizer = self._load_model()
+        if self._longest_hyp is None:
+            self._longest_hyp = max(
+                len(tokenizer(self.HYPOTHESIS_TEMPLATE.format(lb))["input_ids"]) for lb in self.TOPIC_LABELS
+            )
+        lengths = []
+        for text in texts:
+            premise = len(tokenizer(text, truncation=True, max_length=self.MAX_LENGTH)["input_ids"])
+            lengths.append(min(self.MAX_LENGTH, premise + self._longest_hyp))
+        return lengths
     
-    def _process_batch(self, texts: List[str]) -> List[List[Dict[str, float]]]:
+    def _process_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
         """Process a single batch of texts"""
+        flat_pairs = len(self.TOPIC_LABELS)
         try:
+            if self.engine_name == "native":
+                outputs, pairs = self._classify_native(texts)
+                return [
+                    {"topics": self._process_single_output(output), "nli_pairs": n}
+                    for output, n in zip(outputs, pairs)
+                ]
+
             # Run zero-shot classification
             outputs = self.classifier(
                 texts,
                 candidate_labels=self.TOPIC_LABELS,
                 hypothesis_template=self.HYPOTHESIS_TEMPLATE,
-                multi_label=True
+                multi_label=True,
+                batch_size=len(texts) * len(self.TOPIC_LABELS),
             )
             
             if not isinstance(outputs, list):
@@ -105,13 +316,81 @@ class TopicClassificationService:
             batch_results = []
             for output in outputs:
                 topics = self._process_single_output(output)
-                batch_results.append(topics)
+                batch_results.append({"topics": topics, "nli_pairs": flat_pairs})
             
             return batch_results
             
         except Exception as e:
             logger.error(f"Error in topic classification: {e}")
-            return [[] for _ in texts]
+            return [{"topics": [], "nli_pairs": 0} for _ in texts]
+
+    def _classify_native(self, texts: List[str]):
+        """Keyword fast path for texts with strong hits; the rest go flat or hierarchical."""
+        outputs: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        pairs = [0] * len(texts)
+
+        rest = list(range(len(texts)))
+        if self.keyword_prior is not None:
+            prior = [self.keyword_prior.candidates(t) for t in texts]
+            hit = [i for i, c in enumerate(prior) if c]
+            rest = [i for i, c in enumerate(prior) if not c]
+            if hit:
+                outs = self.engine.classify_candidates([texts[i] for i in hit], [prior[i] for i in hit])
+                for i, out in zip(hit, outs):
+                    outputs[i] = out
+                    pairs[i] = len(prior[i])
+            with self._stats_lock:
+                self._keyword_hits += len(hit)
+
+        if rest:
+            rest_texts = [texts[i] for i in rest]
+            if self.hierarchical:
+                outs, rest_pairs = self._classify_hierarchical(rest_texts)
+            else:
+                outs = self.engine.classify(rest_texts, self.TOPIC_LABELS)
+                rest_pairs = [len(self.TOPIC_LABELS)] * len(rest)
+            for i, out, n in zip(rest, outs, rest_pairs):
+                outputs[i] = out
+                pairs[i] = n
+
+        with self._stats_lock:
+            self._texts += len(texts)
+            self._nli_pairs += sum(pairs)
+        return outputs, pairs
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "texts": self._texts,
+                "nli_pairs": self._nli_pairs,
+                "avg_pairs_per_text": (self._nli_pairs / self._texts) if self._texts else 0.0,
+                "keyword_hits": self._keyword_hits,
+            }
+
+    def _classify_hierarchical(self, texts: List[str]):
+        """
+        Coarse-to-fine: score the parent hypotheses, then only the fine labels
+        of the winning branches. Returns (pipeline-shaped outputs, pairs per text).
+        """
+        parents = list(self.TOPIC_HIERARCHY)
+        parent_scores = self.engine.score(texts, parents)
+
+        candidates = []
+        for row in parent_scores:
+            order = list(reversed(row.argsort()))
+            chosen = [parents[j] for j in order[:self.MAX_PARENTS] if row[j] >= self.PARENT_MIN_SCORE]
+            if not chosen:
+                chosen = [parents[order[0]]]
+            fine: List[str] = []
+            for parent in chosen:
+                for label in self.TOPIC_HIERARCHY[parent]:
+                    if label not in fine:
+                        fine.append(label)
+            candidates.append(fine)
+
+        outputs = self.engine.classify_candidates(texts, candidates)
+        pairs = [len(parents) + len(c) for c in candidates]
+        return outputs, pairs
     
     def _process_single_output(self, output: Dict) -> List[Dict[str, float]]:
         topics = []
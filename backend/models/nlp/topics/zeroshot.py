@@ -0,0 +1,178 @@
+"""
+Native zero-shot NLI engine for TopicClassificationService.
+
+Replaces the HF zero-shot-classification pipeline's per-pair preprocessing:
+  - hypotheses ("Bu metin {} hakkında.") are tokenized once and cached
+  - each premise is tokenized once; the N x L pairs are built by concatenating
+    token ids with the tokenizer's special tokens (same layout and only_first
+    truncation as the pipeline)
+  - pairs run as length-bucketed, padded batches
+  - multi-label entailment scores are computed for all pairs in one numpy step
+Scores follow the pipeline's multi_label formula exactly:
+  softmax([contradiction, entailment])[entailment] per (text, label).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+
+import numpy as np
+import torch
+
+from backend.models.nlp.bucketing import plan_token_buckets
+
+logger = logging.getLogger(__name__)
+
+
+class ZeroShotEngine:
+    """Batches premise x hypothesis pairs directly against an NLI model"""
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        hypothesis_template: str,
+        max_length: Optional[int] = None,
+        token_budget: int = 32768,
+        max_pairs: int = 640,
+    ) -> None:
+        self.model = model
+        self.tokenizer = tokenizer
+        self.hypothesis_template = hypothesis_template
+        # pipeline truncates only_first to the tokenizer's model_max_length
+        self.max_length = int(max_length or tokenizer.model_max_length)
+        self.token_budget = int(token_budget)
+        self.max_pairs = int(max_pairs)
+
+        self.entailment_id = self._find_entailment_id()
+        self.contradiction_id = -1 if self.entailment_id == 0 else 0
+
+        self._n_special = tokenizer.num_special_tokens_to_add(pair=True)
+        self._use_token_types = "token_type_ids" in tokenizer.model_input_names
+        self._hyp_cache: Dict[str, List[int]] = {}
+
+    # ---------- public API ----------
+
+    def hypothesis_ids(self, label: str) -> List[int]:
+        ids = self._hyp_cache.get(label)
+        if ids is None:
+            ids = self.tokenizer.encode(self.hypothesis_template.format(label), add_special_tokens=False)
+            self._hyp_cache[label] = ids
+        return ids
+
+    def warm_hypotheses(self, labels: Sequence[str]) -> None:
+        for lb in labels:
+            self.hypothesis_ids(lb)
+
+    def score(self, texts: List[str], labels: Sequence[str]) -> np.ndarray:
+        """Returns entailment probabilities with shape (len(texts), len(labels))."""
+        if not texts or not labels:
+            return np.zeros((len(texts), len(labels)), dtype=np.float32)
+        pairs = self._build_pairs(texts, labels)
+        logits = self._run_pairs(pairs)
+        return self._entailment_scores(logits.reshape(len(texts), len(labels), -1))
+
+    def score_candidates(self, texts: List[str], candidates: Sequence[Sequence[str]]) -> List[np.ndarray]:
+        """Like score(), but every text has its own label subset; returns one score vector per text."""
+        hyp_cache = {lb: self.hypothesis_ids(lb) for labels in candidates for lb in labels}
+        pairs: List[Dict[str, List[int]]] = []
+        spans = []
+        for prem, labels in zip(self._encode_premises(texts), candidates):
+            start = len(pairs)
+            for lb in labels:
+                pairs.append(self._pair(prem, hyp_cache[lb]))
+            spans.append((start, len(pairs)))
+        if not pairs:
+            return [np.zeros((0,), dtype=np.float32) for _ in texts]
+        scores = self._entailment_scores(self._run_pairs(pairs))
+        return [scores[a:b] for a, b in spans]
+
+    def classify(self, texts: List[str], labels: Sequence[str]) -> List[Dict[str, Any]]:
+        """Pipeline-shaped output: [{"sequence", "labels", "scores"}] sorted by score."""
+        scores = self.score(texts, labels)
+        return [self._to_output(text, labels, row) for text, row in zip(texts, scores)]
+
+    def classify_candidates(self, texts: List[str], candidates: Sequence[Sequence[str]]) -> List[Dict[str, Any]]:
+        """classify() with a per-text candidate label list."""
+        scores = self.score_candidates(texts, candidates)
+        return [self._to_output(text, labels, row) for text, labels, row in zip(texts, candidates, scores)]
+
+    # ---------- internals ----------
+
+    @staticmethod
+    def _to_output(text: str, labels: Sequence[str], row: np.ndarray) -> Dict[str, Any]:
+        top_inds = list(reversed(row.argsort()))
+        return {
+            "sequence": text,
+            "labels": [labels[i] for i in top_inds],
+            "scores": row[top_inds].tolist(),
+        }
+
+    def _find_entailment_id(self) -> int:
+        for label, ind in self.model.config.label2id.items():
+            if label.lower().startswith("entail"):
+                return ind
+        logger.warning("entailment label not found in label2id; using -1")
+        return -1
+
+    def _encode_premises(self, texts: List[str]) -> List[List[int]]:
+        return self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+
+    def _pair(self, premise: List[int], hyp: List[int]) -> Dict[str, List[int]]:
+        # only_first truncation: hipotez asla kesilmez
+        room = self.max_length - self._n_special - len(hyp)
+        if len(premise) > room:
+            premise = premise[:max(0, room)]
+        item = {"input_ids": self.tokenizer.build_inputs_with_special_tokens(premise, hyp)}
+        if self._use_token_types:
+            item["token_type_ids"] = self.tokenizer.create_token_type_ids_from_sequences(premise, hyp)
+        return item
+
+    def _build_pairs(self, texts: List[str], labels: Sequence[str]) -> List[Dict[str, List[int]]]:
+        hyps = [self.hypothesis_ids(lb) for lb in labels]
+        pairs = []
+        for prem in self._encode_premises(texts):
+            for hyp in hyps:
+                pairs.append(self._pair(prem, hyp))
+        return pairs
+
+    def _collate(self, batch: List[Dict[str, List[int]]]) -> Dict[str, torch.Tensor]:
+        width = max(len(p["input_ids"]) for p in batch)
+        pad_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else 0
+        left = self.tokenizer.padding_side == "left"
+
+        ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+        mask = torch.zeros((len(batch), width), dtype=torch.long)
+        types = torch.zeros((len(batch), width), dtype=torch.long) if self._use_token_types else None
+        for r, p in enumerate(batch):
+            n = len(p["input_ids"])
+            sl = slice(width - n, width) if left else slice(0, n)
+            ids[r, sl] = torch.tensor(p["input_ids"], dtype=torch.long)
+            mask[r, sl] = 1
+            if types is not None:
+                types[r, sl] = torch.tensor(p["token_type_ids"], dtype=torch.long)
+
+        inputs = {"input_ids": ids, "attention_mask": mask}
+        if types is not None:
+            inputs["token_type_ids"] = types
+        return inputs
+
+    def _run_pairs(self, pairs: List[Dict[str, List[int]]]) -> np.ndarray:
+        lengths = [len(p["input_ids"]) for p in pairs]
+        buckets = plan_token_buckets(lengths, self.token_budget, self.max_pairs)
+        logits: Optional[np.ndarray] = None
+        with torch.inference_mode():
+            for bucket in buckets:
+                inputs = self._collate([pairs[i] for i in bucket])
+                out = self.model(**inputs).logits.float().numpy()
+                if logits is None:
+                    logits = np.empty((len(pairs), out.shape[-1]), dtype=out.dtype)
+                logits[bucket] = out
+        return logits  # type: ignore[return-value]
+
+    def _entailment_scores(self, logits: np.ndarray) -> np.ndarray:
+        # softmax over [contradiction, entailment] for every pair at once
+        entail_contr = logits[..., [self.contradiction_id, self.entailment_id]]
+        exp = np.exp(entail_contr)
+        return (exp / exp.sum(-1, keepdims=True))[..., 1]
@@ -0,0 +1,56 @@
+"""
+Parity + speed check: ZeroShotEngine vs HF zero-shot-classification pipeline.
+
+Usage (repo root):
+    python -m backend.models.nlp.topics.zeroshot_parity [--limit 50] [--model joeddav/xlm-roberta-large-xnli]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+
+from backend.models.nlp.topics.service import TopicClassificationService
+from backend.models.nlp.topics.zeroshot import ZeroShotEngine
+
+TRAIN_DATA = Path(__file__).resolve().parent / "train-data.json"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=TopicClassificationService.MODEL_NAME)
+    ap.add_argument("--limit", type=int, default=50)
+    args = ap.parse_args()
+
+    labels = TopicClassificationService.TOPIC_LABELS
+    template = TopicClassificationService.HYPOTHESIS_TEMPLATE
+    texts = [d["text"] for d in json.loads(TRAIN_DATA.read_text(encoding="utf-8"))][: args.limit]
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model, use_fast=False)
+    model = AutoModelForSequenceClassification.from_pretrained(args.model).eval()
+
+    pipe = pipeline("zero-shot-classification", model=model, tokenizer=tokenizer, device=-1)
+    t0 = time.perf_counter()
+    ref = pipe(texts, candidate_labels=labels, hypothesis_template=template, multi_label=True)
+    t_pipe = time.perf_counter() - t0
+
+    engine = ZeroShotEngine(model, tokenizer, template, max_pairs=TopicClassificationService.MAX_BATCH * len(labels))
+    t0 = time.perf_counter()
+    got = engine.classify(texts, labels)
+    t_engine = time.perf_counter() - t0
+
+    max_diff = 0.0
+    for r, g in zip(ref, got):
+        rm = dict(zip(r["labels"], r["scores"]))
+        gm = dict(zip(g["labels"], g["scores"]))
+        max_diff = max(max_diff, max(abs(rm[k] - gm[k]) for k in rm))
+
+    print(f"texts={len(texts)} labels={len(labels)}")
+    print(f"max |score diff| = {max_diff:.2e}")
+    print(f"pipeline {t_pipe:.2f}s | engine {t_engine:.2f}s | speedup x{t_pipe / max(t_engine, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main()
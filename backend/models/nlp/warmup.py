@@ -0,0 +1,78 @@
+"""
+Load-state tracking and warmup inputs shared by the NLP services.
+
+A service moves unloaded -> loading -> warming -> ready (or failed); the
+timings end up in /readyz and the startup log, so a load balancer only
+routes to instances whose models are resident and whose kernels have
+already seen a few realistic sequence lengths.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+import itertools
+import threading
+import time
+
+# tokenizer'dan bağımsız dolgu metni; truncation zaten max_length'te keser
+_FILLER = (
+    "mahallede sabahtan beri elektrik ve su kesintisi var yollar su bastı "
+    "belediye ekipleri çalışıyor trafik durma noktasında yardım bekliyoruz"
+).split()
+
+
+def warmup_texts(lengths: Sequence[int]) -> List[str]:
+    """One synthetic Turkish text of roughly n words for every n in lengths."""
+    return [" ".join(itertools.islice(itertools.cycle(_FILLER), max(1, int(n)))) for n in lengths]
+
+
+class LoadStatus:
+    """Thread-safe load state + timings of one model."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.state = "unloaded"
+        self.load_sec: Optional[float] = None
+        self.warmup_sec: Optional[float] = None
+        self.error: Optional[str] = None
+        self._t0: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def loading(self) -> None:
+        with self._lock:
+            self.state = "loading"
+            self.error = None
+            self._t0 = time.monotonic()
+
+    def loaded(self) -> None:
+        with self._lock:
+            self.load_sec = time.monotonic() - self._t0 if self._t0 is not None else None
+            self.state = "loaded"
+
+    def warming(self) -> None:
+        with self._lock:
+            self.state = "warming"
+            self._t0 = time.monotonic()
+
+    def warmed(self) -> None:
+        with self._lock:
+            self.warmup_sec = time.monotonic() - self._t0 if self._t0 is not None else None
+            self.state = "ready"
+
+    def failed(self, exc: BaseException) -> None:
+        with self._lock:
+            self.state = "failed"
+            self.error = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "load_sec": round(self.load_sec, 3) if self.load_sec is not None else None,
+                "warmup_sec": round(self.warmup_sec, 3) if self.warmup_sec is not None else None,
+                "error": self.error,
+            }
@@ -0,0 +1,160 @@
+"""
+Streaming near-duplicate index for the inbox watcher (SimHash + banded LSH).
+
+Texts are normalized (RT prefix, mentions, hashtags and links removed),
+fingerprinted with a 64-bit SimHash over word uni/bi-grams and indexed in
+4 bands of 16 bits. Two fingerprints within Hamming distance 3 always share
+at least one band, so a lookup only compares the few candidates in the
+matching buckets. Entries expire after a rolling horizon.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import hashlib
+import re
+import threading
+import time
+
+_RT = re.compile(r"^\s*rt\s+@\w+:?\s*", re.IGNORECASE)
+_URL = re.compile(r"https?://\S+|www\.\S+")
+_MENTION_TAG = re.compile(r"[@#]\w+")
+_WORD = re.compile(r"\w+")
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def normalize(text: str) -> List[str]:
+    text = _RT.sub("", text or "")
+    text = _URL.sub(" ", text)
+    text = _MENTION_TAG.sub(" ", text)
+    text = text.replace("I", "ı").replace("İ", "i").lower()
+    return _WORD.findall(text)
+
+
+def _h64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: List[str]) -> int:
+    features = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+    acc = [0] * 64
+    for feat in features:
+        h = _h64(feat)
+        for bit in range(64):
+            acc[bit] += 1 if (h >> bit) & 1 else -1
+    fp = 0
+    for bit in range(64):
+        if acc[bit] > 0:
+            fp |= 1 << bit
+    return fp
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDupIndex:
+    """
+    lookup(fp) -> (rep_id, payload) of a live representative within max_distance
+    add(fp, rep_id, payload) registers a freshly enriched record
+    """
+
+    def __init__(
+        self,
+        max_distance: int = 3,
+        horizon_sec: float = 6 * 3600,
+        max_entries: int = 200000,
+        min_tokens: int = 4,
+    ) -> None:
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be < {BANDS} for banded lookup")
+        self.max_distance = int(max_distance)
+        self.horizon_sec = float(horizon_sec)
+        self.max_entries = int(max_entries)
+        self.min_tokens = int(min_tokens)
+
+        # fp -> (added_at, rep_id, payload)
+        self._entries: Dict[int, Tuple[float, str, Any]] = {}
+        self._order: Deque[Tuple[float, int]] = deque()
+        self._bands: List[Dict[int, set]] = [dict() for _ in range(BANDS)]
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    # ---------- public API ----------
+
+    def fingerprint(self, text: str) -> Optional[int]:
+        """None for texts too short to be matched safely."""
+        tokens = normalize(text)
+        if len(tokens) < self.min_tokens:
+            return None
+        return simhash(tokens)
+
+    def lookup(self, fp: Optional[int], now: Optional[float] = None) -> Optional[Tuple[str, Any]]:
+        if fp is None:
+            return None
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire_locked(now)
+            self.lookups += 1
+            best = None
+            for b, band in enumerate(self._bands):
+                for cand in band.get((fp >> (b * BAND_BITS)) & BAND_MASK, ()):
+                    d = hamming(fp, cand)
+                    if d <= self.max_distance and (best is None or d < best[0]):
+                        best = (d, cand)
+            if best is None:
+                return None
+            self.hits += 1
+            _, rep_id, payload = self._entries[best[1]]
+            return rep_id, payload
+
+    def add(self, fp: Optional[int], rep_id: str, payload: Any, now: Optional[float] = None) -> None:
+        if fp is None:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            if fp in self._entries:
+                self._remove_locked(fp)
+            self._entries[fp] = (now, rep_id, payload)
+            self._order.append((now, fp))
+            for b, band in enumerate(self._bands):
+                band.setdefault((fp >> (b * BAND_BITS)) & BAND_MASK, set()).add(fp)
+            self._expire_locked(now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_ratio": (self.hits / self.lookups) if self.lookups else 0.0,
+                "horizon_sec": self.horizon_sec,
+                "max_distance": self.max_distance,
+            }
+
+    # ---------- internals ----------
+
+    def _remove_locked(self, fp: int) -> None:
+        self._entries.pop(fp, None)
+        for b, band in enumerate(self._bands):
+            key = (fp >> (b * BAND_BITS)) & BAND_MASK
+            bucket = band.get(key)
+            if bucket is not None:
+                bucket.discard(fp)
+                if not bucket:
+                    del band[key]
+
+    def _expire_locked(self, now: float) -> None:
+        cutoff = now - self.horizon_sec
+        while self._order and (self._order[0][0] < cutoff or len(self._entries) > self.max_entries):
+            added_at, fp = self._order.popleft()
+            entry = self._entries.get(fp)
+            # yeniden eklenmiş fp'nin eski sıra kaydı -> atla
+            if entry is not None and entry[0] == added_at:
+                self._remove_locked(fp)
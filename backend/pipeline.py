@@ -0,0 +1,233 @@
+"""
+Staged inbox pipeline: read/validate -> infer -> ordered write/aggregate.
+
+Stages are threads connected by bounded queues, so several inbox files are
+in flight at once and reading, model inference and writing overlap:
+
+  readers      one per lane slot (an emergency reader + N bulk readers);
+               turn a file into numbered batches
+  inference    M workers; pull batches highest lane first, so emergency
+               batches overtake queued bulk batches
+  writer       single thread; re-orders results per file by batch number,
+               so every enriched file keeps its input order, then finishes
+               the file once its last batch is written
+
+The domain logic (validation, enrichment, output, archiving) is passed in as
+callbacks; see the watcher section of backend.main.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, Optional
+import itertools
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LANE_RANK = {"emergency": 0, "bulk": 1}
+
+
+class FileJob:
+    """One inbox file moving through the pipeline; `state` belongs to the callbacks."""
+
+    def __init__(self, path: Path, lane: str) -> None:
+        self.path = path
+        self.lane = lane
+        self.state: Dict[str, Any] = {}
+        self.total_batches: Optional[int] = None  # reader bitince bilinir
+        self.next_seq = 0
+        self.pending: Dict[int, Any] = {}          # sırası gelmemiş sonuçlar
+        self.failed = False
+        self.started_at = time.monotonic()
+
+
+class _End:
+    __slots__ = ("job", "total")
+
+    def __init__(self, job: FileJob, total: int) -> None:
+        self.job, self.total = job, total
+
+
+class _Failure:
+    __slots__ = ("job", "error")
+
+    def __init__(self, job: FileJob, error: BaseException) -> None:
+        self.job, self.error = job, error
+
+
+class FilePipeline:
+    """
+    read_batches(job) -> iterable of batch payloads            (reader thread)
+    enrich(job, payload) -> result                              (inference workers)
+    write_batch(job, result) -> number of records written       (writer, in order)
+    finish_file(job) / fail_file(job, exc)                      (writer)
+    """
+
+    def __init__(
+        self,
+        read_batches: Callable[[FileJob], Iterable[Any]],
+        enrich: Callable[[FileJob, Any], Any],
+        write_batch: Callable[[FileJob, Any], int],
+        finish_file: Callable[[FileJob], None],
+        fail_file: Callable[[FileJob, BaseException], None],
+        bulk_readers: int = 2,
+        infer_workers: int = 2,
+        max_batches_in_flight: int = 16,
+        name: str = "pipeline",
+    ) -> None:
+        self.read_batches = read_batches
+        self.enrich = enrich
+        self.write_batch = write_batch
+        self.finish_file = finish_file
+        self.fail_file = fail_file
+        self.bulk_readers = max(1, int(bulk_readers))
+        self.infer_workers = max(1, int(infer_workers))
+        self.name = name
+
+        self._files: Dict[str, "queue.Queue[FileJob]"] = {lane: queue.Queue() for lane in LANE_RANK}
+        self._infer_q: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=max(1, int(max_batches_in_flight)))
+        self._write_q: "queue.Queue" = queue.Queue(maxsize=max(1, int(max_batches_in_flight)) * 2)
+        self._order = itertools.count()
+        self._inflight: Dict[str, FileJob] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._threads: list = []
+
+        self._files_done = 0
+        self._files_failed = 0
+        self._batches = 0
+        self._records = 0
+        self._started_at: Optional[float] = None
+
+    # ---------- public API ----------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._started_at = time.monotonic()
+            specs = [("emergency-reader", self._reader_loop, ("emergency",))]
+            specs += [(f"bulk-reader-{i}", self._reader_loop, ("bulk",)) for i in range(self.bulk_readers)]
+            specs += [(f"infer-{i}", self._infer_loop, ()) for i in range(self.infer_workers)]
+            specs += [("writer", self._writer_loop, ())]
+            for name, target, args in specs:
+                t = threading.Thread(target=target, args=args, name=f"{self.name}-{name}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, path: Path, lane: str = "bulk") -> bool:
+        """Queues an inbox file; False if that file is already in flight."""
+        self.start()
+        lane = lane if lane in LANE_RANK else "bulk"
+        with self._lock:
+            if path.name in self._inflight:
+                return False
+            job = FileJob(path, lane)
+            self._inflight[path.name] = job
+        self._files[lane].put(job)
+        return True
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until no file is in flight (benchmarks / tests)."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._inflight, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            return {
+                "files_in_flight": len(self._inflight),
+                "files_done": self._files_done,
+                "files_failed": self._files_failed,
+                "batches": self._batches,
+                "records": self._records,
+                "records_per_sec": round(self._records / elapsed, 2) if elapsed > 0 else 0.0,
+                "infer_queue": self._infer_q.qsize(),
+                "write_queue": self._write_q.qsize(),
+                "bulk_readers": self.bulk_readers,
+                "infer_workers": self.infer_workers,
+            }
+
+    # ---------- stages ----------
+
+    def _reader_loop(self, lane: str) -> None:
+        files = self._files[lane]
+        while True:
+            job = files.get()
+            seq = 0
+            try:
+                for payload in self.read_batches(job):
+                    if job.failed:
+                        break
+                    self._infer_q.put((LANE_RANK[job.lane], next(self._order), job, seq, payload))
+                    seq += 1
+                self._write_q.put(_End(job, seq))
+            except Exception as e:
+                self._write_q.put(_Failure(job, e))
+
+    def _infer_loop(self) -> None:
+        while True:
+            _, _, job, seq, payload = self._infer_q.get()
+            if job.failed:
+                continue
+            try:
+                result = self.enrich(job, payload)
+            except Exception as e:
+                self._write_q.put(_Failure(job, e))
+                continue
+            self._write_q.put((job, seq, result))
+
+    def _writer_loop(self) -> None:
+        while True:
+            msg = self._write_q.get()
+            try:
+                if isinstance(msg, _Failure):
+                    self._fail(msg.job, msg.error)
+                    continue
+                if isinstance(msg, _End):
+                    job = msg.job
+                    job.total_batches = msg.total
+                else:
+                    job, seq, result = msg
+                    if job.failed:
+                        continue
+                    job.pending[seq] = result
+                # sırası gelen sonuçları yaz
+                while not job.failed and job.next_seq in job.pending:
+                    written = self.write_batch(job, job.pending.pop(job.next_seq))
+                    job.next_seq += 1
+                    with self._lock:
+                        self._batches += 1
+                        self._records += written
+                if not job.failed and job.total_batches is not None and job.next_seq >= job.total_batches:
+                    self.finish_file(job)
+                    self._done(job, failed=False)
+            except Exception as e:
+                self._fail(msg.job if isinstance(msg, (_End, _Failure)) else msg[0], e)
+
+    # ---------- internals ----------
+
+    def _fail(self, job: FileJob, error: BaseException) -> None:
+        if job.failed:
+            return
+        job.failed = True
+        job.pending.clear()
+        logger.error("[%s] %s failed: %s", self.name, job.path.name, error)
+        try:
+            self.fail_file(job, error)
+        except Exception:
+            logger.exception("[%s] fail_file(%s) raised", self.name, job.path.name)
+        self._done(job, failed=True)
+
+    def _done(self, job: FileJob, failed: bool) -> None:
+        with self._idle:
+            self._inflight.pop(job.path.name, None)
+            if failed:
+                self._files_failed += 1
+            else:
+                self._files_done += 1
+            self._idle.notify_all()
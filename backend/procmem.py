@@ -0,0 +1,40 @@
+"""
+Per-process memory figures from /proc/<pid>/smaps_rollup (Linux).
+
+rss:          resident pages, shared ones counted in full
+pss:          proportional share; summing it over workers gives the real total
+shared_clean: file / COW pages also mapped by other processes (model weights)
+private:      pages only this process owns (activations, Python heap, ...)
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Union
+
+_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+    "Swap": "swap",
+}
+
+
+def smaps_rollup(pid: Union[int, str] = "self") -> Optional[Dict[str, float]]:
+    """Memory of one process in MiB; None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    out: Dict[str, float] = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].rstrip(":") in _FIELDS:
+            out[_FIELDS[parts[0].rstrip(":")]] = round(int(parts[1]) / 1024.0, 1)  # kB -> MiB
+    if out:
+        out["private"] = round(out.get("private_clean", 0.0) + out.get("private_dirty", 0.0), 1)
+        out["shared"] = round(out.get("shared_clean", 0.0) + out.get("shared_dirty", 0.0), 1)
+    return out
@@ -0,0 +1,163 @@
+"""
+Pre-fork launcher for the API: model weights are loaded once, then the
+uvicorn workers are forked from that process.
+
+    python -m backend.serve --workers 4 --port 8000
+
+With `uvicorn backend.main:app --workers N` every worker loads its own copy
+of xlm-roberta-large and BERTurk. Here the parent only maps / loads the
+weights (no forward pass, so no intra-op thread pool exists before fork)
+and every worker inherits them:
+
+  torch-fp32          weights are mmap'ed from safetensors -> one copy in
+                      the page cache, shared by all workers
+  torch-int8-dynamic  loaded in the parent, shared copy-on-write
+  onnxruntime(-int8)  sessions own their thread pools, so they are still
+                      created per worker (after fork)
+
+Each worker warms up and serves on the shared listening socket; only worker
+0 runs the inbox watcher. Per-worker rss / pss / shared / private memory is
+logged periodically and exposed under "memory" in /metrics.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from backend.lease import default_worker_id
+from backend.procmem import smaps_rollup
+
+logger = logging.getLogger("serve")
+
+
+def _run_worker(index: int, sock: socket.socket, args, api) -> None:
+    import torch
+    import uvicorn
+
+    torch.set_num_threads(args.threads)
+    # scheduler thread'leri ana thread'in ayarını miras almaz: worker bütçesini iki model arasında böl
+    sent_threads, topic_threads = api.nlp_thread_split(args.threads)
+    if "HASHARITA_SENTIMENT_INTRA_THREADS" not in os.environ and api.sentiment_pool is None:
+        api.sentiment_sched.intra_op_threads = sent_threads
+    if "HASHARITA_TOPICS_INTRA_THREADS" not in os.environ and api.topic_pool is None:
+        api.topic_sched.intra_op_threads = topic_threads
+    # inbox'ı API içinde tek worker işlesin; ölçek için backend.worker süreçleri eklenir
+    api.WATCHER_ENABLED = api.WATCHER_ENABLED and index == 0
+    if not os.getenv("HASHARITA_WORKER_ID"):
+        api.LEASES.worker_id = default_worker_id()  # parent'ın pid'iyle değil, kendi pid'iyle
+    config = uvicorn.Config(api.app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(index: int, sock: socket.socket, args, api) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        _run_worker(index, sock, args, api)
+    except BaseException:
+        logger.exception("worker %d crashed", index)
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _report_memory(workers) -> None:
+    total_pss = 0.0
+    for pid, index in sorted(workers.items(), key=lambda kv: kv[1]):
+        mem = smaps_rollup(pid)
+        if not mem:
+            continue
+        total_pss += mem.get("pss", 0.0)
+        logger.info("worker %d (pid=%d): rss=%.0f MiB pss=%.0f MiB shared=%.0f MiB private=%.0f MiB",
+                    index, pid, mem.get("rss", 0), mem.get("pss", 0), mem.get("shared", 0), mem.get("private", 0))
+    parent = smaps_rollup() or {}
+    total_pss += parent.get("pss", 0.0)
+    logger.info("total pss (parent + %d workers): %.0f MiB", len(workers), total_pss)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="HasHarita API, pre-fork workers sharing model weights")
+    ap.add_argument("--host", default=os.getenv("HASHARITA_HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("HASHARITA_PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("HASHARITA_WORKERS", "2")))
+    ap.add_argument("--threads", type=int, default=0, help="torch threads per worker (default: cores / workers)")
+    ap.add_argument("--memory-report-sec", type=float, default=60.0, help="0 disables the periodic memory log")
+    ap.add_argument("--keep-alive", type=int, default=5)
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args(argv)
+    args.workers = max(1, args.workers)
+    if args.threads <= 0:
+        args.threads = max(1, (os.cpu_count() or 1) // args.workers)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # fork sonrası HF tokenizers'ın rust thread havuzu kilitlenmesin
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    import backend.main as api
+
+    if api.sentiment_pool is not None or api.topic_pool is not None:
+        logger.warning("replica pools are started per worker; prefer one of --workers > 1 or *_REPLICAS > 0")
+
+    t0 = time.monotonic()
+    api.load_models()
+    logger.info("models loaded in the parent in %.2fs", time.monotonic() - t0)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers = {}
+    for index in range(args.workers):
+        workers[_spawn(index, sock, args, api)] = index
+    logger.info("%d workers x %d torch threads on %s:%d", args.workers, args.threads, args.host, args.port)
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    next_report = time.monotonic() + args.memory_report_sec
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.5)
+            if args.memory_report_sec > 0 and time.monotonic() >= next_report:
+                _report_memory(workers)
+                next_report = time.monotonic() + args.memory_report_sec
+            continue
+        index = workers.pop(pid, None)
+        if index is None or stopping:
+            continue
+        logger.warning("worker %d (pid=%d) exited with status %d; restarting", index, pid, status)
+        workers[_spawn(index, sock, args, api)] = index
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Server-sent events fan-out: one renderer per topic, frames shared by every
+subscriber.
+
+    hub = StreamHub(render)             # render(topic, since) -> (token, frame | None)
+    sub = await hub.subscribe(topic, interval=2.0, since=last_event_id)
+    frame = await sub.get()             # bytes, ready to write; None = closed
+    hub.unsubscribe(sub)
+
+  publisher   one asyncio task per topic while it has subscribers; it wakes
+              on notify() (producers call it after committing a batch, from
+              any thread) or every idle_sec (changes nobody notifies, such as
+              rows expiring out of a window), waits out tick_sec since
+              its last round so bursts are coalesced into one frame, and
+              renders once per distinct `since` token among the due
+              subscribers; the same bytes object goes to all of them
+  throttle    a subscriber asking for a longer interval is skipped until it
+              is due, then gets one frame covering everything since its own
+              token
+  slow        every subscriber has a bounded frame queue; when it is full the
+              queued frames are dropped and the subscriber is resynced with a
+              full frame (since=None); after max_drops drops in a row it is
+              closed
+
+render() runs in a thread (asyncio.to_thread), so it may block; it returns
+(since, None) when nothing changed for that token, and should be cheap then
+(idle rounds call it). Subscribers that got nothing for heartbeat_sec get an
+SSE comment so proxies keep the connection open.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PING = b": ping\n\n"
+
+
+def sse_frame(event: str, data: bytes, event_id: Optional[str] = None) -> bytes:
+    """One SSE event; data must be a single line (compact JSON)."""
+    head = (f"id: {event_id}\n" if event_id is not None else "") + f"event: {event}\n"
+    return head.encode() + b"data: " + data + b"\n\n"
+
+
+class Subscriber:
+    def __init__(self, topic: Hashable, interval: float, max_queue: int, since: Optional[str]) -> None:
+        self.topic = topic
+        self.interval = interval
+        self.token = since          # son gönderilen sürüm; None -> sıradaki kare tam snapshot
+        self.next_due = 0.0
+        self.last_sent = time.monotonic()
+        self.drops = 0              # tüketici okumadan art arda düşürme
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+
+    async def get(self) -> Optional[bytes]:
+        frame = await self._queue.get()
+        self.drops = 0  # tüketici ilerliyor
+        return frame
+
+
+class _Topic:
+    def __init__(self) -> None:
+        self.subscribers: Set[Subscriber] = set()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.last_sent = 0.0               # son kare gönderen tur
+        self.retry_at: Optional[float] = None  # kısıldığı için atlanan abonenin sırası
+
+
+class StreamHub:
+    def __init__(self, render: Callable[[Hashable, Optional[str]], Tuple[Optional[str], Optional[bytes]]],
+                 tick_sec: float = 1.0, idle_sec: float = 5.0, heartbeat_sec: float = 15.0, max_queue: int = 8,
+                 max_drops: int = 3, max_subscribers: int = 10000) -> None:
+        self.render = render
+        self.tick_sec = tick_sec
+        self.idle_sec = idle_sec
+        self.heartbeat_sec = heartbeat_sec
+        self.max_queue = max(1, max_queue)
+        self.max_drops = max_drops
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[Hashable, _Topic] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {"frames_rendered": 0, "frames_sent": 0, "bytes_sent": 0, "dropped": 0, "closed_slow": 0,
+                       "rejected": 0}
+
+    # ---------- subscribers (event loop) ----------
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(t.subscribers) for t in self._topics.values())
+
+    async def subscribe(self, topic: Hashable, interval: float = 0.0, since: Optional[str] = None) -> Optional[Subscriber]:
+        """None when max_subscribers is reached."""
+        if self.subscribers >= self.max_subscribers:
+            self._stats["rejected"] += 1
+            return None
+        self._loop = asyncio.get_running_loop()
+        t = self._topics.get(topic)
+        if t is None:
+            t = self._topics[topic] = _Topic()
+        sub = Subscriber(topic, max(self.tick_sec, interval), self.max_queue, since)
+        t.subscribers.add(sub)
+        if t.task is None or t.task.done():
+            t.task = asyncio.create_task(self._publish(topic, t))
+        t.wakeup.set()  # yeni abone ilk karesini hemen alsın
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        sub.closed = True
+        t = self._topics.get(sub.topic)
+        if t is None:
+            return
+        t.subscribers.discard(sub)
+        if not t.subscribers:
+            t.wakeup.set()  # publisher kendini kapatsın
+
+    # ---------- producers (any thread) ----------
+
+    def notify(self) -> None:
+        """Something changed: wake every publisher (coalesced to one round per tick)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake_all)
+        except RuntimeError:
+            pass  # loop kapanıyor
+
+    def _wake_all(self) -> None:
+        for t in self._topics.values():
+            t.wakeup.set()
+
+    # ---------- publisher ----------
+
+    async def _publish(self, topic: Hashable, t: _Topic) -> None:
+        try:
+            while t.subscribers:
+                timeout = self.idle_sec
+                if t.retry_at is not None:
+                    timeout = min(timeout, max(0.0, t.retry_at - time.monotonic()))  # kısılmış abonenin sırası
+                try:
+                    await asyncio.wait_for(t.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                t.wakeup.clear()
+                if not t.subscribers:
+                    break
+                wait = t.last_sent + self.tick_sec - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)  # tick içindeki tüm değişiklikler tek kareye
+                if await self._round(topic, t):
+                    t.last_sent = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("[stream] publisher for %s failed: %s", topic, e)
+            for s in list(t.subscribers):
+                self._close(s)
+        finally:
+            if self._topics.get(topic) is t and not t.subscribers:
+                self._topics.pop(topic, None)
+
+    async def _round(self, topic: Hashable, t: _Topic) -> bool:
+        """One render per distinct token among the due subscribers; True if any frame went out."""
+        now = time.monotonic()
+        frames: Dict[Optional[str], Tuple[Optional[str], Optional[bytes]]] = {}
+        sent, t.retry_at = False, None
+        for s in list(t.subscribers):
+            if s.closed:
+                continue
+            if s.next_due > now:
+                t.retry_at = s.next_due if t.retry_at is None else min(t.retry_at, s.next_due)
+                continue
+            if s.token not in frames:
+                # aynı token'daki (genelde hepsi) aboneler aynı bytes nesnesini alır
+                frames[s.token] = await asyncio.to_thread(self.render, topic, s.token)
+                self._stats["frames_rendered"] += 1
+            token, frame = frames[s.token]
+            if frame is None:
+                if now - s.last_sent >= self.heartbeat_sec:
+                    self._deliver(s, PING, s.token)  # proxy'ler boşta bağlantıyı kesmesin
+                continue
+            self._deliver(s, frame, token)
+            s.next_due = now + s.interval
+            sent = True
+        return sent
+
+    def _deliver(self, s: Subscriber, frame: bytes, token: Optional[str]) -> None:
+        if s._queue.full():
+            # yavaş tüketici: biriken kareleri at, bir sonraki turda tam snapshot ile yeniden eşitle
+            while not s._queue.empty():
+                s._queue.get_nowait()
+            s.drops += 1
+            s.token = None
+            self._stats["dropped"] += 1
+            if s.drops >= self.max_drops:
+                self._stats["closed_slow"] += 1
+                self._close(s)
+            return
+        s._queue.put_nowait(frame)
+        s.last_sent = time.monotonic()
+        if frame is not PING:
+            s.token = token
+        self._stats["frames_sent"] += 1
+        self._stats["bytes_sent"] += len(frame)
+
+    def _close(self, s: Subscriber) -> None:
+        t = self._topics.get(s.topic)
+        if t is not None:
+            t.subscribers.discard(s)
+        s.closed = True
+        while not s._queue.empty():
+            s._queue.get_nowait()
+        s._queue.put_nowait(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, subscribers=self.subscribers, topics=len(self._topics))
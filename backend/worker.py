@@ -0,0 +1,122 @@
+"""
+Standalone enrichment worker: runs the inbox watcher without the HTTP API.
+
+    python -m backend.worker [--worker-id ID] [--threads N] [--data-dir DIR] [--drain]
+
+Any number of workers (on one host, or on hosts sharing twitter_data/) split
+the inbox through file leases (backend.lease): a file is claimed with an
+atomic rename into processing/<worker_id>/, so only one worker enriches it.
+A worker that dies leaves its lease to expire (HASHARITA_LEASE_TTL_SEC);
+another worker then takes its files over and resumes them from the offset
+journal. Run the API with HASHARITA_WATCHER=0 when workers do the
+enrichment.
+
+--drain processes what is in the inbox and exits instead of watching
+(benchmarks, batch jobs); it waits for a line on stdin after the models are
+loaded when --wait-go is given, so several workers can start together.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+logger = logging.getLogger("worker")
+
+
+def _drain(api) -> None:
+    api._resume_interrupted()
+    while True:
+        api._sweep_inbox()
+        if api.WATCHER_PIPELINE:
+            api.PIPELINE.wait_idle()
+        if api._inbox_files():
+            continue
+        # başka worker'lardaki dosyalar: bitmelerini bekle, ölmüşlerse lease düşünce devral
+        if not api.LEASES.foreign_files():
+            break
+        time.sleep(api.LEASES.heartbeat_sec)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="HasHarita enrichment worker (inbox watcher without the API)")
+    ap.add_argument("--worker-id", default=os.getenv("HASHARITA_WORKER_ID"),
+                    help="lease owner id; keep it stable across restarts to resume at once (default: host-pid)")
+    ap.add_argument("--threads", type=int, default=0, help="torch threads (default: all cores)")
+    ap.add_argument("--data-dir", default=None, help="base with inbox/processing/archive/failed (default: twitter_data)")
+    ap.add_argument("--mode", choices=["notify", "poll"], default=None)
+    ap.add_argument("--drain", action="store_true", help="process the current inbox, then exit")
+    ap.add_argument("--wait-go", action="store_true", help="after loading, wait for a line on stdin")
+    ap.add_argument("--sentiment-model", default=None, help="override the sentiment checkpoint")
+    ap.add_argument("--topics-model", default=None, help="override the topics checkpoint")
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    import torch
+    import backend.main as api
+    from backend.lease import default_worker_id
+    from backend.models.nlp.sentiment.service import SentimentService
+
+    if args.sentiment_model:
+        api.svc = SentimentService(model_name=args.sentiment_model, lazy=False, **api.SENTIMENT_KWARGS)
+    if args.topics_model:
+        api.topic_svc.MODEL_NAME = args.topics_model
+
+    threads = args.threads if args.threads > 0 else (os.cpu_count() or 1)
+    torch.set_num_threads(threads)
+    sent_threads, topic_threads = api.nlp_thread_split(threads)
+    if api.sentiment_pool is None:
+        api.sentiment_sched.intra_op_threads = sent_threads
+    if api.topic_pool is None:
+        api.topic_sched.intra_op_threads = topic_threads
+
+    if args.data_dir:
+        base = Path(args.data_dir)
+        api.INBOX_DIR, api.PROCESSING_DIR = base / "inbox", base / "processing"
+        api.ARCHIVE_DIR, api.FAILED_DIR = base / "archive", base / "failed"
+    api.LEASES.worker_id = args.worker_id or default_worker_id()
+    api._ensure_dirs()
+
+    t0 = time.monotonic()
+    api._start_replicas()
+    for name, service, pool in (("sentiment", api.svc, api.sentiment_pool), ("topics", api.topic_svc, api.topic_pool)):
+        if pool is not None:
+            pool.wait_ready()
+        else:
+            service.warmup()
+    logger.info("worker %s ready in %.2fs (%d torch threads)", api.LEASES.worker_id, time.monotonic() - t0, threads)
+    print("ready", flush=True)
+    if args.wait_go:
+        sys.stdin.readline()
+
+    def _stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        if args.drain:
+            t0 = time.monotonic()
+            _drain(api)
+            logger.info("worker %s drained the inbox in %.2fs", api.LEASES.worker_id, time.monotonic() - t0)
+        else:
+            if args.mode:
+                api.WATCHER_MODE = args.mode
+            api._run_watcher(api._poll_inbox_loop if api.WATCHER_MODE == "poll" else api._watch_inbox_loop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.LEASES.release()  # dosya kaldıysa lease hemen düşer, diğer worker'lar devralır
+        api._stop_replicas()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())